@@ -18,6 +18,8 @@ class HadithiApp(Flask):
     """
     Custom flask application for the entire application
     """
+    # adds the {% cache %} block to templates, see app.utils.fragment_cache
+    jinja_options = dict(Flask.jinja_options, extensions=["app.utils.fragment_cache.FragmentCacheExtension"])
 
     def __init__(self):
         """
@@ -34,9 +36,18 @@ class HadithiApp(Flask):
     def create_global_jinja_loader(self):
         return self.jinja_loader
 
+    def send_static_file(self, filename):
+        """
+        Fingerprinted static files are sent precompressed and cached for good, see app.utils.assets
+        """
+        from app.utils.assets import send_static_asset
+        return send_static_asset(self, filename)
+
     def register_blueprint(self, blueprint, **options):
         Flask.register_blueprint(self, blueprint, **options)
-        self.jinja_loader.loaders[1].mapping[blueprint.name] = blueprint.jinja_loader
+        # blueprints without a template folder have no loader
+        if blueprint.jinja_loader is not None:
+            self.jinja_loader.loaders[1].mapping[blueprint.name] = blueprint.jinja_loader
 
 
 def create_app(config_name):
@@ -63,8 +74,49 @@ def create_app(config_name):
     register_blueprints(app)
     set_logger(app, config_name)
 
-    # increases performance of loading application templates
-    app.jinja_env.cache = {}
+    # in-process index of who follows whom, used by AuthorAccount.is_following when enabled
+    from app.utils.follower_graph import init_follower_graph
+    init_follower_graph(app)
+
+    # logged in authors, kept between requests so that loading them needs no query
+    from app.utils.author_cache import init_author_cache
+    init_author_cache(app)
+
+    # rendered story cards, reused while the story and its author are unchanged
+    from app.utils.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    # whole pages for anonymous visitors, cleared when stories or authors change
+    from app.utils.response_cache import init_response_cache
+    init_response_cache(app)
+
+    # signs and checks the links sent to confirm emails and reset passwords
+    from app.mod_auth.token import init_tokens
+    init_tokens(app)
+
+    # bounds the number of cores spent hashing passwords
+    from app.utils.passwords import init_password_hashing
+    init_password_hashing(app)
+
+    # limits login and registration attempts before they reach the database or the password hasher
+    from app.utils.throttle import init_throttle
+    init_throttle(app)
+
+    # keeps the story search index in sync with stories
+    from app.utils import search  # noqa
+
+    # offers templates smaller copies of images to pick from, once they have been built
+    from app.utils.images import init_images
+    init_images(app)
+
+    # links static files to their fingerprinted copies once they have been built
+    from app.utils.assets import init_assets
+    init_assets(app)
+
+    # increases performance of loading application templates, compiled templates are kept in a bounded
+    # cache and their bytecode is shared by the worker processes
+    from app.utils.template_cache import init_template_cache
+    init_template_cache(app)
 
     return app
 
@@ -100,20 +152,31 @@ def request_handlers(app, db_):
     :param db_: current database
     :return:
     """
+    from app.utils.last_seen import init_last_seen
+    last_seen = init_last_seen(app)
 
     @app.before_request
     def before_request():
         """
-        Before submitting the request, change the currently logged in user 'last seen' status to now
-        this will update the database last_seen column and every time the user makes a request (refreshes the
-        page), the last seen will be updated. this is called before any request is ma
+        Before submitting the request, record that the currently logged in user has been seen now.
+        This does not write to the database, the time is buffered in memory, rounded down to
+        LAST_SEEN_GRANULARITY, and only recorded if it is newer than the last_seen already stored for the
+        user. Buffered times are written in one batch at request teardown, see app.utils.last_seen
         """
         g.user = current_user
         if current_user.is_authenticated:
-            current_user.last_seen = datetime.now()
-            db.session.add(g.user)
-            db_.session.add(current_user)
-            db_.session.commit()
+            last_seen.touch(current_user.id, datetime.now(), current_user.last_seen)
+
+    @app.teardown_request
+    def flush_last_seen(exception=None):
+        """
+        Writes the buffered last seen times once LAST_SEEN_FLUSH_INTERVAL has passed since the last write
+        """
+        if last_seen.flush_due():
+            try:
+                last_seen.flush()
+            except Exception as e:
+                app.logger.warning("Could not write last seen times: %s" % e)
 
             # @app.after_request
             # def after_request(response):
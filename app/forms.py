@@ -43,19 +43,29 @@ class RegisterForm(FlaskForm):
 
     def validate_form(self):
         """
-        pre-validation of register form. This will check the db if there is a user with the email
-        and warn the user that this email already exists.
-        :return: True if the user email already exists, False otherwise
+        pre-validation of register form. This will check the db if there is a user with the email or the
+        username and warn the user that they already exist.
+        :return: True if the form is valid and neither the email nor the username is taken, False otherwise
         :rtype: bool
         """
         initial_validation = super(RegisterForm, self).validate()
         if not initial_validation:
             return False
-        user = AuthorAccount.query.filter_by(email=self.email.data).first()
-        if user:
+        return self.check_available()
+
+    def check_available(self):
+        """
+        Checks the email and the username against the registered authors with a single query, adding an
+        error to each field that is already taken
+        :return: True if both are available, False otherwise
+        :rtype: bool
+        """
+        taken = AuthorAccount.taken(email=self.email.data, username=self.username.data)
+        if "email" in taken:
             self.email.errors.append("Email already registered")
-            return False
-        return True
+        if "username" in taken:
+            self.username.errors.append("Username already registered")
+        return not taken
 
 
 class ForgotPassword(FlaskForm):
@@ -68,6 +78,21 @@ class ForgotPassword(FlaskForm):
     send_mail = SubmitField("SEND EMAIL")
 
 
+class ResetPasswordForm(FlaskForm):
+    """
+    Form to choose a new password with, reached from a password reset link
+    :cvar password: the new password
+    :cvar verify_password: the new password again
+    :cvar reset: Submit button for form data
+    """
+    password = PasswordField(validators=[DataRequired(),
+                                         EqualTo('verify_password', message="Passwords must match"),
+                                         Length(min=8, max=15)
+                                         ])
+    verify_password = PasswordField(validators=[DataRequired()])
+    reset = SubmitField("RESET PASSWORD")
+
+
 class StoryForm(FlaskForm):
     """
     Story form is used to write the actual story to be shared with others
@@ -114,6 +139,8 @@ class EditProfileForm(FlaskForm):
     about_me = TextAreaField(validators=[Length(max=250, message="Maximum characters exceeded")])
     edit_profile = SubmitField("Update Profile")
 
+    USERNAME_TAKEN = "This username is already in use, please pick another"
+
     def __init__(self, new_username, *args, **kwargs):
         """
         creates a new EditForm object
@@ -135,11 +162,9 @@ class EditProfileForm(FlaskForm):
         if self.username.data == self.new_username:
             return True
 
-        author = AuthorAccount.query.filter_by(username=self.username.data).first()
-
         # if author already exists return false
-        if author is not None:
-            self.username.errors.append("This username is already in use, please pick another")
+        if AuthorAccount.taken(username=self.username.data):
+            self.username.errors.append(self.USERNAME_TAKEN)
             return False
 
         # else, all is well, return true
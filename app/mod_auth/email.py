@@ -1,19 +1,19 @@
 from flask import current_app
 from app import mail
-from flask_mail import Message
+from app.utils.outbox import enqueue, make_message
 
 
 def send_mail(to, subject, template):
     """
     Sends a confirmation tmail to the new registering user
+    With OUTBOX_ENABLED the email is added to the outbox and sent by the outbox worker, so the request does
+    not wait on the mail server, see app.utils.outbox. The email is only added to the session, the caller
+    commits it along with the changes it goes with
     :param to: recipient of this email, the new registering user
     :param subject: The subject of the email
     :param template: The message body
     """
-    msg = Message(
-        subject=subject,
-        recipients=[to],
-        html=template,
-        sender=current_app.config.get("MAIL_DEFAULT_SENDER")
-    )
-    mail.send(msg)
+    if current_app.config.get("OUTBOX_ENABLED"):
+        enqueue(to, subject, template)
+    else:
+        mail.send(make_message(to, subject, template))
@@ -3,9 +3,95 @@ The email confirmation should contain a unique URL that a user simply needs to c
 Ideally, the URL should look something like this – http://hadithi.heroku.com/confirm/<id>.
 The key here is the id. We are going to encode the user email (along with a timestamp) in the id using the
  itsdangerous package.
+
+Tokens are made for a purpose, confirming an email or resetting a password, and each purpose signs with
+its own salt, so a token made for one can not be used for the other. The timestamp makes them expire after
+the max age of their purpose, TOKEN_CONFIRM_MAX_AGE and TOKEN_RESET_PASSWORD_MAX_AGE. Checking a token only
+needs the keys, so links that have expired or were tampered with are turned away before the database is
+read.
+
+Tokens are signed with SECRET_KEY and still accepted when signed with any of SECRET_KEY_FALLBACKS, which
+allows rotating the key without breaking links that have already been sent: move the old key to
+SECRET_KEY_FALLBACKS, set a new SECRET_KEY and drop the old key once the longest max age has passed.
+
+The serializers are built once per app by init_tokens.
 """
+from hashlib import sha256
 from flask import current_app
-from itsdangerous import URLSafeSerializer
+from itsdangerous import URLSafeTimedSerializer, BadData
+
+CONFIRM = "confirm"
+RESET_PASSWORD = "reset-password"
+
+
+class TokenService(object):
+    """
+    Makes and checks timed tokens, with a serializer for each purpose
+    :cvar max_ages: seconds tokens of each purpose are valid for
+    """
+
+    def __init__(self, secret_key, fallbacks=(), salt="", max_ages=None):
+        """
+        :param secret_key: key new tokens are signed with
+        :param fallbacks: older keys tokens are still accepted from
+        :param salt: salt the purpose of tokens is added to
+        :param max_ages: seconds tokens are valid for, by purpose
+        """
+        self.max_ages = dict(max_ages or {})
+        # itsdangerous signs with the last of the keys and checks with all of them
+        keys = list(fallbacks) + [secret_key]
+        self._serializers = dict((purpose, URLSafeTimedSerializer(keys, salt="%s.%s" % (salt, purpose)))
+                                 for purpose in self.max_ages)
+
+    def serializer(self, purpose):
+        try:
+            return self._serializers[purpose]
+        except KeyError:
+            raise ValueError("No tokens are made for %s" % purpose)
+
+    def dumps(self, purpose, value):
+        """
+        :param purpose: what the token is for
+        :param value: value carried by the token
+        :return: the signed token
+        :rtype: str
+        """
+        return self.serializer(purpose).dumps(value)
+
+    def loads(self, purpose, token):
+        """
+        :param purpose: what the token should be for
+        :param token: token to check
+        :return: the value carried by the token, None if it has expired, was tampered with or was made for
+        another purpose
+        """
+        try:
+            return self.serializer(purpose).loads(token, max_age=self.max_ages[purpose])
+        except BadData:
+            return None
+
+
+def init_tokens(app):
+    """
+    Creates the token service of the app
+    :param app: the current flask application
+    """
+    app.extensions["tokens"] = TokenService(
+        app.config.get("SECRET_KEY"),
+        fallbacks=app.config.get("SECRET_KEY_FALLBACKS", []),
+        salt=app.config.get("SECURITY_PASSWORD_SALT"),
+        max_ages={
+            CONFIRM: app.config.get("TOKEN_CONFIRM_MAX_AGE", 172800),
+            RESET_PASSWORD: app.config.get("TOKEN_RESET_PASSWORD_MAX_AGE", 3600),
+        })
+
+
+def token_service():
+    """
+    :return: the token service of the current app
+    :rtype: TokenService
+    """
+    return current_app.extensions["tokens"]
 
 
 def generate_confirmation_token(email):
@@ -13,21 +99,49 @@ def generate_confirmation_token(email):
     Generates a confirmation token for the user to confirm their account
     The actual email is encoded in the token
     :param email: The user email
-    :return:
+    :return: the token
+    :rtype: str
     """
-    serializer = URLSafeSerializer(current_app.config.get("SECRET_KEY"))
-    return serializer.dumps(email, salt=current_app.config.get("SECURITY_PASSWORD_SALT"))
+    return token_service().dumps(CONFIRM, email)
 
 
 def confirm_token(token):
     """
-    we use the loads() method, which takes the token and expiration period
-    :param token:
-    :return: An email as long as the token has not expired
+    Checks a confirmation token without touching the database
+    :param token: token from the confirmation link
+    :return: An email as long as the token has not expired, None otherwise
+    """
+    return token_service().loads(CONFIRM, token)
+
+
+def password_fingerprint(password_hash):
+    """
+    Short digest of a password hash carried by reset tokens, a token stops working once the password it was
+    made for is changed
+    :param password_hash: the author's current password hash
+    :rtype: str
+    """
+    return sha256((password_hash or "").encode("utf-8")).hexdigest()[:16]
+
+
+def generate_reset_token(author):
+    """
+    Generates a token for the author to reset their password with
+    :param author: author that forgot their password
+    :return: the token
+    :rtype: str
+    """
+    return token_service().dumps(RESET_PASSWORD, [author.email, password_fingerprint(author.password_hash)])
+
+
+def load_reset_token(token):
+    """
+    Checks a password reset token without touching the database
+    :param token: token from the reset link
+    :return: the email and the password fingerprint carried by the token, None if it is not valid
+    :rtype: tuple
     """
-    serializer = URLSafeSerializer(current_app.config.get("SECRET_KEY"))
-    email = serializer.loads(
-            token,
-            salt=current_app.config.get("SECURITY_PASSWORD_SALT"),
-        )
-    return email
+    value = token_service().loads(RESET_PASSWORD, token)
+    if not isinstance(value, list) or len(value) != 2:
+        return None
+    return tuple(value)
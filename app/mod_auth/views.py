@@ -1,18 +1,22 @@
 from . import auth
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, session
-from app.forms import LoginForm, RegisterForm, ForgotPassword
+from app.forms import LoginForm, RegisterForm, ForgotPassword, ResetPasswordForm
 from app.models import AuthorAccount, AsyncOperationStatus, AsyncOperation
 from app import db
 from flask_login import logout_user, login_required, login_user, current_user
-from app.mod_auth.token import generate_confirmation_token, confirm_token
+from app.mod_auth.token import generate_confirmation_token, confirm_token, generate_reset_token, \
+    load_reset_token, password_fingerprint
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from app.mod_auth.email import send_mail
 from app.mod_auth.facebook_auth import FacebookSignIn
 from app.utils.taskmanager import taskman
 from app.mod_auth.controllers import external_auth
+from app.utils.throttle import throttle
 
 
 @auth.route('/login', methods=["POST", "GET"])
+@throttle("login", email_field="login-form-email")
 def login():
     """
     Login route for user's to login to their accounts
@@ -24,6 +28,9 @@ def login():
             author = AuthorAccount.query.filter_by(email=login_form.email.data).first()
 
             if author is not None and author.verify_password(login_form.password.data):
+                # saves the password hash again if it was made with outdated parameters
+                db.session.commit()
+
                 # login the user
                 login_user(author, login_form.remember_me.data)
 
@@ -35,6 +42,7 @@ def login():
 
 
 @auth.route('/register', methods=["POST", "GET"])
+@throttle("register", email_field="register-form-email")
 def register():
     """
     Processes the registration form details. This is used to add the user to the database, if they
@@ -47,51 +55,54 @@ def register():
     if request.method == "POST":
         if register_form.validate_on_submit():
 
-            # check if the email already exists
-            author_email = AuthorAccount.query.filter_by(email=register_form.email.data).first()
-            author_username = AuthorAccount.query.filter_by(username=register_form.username.data).first()
-
-            # if no author exists with such an email or username, then register them
-            if author_email is None and author_username is None:
-                author_email = AuthorAccount(first_name=register_form.first_name.data,
-                                             last_name=register_form.last_name.data,
-                                             username=register_form.username.data,
-                                             email=register_form.email.data,
-                                             password=register_form.password.data,
-                                             confirmed=False,
-                                             registered_on=datetime.now())
-
-                db.session.add(author_email)
-                # make the user follow themselves
-                db.session.add(author_email.follow(author_email))
-                db.session.commit()
-
-                # generate token for email verification
-                token = generate_confirmation_token(author_email.email)
-
-                # _external adds the full absolute URL that includes the hostname and port
-                confirm_url = url_for('auth.confirm_email', token=token, _external=True)
-
-                # build the message
-                html = render_template('auth.confirm_email.html', confirm_url=confirm_url,
-                                       user=current_user)
-                subject = "Please confirm your email"
-
-                # send the user an email
-                send_mail(author_email.email, subject, html)
-
+            # check whether the email or the username already exists, with one query for both
+            author = None
+            if register_form.check_available():
+                author = AuthorAccount(first_name=register_form.first_name.data,
+                                       last_name=register_form.last_name.data,
+                                       username=register_form.username.data,
+                                       email=register_form.email.data,
+                                       password=register_form.password.data,
+                                       confirmed=False,
+                                       registered_on=datetime.now())
+
+                try:
+                    db.session.add(author)
+                    # make the user follow themselves
+                    db.session.add(author.follow(author))
+                    db.session.flush()
+
+                    # generate token for email verification
+                    token = generate_confirmation_token(author.email)
+
+                    # _external adds the full absolute URL that includes the hostname and port
+                    confirm_url = url_for('auth.confirm_email', token=token, _external=True)
+
+                    # build the message
+                    html = render_template('auth.confirm_email.html', confirm_url=confirm_url,
+                                           user=current_user)
+                    subject = "Please confirm your email"
+
+                    # send the user an email, from the outbox it is committed along with the author
+                    send_mail(author.email, subject, html)
+                    db.session.commit()
+                except IntegrityError:
+                    # someone registered the email or username since the check, the unique constraints
+                    # have the final say, so find out which one it was
+                    db.session.rollback()
+                    author = None
+                    if register_form.check_available():
+                        register_form.email.errors.append("Registration failed, please try again")
+
+            if author is not None:
                 # login the user
-                login_user(author_email)
+                login_user(author)
                 flash(message='A confirmation email has been sent via email.', category='success')
 
             else:
                 # display the appropriate error message based on what is a duplicate
-                if author_email is not None:
-                    register_form.email.errors.append("Email already registered")
-                    flash(message="Email already registered", category="error")
-                if author_username is not None:
-                    register_form.email.errors.append("Username already registered")
-                    flash(message="Username already registered", category="error")
+                for error in register_form.email.errors + register_form.username.errors:
+                    flash(message=error, category="error")
 
             # redirect the unconfirmed users to their dashboard, but to the unconfirmed view
             return redirect(url_for('dashboard.unconfirmed'))
@@ -99,7 +110,6 @@ def register():
 
 
 @auth.route('/confirm/<token>')
-@login_required
 def confirm_email(token):
     """
     Confirm email route for the user. Checks if the author has already confirmed their account
@@ -109,24 +119,28 @@ def confirm_email(token):
     Also, in case the user already went through the confirmation process – and is confirmed –
     then we alert the user of this.
 
+    The token is checked before the logged in author is loaded, so links that have expired or were tampered
+    with are turned away without reading the database. Valid links still require the author to login.
+
     :param token: Generated in the user registration
     :return: A redirect to login
     """
+    email = confirm_token(token)
+    if email is None:
+        flash(message='The confirmation link is invalid or has expired.', category='danger')
+        return redirect(url_for('auth.login'))
+
+    if not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
 
     # if the current user had been confirmed, redirect them to login
     if current_user.confirmed:
         flash(message='Account already confirmed. Please login.', category='success')
         return redirect(url_for('auth.login'))
 
-    # else confirm them
-    # get the email for the confirmed
-
-    email = confirm_token(token)
-
-    # get the author or throw an error
-    author = AuthorAccount.query.filter_by(email=current_user.email).first_or_404()
-
-    if author.email == email:
+    # else confirm them, as long as the link was sent to their email
+    if current_user.email == email:
+        author = current_user._get_current_object()
         author.confirmed = True
         author.confirmed_on = datetime.now()
 
@@ -144,11 +158,58 @@ def confirm_email(token):
 
 
 @auth.route('/forgot-password', methods=["GET", "POST"])
+@throttle("forgot_password", email_field="email")
 def forgot_password():
+    """
+    Sends a link to reset their password to the author with the submitted email. The same message is shown
+    whether or not an author has the email, so the form can not be used to find out who is registered
+    :return: the password recovery form, or a redirect to login once it is submitted
+    """
     forgot_pass = ForgotPassword(request.form)
+    if request.method == "POST" and forgot_pass.validate_on_submit():
+        author = AuthorAccount.query.filter_by(email=forgot_pass.email.data).first()
+        if author is not None:
+            token = generate_reset_token(author)
+            reset_url = url_for('auth.reset_password', token=token, _external=True)
+            html = render_template('auth.reset_password_email.html', reset_url=reset_url, user=current_user)
+            send_mail(author.email, "Reset your password", html)
+            db.session.commit()
+
+        flash(message="If an account uses that email, a link to reset its password has been sent.",
+              category="success")
+        return redirect(url_for('auth.login'))
     return render_template('auth.password-recovery.html', forgot_pass=forgot_pass, user=current_user)
 
 
+@auth.route('/reset-password/<token>', methods=["GET", "POST"])
+def reset_password(token):
+    """
+    Lets the author choose a new password from the link sent by forgot_password. The token is checked
+    before the database is read, and it stops working once the password has been changed
+    :param token: Generated when the author asked to reset their password
+    :return: the reset password form, or a redirect to login once the password has been reset
+    """
+    email_fingerprint = load_reset_token(token)
+    author = None
+    if email_fingerprint is not None:
+        email, fingerprint = email_fingerprint
+        author = AuthorAccount.query.filter_by(email=email).first()
+        if author is not None and password_fingerprint(author.password_hash) != fingerprint:
+            author = None
+
+    if author is None:
+        flash(message='The password reset link is invalid or has expired.', category='danger')
+        return redirect(url_for('auth.forgot_password'))
+
+    reset_form = ResetPasswordForm(request.form)
+    if request.method == "POST" and reset_form.validate_on_submit():
+        author.password = reset_form.password.data
+        db.session.commit()
+        flash(message="Your password has been reset, please login.", category="success")
+        return redirect(url_for('auth.login'))
+    return render_template('auth.reset_password.html', reset_form=reset_form, token=token, user=current_user)
+
+
 @auth.route("/facebook_authorize")
 def facebook_authorize():
     """
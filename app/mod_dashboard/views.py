@@ -1,6 +1,9 @@
 from . import dashboard
 from flask import render_template, redirect, url_for, request, flash
 from flask_login import current_user, login_required
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from app.forms import EditProfileForm
 from app.models import AuthorAccount, Story
 from app.forms import StoryForm
@@ -8,6 +11,28 @@ from app.utils.decorators import check_confirmed
 from app import db
 from app.mod_auth.token import generate_confirmation_token
 from app.mod_auth.email import send_mail
+from app.utils.pagination import paginate_stories
+from app.mod_story.cards import story_cards
+from app.utils.conditional import conditional
+
+
+def dashboard_validators(username):
+    """
+    :return: when the logged in author and their stories last changed and how many stories they have, read
+    from the story table without loading any story
+    :rtype: tuple
+    """
+    newest, count = db.session.query(func.max(Story.date_modified), func.count(Story.id)).filter(
+        Story.author_id == current_user.id).one()
+    return current_user.date_modified, newest, count
+
+
+def account_validators(username):
+    """
+    :return: when the logged in author last changed
+    :rtype: tuple
+    """
+    return (current_user.date_modified,)
 
 
 @dashboard.route('/unconfirmed')
@@ -19,7 +44,7 @@ def unconfirmed():
     """
     # if the user is confirmed, take them to their dashboard
     if current_user.confirmed:
-        return redirect(url_for('dashboard.user_dashboard', username=current_user.full_name))
+        return redirect(url_for('dashboard.user_dashboard', username=current_user.username))
     flash(message='Please confirm your account!', category='warning')
     return render_template('auth.unconfirmed.html', user=current_user)
 
@@ -45,6 +70,7 @@ def resend_confirmation():
 
     # send the email
     send_mail(current_user.email, subject, html)
+    db.session.commit()
 
     flash(message='A new confirmation email has been sent.', category='success')
 
@@ -55,19 +81,33 @@ def resend_confirmation():
 @dashboard.route("/<string:username>")
 @login_required
 @check_confirmed
+@conditional(dashboard_validators)
 def user_dashboard(username):
     """
     Displays all stories/articles written by this author in a grid
     Cheks if the user is logged in and logs them into their dashboard,
     Checks if the user has been confirmed and display the dashboard if they have
+    Stories are displayed one page at a time, the cursor query argument is the id of the last story of the
+    previous page
     :return user dashboard
     """
-    stories = Story.query.filter_by(author_id=current_user.id).all()
-    return render_template("dashboard.userdashboard.html", user=current_user, stories=stories)
+    page = paginate_stories(Story.latest().options(joinedload(Story.author)).filter(
+        Story.author_id == current_user.id),
+                            cursor=request.args.get("cursor", type=int))
+    context = dict(
+        user=current_user,
+        page=page,
+        cards=story_cards(page.items),
+        next_page_url=url_for("dashboard.user_dashboard", username=username, cursor=page.next_cursor),
+        next_fragment_url=url_for("story.feed", source="author", username=current_user.username,
+                                  cursor=page.next_cursor)
+    )
+    return render_template("dashboard.userdashboard.html", **context)
 
 
 @dashboard.route("/<string:username>/account")
 @login_required
+@conditional(account_validators)
 def user_account(username):
     """
     View function for user account
@@ -101,14 +141,19 @@ def edit_profile(username):
             current_user.about_me = form.about_me.data
 
             db.session.add(current_user)
-            db.session.commit()
-            flash(message="Your changes have been saved successfully", category="success")
-
-            # if update is successful, redirect to user dashboard
-            return redirect(url_for("dashboard.user_account", username=username))
-        else:
-            flash(message="Profile not updated", category="error")
-            return render_template("auth.edit_profile.html", form=form, user=current_user)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # the username was taken since it was checked
+                db.session.rollback()
+                form.username.errors.append(form.USERNAME_TAKEN)
+            else:
+                flash(message="Your changes have been saved successfully", category="success")
+
+                # if update is successful, redirect to user dashboard
+                return redirect(url_for("dashboard.user_account", username=username))
+        flash(message="Profile not updated", category="error")
+        return render_template("auth.edit_profile.html", form=form, user=current_user)
     return render_template("auth.edit_profile.html", form=form, user=current_user)
 
 
@@ -127,6 +172,10 @@ def write_story(username):
                           category=story_form.category.data, content=story_form.content.data,
                           author_id=user.id)
             db.session.add(story)
+            db.session.flush()
+
+            # push the new story to the followers' timelines in the same transaction
+            story.fan_out()
             db.session.commit()
-            return redirect(url_for('dashboard.user_dashboard', username=user.full_name))
+            return redirect(url_for('dashboard.user_dashboard', username=user.username))
     return render_template("dashboard.new_story.html", user=user, story_form=story_form)
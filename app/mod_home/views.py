@@ -1,24 +1,41 @@
 from . import home_module
-from flask import render_template, request
+from flask import render_template, request, url_for, abort, current_app
 from flask_login import current_user
-from app.models import Story, AuthorAccount
+from sqlalchemy.orm import joinedload
+from app.models import Story, Category
 from app.forms import ContactForm
+from app.utils.pagination import paginate_stories
+from app.mod_story.cards import story_cards
+from app.utils.response_cache import cached_response
+from app.utils.identicon import identicon_svg
+import re
 
 
 @home_module.route('/')
 @home_module.route('index')
 @home_module.route('home')
+@cached_response
 def index():
-    # stories = Story.query.all()
-    author = AuthorAccount
+    """
+    Home page, displays the latest stories one page at a time. The cursor query argument is the id of the
+    last story of the previous page
+    :return: home page template
+    """
+    page = paginate_stories(Story.latest().options(joinedload(Story.author)),
+                            cursor=request.args.get("cursor", type=int))
     context = dict(
-        author=author,
-        user=current_user
+        user=current_user,
+        categories=Category.facets(),
+        page=page,
+        cards=story_cards(page.items),
+        next_page_url=url_for("home.index", cursor=page.next_cursor),
+        next_fragment_url=url_for("story.feed", cursor=page.next_cursor)
     )
     return render_template('home.index.html', **context)
 
 
 @home_module.route('contact')
+@cached_response
 def contact():
     user = current_user
     contact_form = ContactForm(request.form)
@@ -26,6 +43,7 @@ def contact():
 
 
 @home_module.route('about')
+@cached_response
 def about():
     """
     About content, displays about page
@@ -35,6 +53,24 @@ def about():
     return render_template('home.about.html', user=user)
 
 
+@home_module.route('avatar/<string:email_hash>.svg')
+def identicon(email_hash):
+    """
+    Identicon of an author, used as their avatar when AVATAR_SOURCE is identicon. The image only depends on
+    the email hash in the link, so browsers may keep it for good. Query arguments:
+    s: size of the image in pixels
+    :return: SVG image
+    """
+    if not re.match(r"^[0-9a-f]{32}$", email_hash):
+        abort(404)
+    size = min(max(request.args.get("s", 64, type=int), 8), 512)
+    response = current_app.response_class(identicon_svg(email_hash, size), mimetype="image/svg+xml")
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
+
+
 @home_module.route("google-site-verification: google2f512247f9616fa3.html")
 def google_verification():
     return render_template("google2f512247f9616fa3.html")
@@ -0,0 +1,75 @@
+"""
+Story cards are everything the story grid and the story content panels need to render a story.
+They are built in the view from stories whose author and category have already been loaded with the
+story, so that rendering a page of cards runs no queries at all. Cards never carry the content of the story, which is
+only loaded by the story detail view.
+"""
+from flask import url_for
+
+DEFAULT_AVATAR = "https://dummyimage.com/50x50/000/a7a9c7&text=?"
+
+
+class StoryCard(object):
+    """
+    Ready to render story card
+    :cvar story_id: id of the story
+    :cvar title: title of the story
+    :cvar category: name of the category of the story
+    :cvar category_url: link to the stories of the category, None if the story has no category
+    :cvar label: what the card shows under the title, the category or the tagline if there is no category
+    :cvar tagline: tagline of the story
+    :cvar url: link to read the whole story
+    :cvar excerpt: beginning of the content of the story
+    :cvar reading_minutes: how long the story takes to read
+    :cvar date_created: when the story was written
+    :cvar date_modified: when the story was last changed
+    :cvar author_modified: when the author was last changed
+    :cvar author_username: username of the author
+    :cvar author_name: full name of the author
+    :cvar avatar_url: link to the author's avatar
+    :cvar version: changes whenever anything the card shows changes, the key of its cached fragments
+    """
+
+    def __init__(self, story):
+        """
+        :param story: story whose author relationship has already been loaded
+        """
+        author = story.author
+        self.story_id = story.id
+        self.title = story.title
+        category = story.category
+        self.category = category.name if category is not None else None
+        self.category_url = url_for("story.category", slug=category.slug) if category is not None else None
+        self.label = self.category or story.tagline
+        self.tagline = story.tagline
+        self.url = url_for("story.view_story", story_id=story.id)
+        self.excerpt = story.excerpt or ""
+        self.reading_minutes = story.reading_minutes or 1
+        self.date_created = story.date_created
+        self.date_modified = story.date_modified
+
+        if author is not None:
+            self.author_username = author.username
+            self.author_name = "%s %s" % (author.first_name, author.last_name)
+            self.avatar_url = author.avatar(64)
+            self.author_modified = author.date_modified
+        else:
+            self.author_username = ""
+            self.author_name = ""
+            self.avatar_url = DEFAULT_AVATAR
+            self.author_modified = None
+
+        # made from what the card shows rather than from date_modified, which SQLite only keeps to the
+        # second, so that two edits within a second still make a new version
+        self.version = hash((self.title, self.category, self.category_url, self.label, self.tagline, self.url,
+                             self.excerpt, self.reading_minutes, self.date_created, self.author_username,
+                             self.author_name, self.avatar_url))
+
+
+def story_cards(stories):
+    """
+    :param stories: stories loaded with their authors
+    :return: list of story cards in the same order as the stories
+    :rtype: list
+    """
+    return [StoryCard(story) for story in stories]
@@ -1,13 +1,138 @@
 from . import story_module
-from flask import render_template
-from app.models import Story
+from flask import render_template, request, url_for, abort, current_app, get_flashed_messages, stream_template
+from flask_login import current_user
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Story, AuthorAccount, Category
+from app.utils.pagination import paginate_stories
+from app.mod_story.cards import story_cards
+from app.utils.search import search_stories
+from app.utils.conditional import conditional
+
+
+def story_validators(story_id):
+    """
+    :return: when the story, its author and its category last changed, None if there is no such story
+    :rtype: tuple
+    """
+    return db.session.query(Story.date_modified, AuthorAccount.date_modified, Category.date_modified).outerjoin(
+        AuthorAccount, AuthorAccount.id == Story.author_id).outerjoin(
+        Category, Category.id == Story.category_id).filter(Story.id == story_id).first()
 
 
 @story_module.route('/<int:story_id>')
+@conditional(story_validators)
 def view_story(story_id):
     """
     Displays the story for viewing.
     Takes in a specific story id to be used to display the story to the user
+    This is the only view that loads the content of a story, along with the story and its author.
+    The page is streamed as the template renders, the head, styles and sidebar are sent before the content
+    of the story is loaded, which only happens when the template reaches it
     :return: The template for the viewing story/ story being read
     """
-    return render_template("")
+    story = Story.query.options(joinedload(Story.author)).filter(Story.id == story_id).first_or_404()
+
+    # the session is saved before the first chunk is sent, take the flashed messages and the logged in
+    # author out of it while it can still change
+    get_flashed_messages(with_categories=True)
+    user = current_user._get_current_object()
+
+    # generates the template in the request context, chunk by chunk
+    return current_app.response_class(stream_template("story.story_detail.html", story=story, user=user))
+
+
+@story_module.route('/feed')
+def feed():
+    """
+    Returns only the HTML fragment of the next page of grid items, along with a new 'Load more' footer,
+    so that pages can append it without re-rendering. Query arguments:
+    source: which listing to page through, latest (default), following, author or category
+    username: the author whose stories to page through when source is author
+    category: slug of the category whose stories to page through when source is category
+    cursor: id of the last story of the previous page
+    :return: HTML fragment of story grid items
+    """
+    source = request.args.get("source", "latest")
+    username = request.args.get("username")
+    slug = request.args.get("category")
+    cursor = request.args.get("cursor", type=int)
+
+    if source == "latest":
+        query = Story.latest()
+        next_page_endpoint = dict(endpoint="home.index")
+    elif source == "following":
+        if not current_user.is_authenticated:
+            abort(403)
+        def query(cursor, limit):
+            return current_user.followed_stories(cursor, limit).options(joinedload(Story.author))
+        next_page_endpoint = dict(endpoint="story.feed", source=source)
+    elif source == "author":
+        author = AuthorAccount.query.filter_by(username=username).first_or_404()
+        query = Story.latest().filter(Story.author_id == author.id)
+        next_page_endpoint = dict(endpoint="dashboard.user_dashboard", username=username)
+    elif source == "category":
+        category = Category.query.filter_by(slug=slug).first_or_404()
+        query = Story.latest().filter(Story.category_id == category.id)
+        next_page_endpoint = dict(endpoint="story.category", slug=slug)
+    else:
+        abort(400)
+
+    if not callable(query):
+        query = query.options(joinedload(Story.author))
+    page = paginate_stories(query, cursor=cursor)
+    context = dict(
+        page=page,
+        cards=story_cards(page.items),
+        next_page_url=url_for(cursor=page.next_cursor, **next_page_endpoint),
+        next_fragment_url=url_for("story.feed", source=source, username=username, category=slug,
+                                  cursor=page.next_cursor)
+    )
+    return render_template("story.feed.html", **context)
+
+
+@story_module.route('/category/<string:slug>')
+def category(slug):
+    """
+    Stories of a category, newest first, one page at a time, with the other categories to browse to.
+    The cursor query argument is the id of the last story of the previous page
+    :param slug: slug of the category
+    :return: category page template
+    """
+    current_category = Category.query.filter_by(slug=slug).first_or_404()
+    page = paginate_stories(Story.latest().filter(Story.category_id == current_category.id).options(
+        joinedload(Story.author)), cursor=request.args.get("cursor", type=int))
+    context = dict(
+        user=current_user,
+        current_category=current_category,
+        categories=Category.facets(),
+        page=page,
+        cards=story_cards(page.items),
+        next_page_url=url_for("story.category", slug=slug, cursor=page.next_cursor),
+        next_fragment_url=url_for("story.feed", source="category", category=slug, cursor=page.next_cursor)
+    )
+    return render_template("story.category.html", **context)
+
+
+@story_module.route('/search')
+def search():
+    """
+    Searches the titles, taglines and content of stories, best match first. Query arguments:
+    q: the search terms
+    page: number of the page of results, starting from 1
+    fragment: when set only the grid items of the page are returned, like the feed
+    :return: search results template
+    """
+    terms = request.args.get("q", "").strip()
+    page = search_stories(terms, page=request.args.get("page", 1, type=int))
+    context = dict(
+        user=current_user,
+        terms=terms,
+        page=page,
+        cards=story_cards(page.items),
+        next_page_url=url_for("story.search", q=terms, page=page.next_cursor),
+        next_fragment_url=url_for("story.search", q=terms, page=page.next_cursor, fragment=1)
+    )
+    if request.args.get("fragment"):
+        return render_template("story.feed.html", **context)
+    return render_template("story.search.html", **context)
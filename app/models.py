@@ -1,15 +1,53 @@
-from sqlalchemy import Column, String, Integer, DateTime, func, ForeignKey, Boolean, Table
-from sqlalchemy.orm import relationship, backref, dynamic
+from sqlalchemy import Column, String, Integer, DateTime, func, ForeignKey, Boolean, Table, Index, select, literal, \
+    event, inspect, bindparam, or_, Text, union, exists
+from sqlalchemy.orm import relationship, backref, dynamic, object_session, validates, column_property
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from flask import current_app, has_app_context, has_request_context, url_for
+import zlib
+import math
+import re
 from abc import ABCMeta, abstractmethod
 from hashlib import md5
 import uuid
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.ext.declarative import declared_attr
 from flask_login import UserMixin
 from . import db, login_manager
 from datetime import datetime
 
 
+class CompressedText(TypeDecorator):
+    """
+    Text column that is stored as bytes, zlib compressed when STORY_CONTENT_COMPRESSION is set and the text
+    is at least STORY_CONTENT_COMPRESSION_MIN_LENGTH characters long. The first byte records how the rest
+    is stored, z for compressed and t for plain utf-8, so that both can be read back whatever the current
+    configuration is
+    """
+    impl = LargeBinary
+
+    COMPRESSED = b"z"
+    PLAIN = b"t"
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode("utf-8")
+        compress, min_length = True, 256
+        if has_app_context():
+            compress = current_app.config.get("STORY_CONTENT_COMPRESSION", compress)
+            min_length = current_app.config.get("STORY_CONTENT_COMPRESSION_MIN_LENGTH", min_length)
+        if compress and len(value) >= min_length:
+            return self.COMPRESSED + zlib.compress(data)
+        return self.PLAIN + data
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = bytes(value)
+        if value[:1] == self.COMPRESSED:
+            return zlib.decompress(value[1:]).decode("utf-8")
+        return value[1:].decode("utf-8")
+
+
 class Base(db.Model):
     """
     Base class where all tables inherit from
@@ -30,12 +68,28 @@ class Base(db.Model):
 
 # This is not a model but an association table to allow for a many to many relationship
 # where a user can have many followers and can follow many other users
+# The primary key makes every (follower, followed) pair unique and covers follow checks, the index on
+# (followed_id, follower_id) covers fan-out and listing an author's followers
 followers = Table("followers",
                   db.metadata,
-                  Column("follower_id", Integer, ForeignKey("author.id")),
-                  Column("followed_id", Integer, ForeignKey("author.id"))
+                  Column("follower_id", Integer, ForeignKey("author.id"), primary_key=True),
+                  Column("followed_id", Integer, ForeignKey("author.id"), primary_key=True),
+                  Index("ix_followers_followed_id_follower_id", "followed_id", "follower_id")
                   )
 
+# Materialized timeline, one row per (reader, story). Rows are pushed here when a story is written
+# (fan-out-on-write) so that reading a feed is a single range scan on (owner_id, story_created)
+# instead of a join of followers and story. Authors with very many followers are not fanned out,
+# their stories are pulled at read time instead, see AuthorAccount.followed_stories
+timeline = Table("timeline",
+                 db.metadata,
+                 Column("owner_id", Integer, ForeignKey("author.id"), primary_key=True),
+                 Column("story_id", Integer, ForeignKey("story.id"), primary_key=True),
+                 Column("author_id", Integer, ForeignKey("author.id"), nullable=False),
+                 Column("story_created", DateTime, nullable=False),
+                 Index("ix_timeline_owner_story_created", "owner_id", "story_created", "story_id")
+                 )
+
 
 class AuthorAccount(Base, UserMixin):
     """
@@ -53,12 +107,17 @@ class AuthorAccount(Base, UserMixin):
     :cvar first_name, the first name of the user
     :cvar last_name, last name of user
     :cvar email, the email of the user
+    :cvar email_hash, md5 of the trimmed, lower cased email, kept up to date when the email is set. Used to
+    link to the author's avatar
     :cvar username: Author's username
     :cvar password_hash, the password that will be hashed and hidden from other users
     :cvar admin, whether this user is an admin, default is false
     :cvar registered_on, date this account was registered
     :cvar confirmed, whether this identity has been verified by the user
     :cvar confirmed_on, the date this account was confirmed
+    :cvar followers_count, number of authors following this author, kept up to date by follow and unfollow
+    :cvar following_count, number of authors this author follows, kept up to date by follow and unfollow
+    :cvar stories_count, number of stories written by this author, kept up to date when stories are saved
     """
 
     __tablename__ = "author"
@@ -67,6 +126,7 @@ class AuthorAccount(Base, UserMixin):
     first_name = Column(String(100), nullable=False, index=True)
     last_name = Column(String(100), nullable=False, index=True)
     email = Column(String(250), nullable=False, unique=True, index=True)
+    email_hash = Column(String(32))
     username = Column(String(250), nullable=False, unique=True, index=True)
     about_me = Column(String(250), nullable=True)
     last_seen = Column(DateTime)
@@ -75,6 +135,9 @@ class AuthorAccount(Base, UserMixin):
     registered_on = Column(DateTime, nullable=False)
     confirmed = Column(Boolean, nullable=False, default=False)
     confirmed_on = Column(DateTime, nullable=True)
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
+    stories_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     stories = relationship("Story", backref="author", lazy="dynamic")
 
@@ -86,34 +149,159 @@ class AuthorAccount(Base, UserMixin):
                              lazy="dynamic"
                              )
 
+    @validates("email")
+    def validate_email(self, key, email):
+        """
+        Keeps the email hash and the avatar links in step with the email
+        """
+        self.email_hash = self.hash_email(email)
+        self._avatar_urls = {}
+        return email
+
+    @staticmethod
+    def hash_email(email):
+        """
+        :param email: email to hash
+        :return: md5 of the trimmed, lower cased email, as Gravatar expects it
+        :rtype: str
+        """
+        return md5((email or "").strip().lower().encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def taken(email=None, username=None):
+        """
+        Finds out which of an email and a username are already used by authors with a single query on their
+        unique indexes. At most one author can have each, so at most two rows are read
+        This is only a courtesy check for forms, the unique constraints are what keep them unique when two
+        authors submit the same email or username at once
+        :param email: email to look for
+        :param username: username to look for
+        :return: the names of the fields that are taken, "email" and/or "username"
+        :rtype: set
+        """
+        conditions = []
+        if email:
+            conditions.append(AuthorAccount.email == email)
+        if username:
+            conditions.append(AuthorAccount.username == username)
+        if not conditions:
+            return set()
+
+        rows = db.session.query(AuthorAccount.email, AuthorAccount.username).filter(or_(*conditions)).limit(2)
+        taken = set()
+        for row_email, row_username in rows:
+            if email and row_email == email:
+                taken.add("email")
+            if username and row_username == username:
+                taken.add("username")
+        return taken
+
     def avatar(self, size):
         """
         responsible for getting a user avatar. will reduce load on server by getting avatar image from Gravatar
-        This creates an md5 hash of the user email and then incorporates it into the specially crafted URL
+        This incorporates the md5 hash of the user email into the specially crafted URL
         After the md5 of the email you can provide a number of options to customize the avatar.
         The d=mm determines what placeholder image is returned when a user does not have an Gravatar account.
         The mm option returns the "mystery man" image, a gray silhouette of a person.
         The s=N option requests the avatar scaled to the given size in pixels.
         More information -> https://en.gravatar.com/site/implement/images
+
+        If AVATAR_SOURCE is identicon, the link is to an identicon generated by the application instead, so
+        that pages do not wait on Gravatar. Linking to it needs a request or SERVER_NAME, the CLI and the
+        outbox worker have neither and get the Gravatar link.
+        Links are worked out once per size and kept on the instance
         :param size: size of the image
         :return: link to user's avatar
         """
-        return 'http://www.gravatar.com/avatar/%s?d=mm&s=%d' % (md5(self.email.encode("utf-8")).hexdigest(), size)
+        urls = getattr(self, "_avatar_urls", None)
+        if urls is None:
+            urls = self._avatar_urls = {}
+        url = urls.get(size)
+        if url is None:
+            email_hash = self.email_hash or self.hash_email(self.email)
+            if has_app_context() and current_app.config.get("AVATAR_SOURCE") == "identicon" and (
+                    has_request_context() or current_app.config.get("SERVER_NAME")):
+                url = url_for("home.identicon", email_hash=email_hash, s=size)
+            else:
+                url = 'http://www.gravatar.com/avatar/%s?d=mm&s=%d' % (email_hash, size)
+            urls[size] = url
+        return url
+
+    def followed_stories(self, cursor=None, limit=None):
+        """
+        This returns all the stories written by the authors this Author is following, newest first.
+        Stories are read from the materialized timeline of this author, which is filled when a story is
+        written (see Story.fan_out) and when this author follows someone. That makes the read a single
+        range scan on the timeline index.
+
+        Authors with more followers than TIMELINE_FANOUT_THRESHOLD are never fanned out, so their stories
+        are pulled from the story table at read time and merged with the timeline.
+
+        Given a cursor and a limit, as paginate_stories does, each of the two reads is ordered, continued
+        after the cursor and cut at the limit on its own index, timeline.story_created and story_id for the
+        timeline, so that only the ids of at most two pages of stories are merged and sorted
+        :param cursor: id of the last story of the previous page
+        :param limit: most stories to fetch
+        :return: Query of the stories this author follows ordered by date created in descending order
+        """
+        from app.utils.pagination import keyset_filter
+
+        pushed = select([timeline.c.story_id]).where(timeline.c.owner_id == self.id)
+
+        followed_ids = select([followers.c.followed_id]).where(followers.c.follower_id == self.id)
+        pulled = select([Story.id]).select_from(
+            Story.__table__.join(followers, followers.c.followed_id == Story.author_id)).where(
+            followers.c.follower_id == self.id).where(
+            Story.author_id.in_(AuthorAccount.large_followings(followed_ids)))
+
+        if cursor is not None:
+            pushed = pushed.where(keyset_filter(cursor, timeline.c.story_created, timeline.c.story_id))
+            pulled = pulled.where(keyset_filter(cursor))
+        if limit is not None:
+            pushed = pushed.order_by(timeline.c.story_created.desc(), timeline.c.story_id.desc()).limit(limit)
+            pulled = pulled.order_by(Story.date_created.desc(), Story.id.desc()).limit(limit)
+
+        # each read is a subquery of its own so that it keeps its ORDER BY and LIMIT within the UNION
+        story_ids = union(select([pushed.alias("pushed").c.story_id]), select([pulled.alias("pulled").c.id]))
+        return Story.query.filter(Story.id.in_(story_ids)).order_by(Story.date_created.desc(), Story.id.desc())
+
+    @staticmethod
+    def fanout_threshold():
+        """
+        :return: number of followers above which an author's stories are pulled at read time instead of
+        being pushed to every follower's timeline
+        :rtype: int
+        """
+        return current_app.config.get("TIMELINE_FANOUT_THRESHOLD", 10000)
+
+    @staticmethod
+    def large_followings(author_ids):
+        """
+        Selects the authors, out of the given ones, whose follower count is above the fan-out threshold
+        :param author_ids: selectable of author ids to check
+        :return: selectable of the author ids that are not fanned out on write
+        """
+        return select([AuthorAccount.id]).where(AuthorAccount.id.in_(author_ids)).where(
+            AuthorAccount.followers_count > AuthorAccount.fanout_threshold())
+
+    def has_large_following(self):
+        """
+        :return: True if this author's stories are pulled at read time instead of being fanned out
+        :rtype: bool
+        """
+        return (self.followers_count or 0) > self.fanout_threshold()
 
-    def followed_stories(self):
+    def _increment(self, counter, delta):
         """
-        This returns all the stories this Author is following
-        Will fetch the posts and order them by the time the stories were created in descending order
-        the join operation will create a temporary table with data from the followers and data from the
-        story table and merge them based on whether the author id matches
-        
-        Filter will return only stories that this particular user follows
-        
-        after that we sort the results of the new temp table in descending order by time
-        :return: All the stories this user follows, this is based on the authors this user follows
+        Adds delta to one of this author's counters. For authors already in the database this is written as
+        counter = counter + delta so that concurrent follows do not overwrite each other
+        :param counter: name of the counter column
+        :param delta: amount to add
         """
-        return Story.query.join(followers, (followers.c.followed_id == Story.author_id)).filter(
-            followers.c.followed_id == self.id).order_by(Story.date_created.desc())
+        if inspect(self).persistent:
+            setattr(self, counter, getattr(AuthorAccount, counter) + delta)
+        else:
+            setattr(self, counter, (getattr(self, counter) or 0) + delta)
 
     def follow(self, user):
         """
@@ -125,6 +313,9 @@ class AuthorAccount(Base, UserMixin):
         """
         if not self.is_following(user):
             self.following.append(user)
+            self.backfill_timeline(user)
+            self._increment("following_count", 1)
+            user._increment("followers_count", 1)
             return self
 
     def unfollow(self, user):
@@ -136,9 +327,46 @@ class AuthorAccount(Base, UserMixin):
         :rtype: AuthorAccount or None
         """
         if self.is_following(user):
+            # the author's stories are pushed again once they are back within the fan-out threshold
+            fan_in = user.has_large_following() and user.followers_count - 1 <= user.fanout_threshold()
             self.following.remove(user)
+            self._increment("following_count", -1)
+            user._increment("followers_count", -1)
+            db.session.execute(timeline.delete().where(timeline.c.owner_id == self.id).where(
+                timeline.c.author_id == user.id))
+            if fan_in:
+                db.session.flush()
+                user.backfill_follower_timelines()
             return self
 
+    def backfill_timeline(self, user):
+        """
+        Copies the stories already written by the given author into this author's timeline, this is done
+        when this author starts following them. Authors with a large following are skipped as their
+        stories are pulled at read time
+        :param user: the author that is now being followed
+        """
+        if self.id is None or user.id is None or user.has_large_following():
+            return
+        stories = select([literal(self.id), Story.id, Story.author_id, Story.date_created]).where(
+            Story.author_id == user.id)
+        db.session.execute(timeline.insert().from_select(
+            ["owner_id", "story_id", "author_id", "story_created"], stories))
+
+    def backfill_follower_timelines(self):
+        """
+        Copies the stories of this author into the timeline of every follower that does not have them yet.
+        This is done when the author drops back to TIMELINE_FANOUT_THRESHOLD followers, their stories were
+        pulled at read time until then and are pushed from now on
+        """
+        fans = select([followers.c.follower_id, Story.id, Story.author_id, Story.date_created]).select_from(
+            followers.join(Story.__table__, followers.c.followed_id == Story.author_id)).where(
+            Story.author_id == self.id).where(
+            ~exists().where(timeline.c.owner_id == followers.c.follower_id).where(
+                timeline.c.story_id == Story.id))
+        db.session.execute(timeline.insert().from_select(
+            ["owner_id", "story_id", "author_id", "story_created"], fans))
+
     def is_following(self, user):
         """
         We are taking the followed relationship query, which returns all the (follower, followed) pairs that 
@@ -148,10 +376,25 @@ class AuthorAccount(Base, UserMixin):
         The return from the filter call is the modified query, still without having executed. So we then call 
         count() on this query, and now the query will execute and return the number of records found. 
         If we get one, then we know a link between these two uses is already present. 
-        If we get none then we know a link does not exist.        
+        If we get none then we know a link does not exist.
+
+        If the in-process follower graph is enabled, the check is answered from memory instead, with no
+        database round trip. Pending follows are flushed first, like the query would have, and follows the
+        session has flushed but not committed yet are answered by the session
         :param user: the user to check against this user
         :return: Whether there is a link between this user and the user to check whether they are following
         """
+        from app.utils.follower_graph import follower_graph, pending_follow
+        graph = follower_graph()
+        if graph is not None and self.id is not None and user.id is not None:
+            session = object_session(self)
+            if session is not None:
+                if session.autoflush:
+                    session.flush()
+                pending = pending_follow(session, self.id, user.id)
+                if pending is not None:
+                    return pending
+            return graph.is_following(self.id, user.id)
         return self.following.filter(followers.c.followed_id == user.id).count() > 0
 
     @property
@@ -168,14 +411,27 @@ class AuthorAccount(Base, UserMixin):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from app.utils.passwords import hash_password
+        self.password_hash = hash_password(password)
 
     @password.getter
     def get_password(self):
         return self.password_hash
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """
+        Checks the password against the stored hash. A hash made with outdated parameters is replaced with
+        one made with the configured ones when the password matches, to be saved with the session
+        :param password: the plain password
+        :return: True if the password matches
+        :rtype: bool
+        """
+        from app.utils.passwords import check_password, is_outdated
+        if not check_password(self.password_hash, password):
+            return False
+        if is_outdated(self.password_hash):
+            self.password = password
+        return True
 
     def __repr__(self):
         return "<UserId:%r Name :<%r %r>, Email: %r>" % (self.uuid, self.first_name, self.last_name,
@@ -183,9 +439,72 @@ class AuthorAccount(Base, UserMixin):
 
 
 # This callback is used to reload the user object from the user ID stored in the session
+# Authors are served from the per process author cache when it is enabled, see app.utils.author_cache
 @login_manager.user_loader
 def load_author(user_id):
-    return AuthorAccount.query.get(int(user_id))
+    from app.utils.author_cache import load_cached_author
+    return load_cached_author(db.session, int(user_id))
+
+
+class Category(Base):
+    """
+    Categories stories are filed under
+    :cvar __tablename__: name of the table in the database
+    :cvar name: name of the category as it was first written
+    :cvar slug: lower cased name with everything but letters and digits replaced by dashes, used in links.
+    Names with the same slug are the same category
+    :cvar stories_count: number of stories in this category, kept up to date when stories are saved, moved
+    and deleted so that listing categories never counts stories
+    """
+    __tablename__ = "category"
+
+    name = Column(String(100), nullable=False)
+    slug = Column(String(100), nullable=False, unique=True)
+    stories_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    @staticmethod
+    def slugify(name):
+        """
+        :param name: name of a category
+        :return: the slug of the name
+        :rtype: str
+        """
+        return re.sub(r"[\W_]+", "-", (name or "").lower()).strip("-")[:100]
+
+    @staticmethod
+    def named(name):
+        """
+        The category with the given name, created if there is none yet. Stories without a category go to
+        Other
+        :param name: name of the category
+        :rtype: Category
+        """
+        name = " ".join((name or "").split())[:100]
+        slug = Category.slugify(name)
+        if not slug:
+            name, slug = "Other", "other"
+
+        session = db.session()
+        for obj in session.new:
+            if isinstance(obj, Category) and obj.slug == slug:
+                return obj
+        with session.no_autoflush:
+            category = Category.query.filter_by(slug=slug).first()
+        return category or Category(name=name, slug=slug)
+
+    @staticmethod
+    def facets():
+        """
+        :return: categories that have stories, by name, read from the category table alone
+        :rtype: list
+        """
+        return Category.query.filter(Category.stories_count > 0).order_by(Category.name).all()
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "Category: <Name: %r, Stories: %r>" % (self.name, self.stories_count)
 
 
 class Story(Base):
@@ -195,29 +514,289 @@ class Story(Base):
     """
 
     __tablename__ = 'story'
+    __table_args__ = (
+        # dashboard listings and the followed stories pull path, in keyset pagination order
+        Index("ix_story_author_id_date_created", "author_id", "date_created", "id"),
+        # home feed, in keyset pagination order
+        Index("ix_story_date_created_id", "date_created", "id"),
+        # category pages, in keyset pagination order
+        Index("ix_story_category_id_date_created", "category_id", "date_created", "id"),
+    )
 
     title = Column(String, nullable=False)
     tagline = Column(String(50), default=title)
-    category = Column(String(100), default="Other")
-    content = Column(String(10000), nullable=False)
+    # the previous category is loaded when the category changes so that its count can be moved, see
+    # move_category_count
+    category_id = column_property(Column(Integer, ForeignKey("category.id")), active_history=True)
     author_id = Column(Integer, ForeignKey("author.id"))
 
+    # categories are few and small, they are joined to every story query so that cards never query them
+    category = relationship("Category", lazy="joined")
+
+    # computed from the content whenever it is set so that listings can show them without reading it,
+    # NULL until the story has been backfilled, see backfill_reading_stats
+    word_count = Column(Integer)
+    reading_minutes = Column(Integer)
+    excerpt = Column(String(300))
+
+    # the content lives in its own table so that listing stories never reads it, see Story.content
+    body = relationship("StoryContent", uselist=False, lazy="select", cascade="all, delete-orphan")
+
     def __init__(self, title, tagline, category, content, author_id):
         """
         :param title: Title of this story in the database
         :param tagline: Tagline of this story
+        :param category: Name of the category of this story, see Category.named
         :param content: Content of this story
         :param author_id: The author id of whoever wrote this story
         """
         self.title = title
         self.tagline = tagline
-        self.category = category
+        self.category = Category.named(category)
         self.content = content
         self.author_id = author_id
 
+    @property
+    def content(self):
+        """
+        Content of the story, loaded from the story_content table the first time it is read
+        :rtype: str
+        """
+        if self.body is None:
+            return ""
+        return self.body.text
+
+    @content.setter
+    def content(self, content):
+        if self.body is None:
+            self.body = StoryContent(text=content)
+        else:
+            self.body.text = content
+            # the content is in another table, the story is marked as changed for pages validated by it
+            self.date_modified = func.current_timestamp()
+        self.word_count, self.reading_minutes, self.excerpt = reading_stats(content)
+
+    @staticmethod
+    def latest():
+        """
+        :return: Query of all stories, newest first. Ties on date_created are broken by id so that the
+        order is stable for keyset pagination
+        """
+        return Story.query.order_by(Story.date_created.desc(), Story.id.desc())
+
+    def fan_out(self):
+        """
+        Pushes this story to the timeline of every follower of its author (fan-out-on-write). This is a
+        single INSERT ... SELECT over the followers table and should be called once the story has been
+        flushed, in the same transaction that saves the story.
+        Authors with a large following are skipped, their stories are pulled when the feed is read
+        """
+        if self.author is not None and self.author.has_large_following():
+            return
+        fans = select([followers.c.follower_id, Story.id, Story.author_id, Story.date_created]).select_from(
+            followers.join(Story.__table__, followers.c.followed_id == Story.author_id)).where(
+            Story.id == self.id).distinct()
+        db.session.execute(timeline.insert().from_select(
+            ["owner_id", "story_id", "author_id", "story_created"], fans))
+
     def __repr__(self):
         return "Story: <Title: %r, Category: %r, Tagline: %r> AuthorId: %r" % \
-               (self.title, self.category, self.tagline, self.author_id)
+               (self.title, self.category and self.category.name, self.tagline, self.author_id)
+
+
+class StoryContent(db.Model):
+    """
+    Content of a story, kept apart from the story table so that listings, which only show the title,
+    tagline and category, do not move it from the database. The text is compressed, see CompressedText
+    :cvar __tablename__: name of the table in the database
+    :cvar story_id: id of the story this is the content of
+    :cvar text: the content itself
+    """
+    __tablename__ = "story_content"
+
+    story_id = Column(Integer, ForeignKey("story.id"), primary_key=True)
+    text = Column(CompressedText, nullable=False)
+
+    def __repr__(self):
+        return "StoryContent: <StoryId: %r>" % self.story_id
+
+
+def reading_stats(content, words_per_minute=None, excerpt_length=None):
+    """
+    Word count, reading time and excerpt of a story's content
+    :param content: content of the story
+    :param words_per_minute: reading speed, defaults to READING_WORDS_PER_MINUTE
+    :param excerpt_length: longest excerpt in characters, not counting the ellipsis, defaults to
+    STORY_EXCERPT_LENGTH. It is clamped so that the excerpt and its ellipsis fit in Story.excerpt
+    :return: word count, reading time in whole minutes (at least 1) and excerpt. The excerpt is cut on a
+    word boundary
+    :rtype: tuple
+    """
+    if words_per_minute is None or excerpt_length is None:
+        config = current_app.config if has_app_context() else {}
+        words_per_minute = words_per_minute or config.get("READING_WORDS_PER_MINUTE", 200)
+        excerpt_length = excerpt_length or config.get("STORY_EXCERPT_LENGTH", 200)
+    excerpt_length = min(excerpt_length, Story.excerpt.type.length - len("..."))
+
+    words = (content or "").split()
+    reading_minutes = max(1, int(math.ceil(len(words) / float(words_per_minute))))
+
+    excerpt = " ".join(words)
+    if len(excerpt) > excerpt_length:
+        excerpt = excerpt[:excerpt_length].rsplit(" ", 1)[0] + "..."
+    return len(words), reading_minutes, excerpt
+
+
+def backfill_reading_stats(batch_size=500):
+    """
+    Computes the word count, reading time and excerpt of every story that does not have them yet, in
+    batches of stories so that only one batch of content is in memory at a time. Can be stopped and run
+    again, it carries on with the stories that are left
+    :param batch_size: number of stories updated per batch
+    :return: number of stories updated
+    :rtype: int
+    """
+    story, content = Story.__table__, StoryContent.__table__
+    updated, last_id = 0, 0
+    while True:
+        rows = db.session.execute(select([story.c.id, content.c.text]).select_from(
+            story.outerjoin(content)).where(story.c.excerpt.is_(None)).where(story.c.id > last_id).order_by(
+            story.c.id).limit(batch_size)).fetchall()
+        if not rows:
+            break
+        stats = []
+        for row in rows:
+            word_count, reading_minutes, excerpt = reading_stats(row.text)
+            stats.append(dict(story_id=row.id, word_count=word_count, reading_minutes=reading_minutes,
+                              excerpt=excerpt))
+        db.session.execute(story.update().where(story.c.id == bindparam("story_id")).values(
+            word_count=bindparam("word_count"), reading_minutes=bindparam("reading_minutes"),
+            excerpt=bindparam("excerpt")), stats)
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+
+def rebuild_timelines(threshold=None):
+    """
+    Rebuilds every materialized timeline from scratch from the followers table. Useful after a bulk
+    import of stories or follows, or if the timeline table is ever out of sync.
+    Stories of authors with a large following are not materialized, they are pulled at read time
+    :param threshold: follower count above which an author is not fanned out, defaults to the app config
+    :return: number of timeline rows written
+    :rtype: int
+    """
+    if threshold is None:
+        threshold = AuthorAccount.fanout_threshold()
+
+    large = select([AuthorAccount.id]).where(AuthorAccount.followers_count > threshold)
+    fans = select([followers.c.follower_id, Story.id, Story.author_id, Story.date_created]).select_from(
+        followers.join(Story.__table__, followers.c.followed_id == Story.author_id)).where(
+        ~Story.author_id.in_(large)).distinct()
+
+    db.session.execute(timeline.delete())
+    result = db.session.execute(timeline.insert().from_select(
+        ["owner_id", "story_id", "author_id", "story_created"], fans))
+    db.session.commit()
+    return result.rowcount
+
+
+def recount_author_counters():
+    """
+    Recomputes every author's followers, following and stories counters from the followers and story
+    tables. Used to repair the counters if they ever drift, or to fill them for existing rows
+    :return: number of authors updated
+    :rtype: int
+    """
+    author = AuthorAccount.__table__
+    story = Story.__table__
+    result = db.session.execute(author.update().values(
+        followers_count=select([func.count(followers.c.follower_id.distinct())]).where(
+            followers.c.followed_id == author.c.id).as_scalar(),
+        following_count=select([func.count(followers.c.followed_id.distinct())]).where(
+            followers.c.follower_id == author.c.id).as_scalar(),
+        stories_count=select([func.count(story.c.id)]).where(story.c.author_id == author.c.id).as_scalar()
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def recount_category_counters():
+    """
+    Recomputes the number of stories of every category from the story table
+    :return: number of categories updated
+    :rtype: int
+    """
+    category = Category.__table__
+    story = Story.__table__
+    result = db.session.execute(category.update().values(
+        stories_count=select([func.count(story.c.id)]).where(story.c.category_id == category.c.id).as_scalar()
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def _count_author_stories(connection, target, delta):
+    if target.author_id is not None:
+        author = AuthorAccount.__table__
+        connection.execute(author.update().where(author.c.id == target.author_id).values(
+            stories_count=author.c.stories_count + delta))
+        # the author row is changed behind the ORM, mark it changed for the author cache
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("changed_authors", set()).add(target.author_id)
+
+
+@event.listens_for(Story, "after_insert")
+def increment_stories_count(mapper, connection, target):
+    """
+    Counts a new story against its author, in the same transaction that inserts the story
+    """
+    _count_author_stories(connection, target, 1)
+
+
+@event.listens_for(Story, "after_delete")
+def decrement_stories_count(mapper, connection, target):
+    """
+    Removes a deleted story from its author's count, in the same transaction that deletes the story
+    """
+    _count_author_stories(connection, target, -1)
+
+
+def _count_category_stories(connection, category_id, delta):
+    if category_id is not None:
+        category = Category.__table__
+        connection.execute(category.update().where(category.c.id == category_id).values(
+            stories_count=category.c.stories_count + delta))
+
+
+@event.listens_for(Story, "after_insert")
+def increment_category_count(mapper, connection, target):
+    """
+    Counts a new story against its category, in the same transaction that inserts the story
+    """
+    _count_category_stories(connection, target.category_id, 1)
+
+
+@event.listens_for(Story, "after_update")
+def move_category_count(mapper, connection, target):
+    """
+    Moves a story that changed category from the count of its old category to its new one
+    """
+    history = inspect(target).attrs.category_id.history
+    for category_id in history.deleted or ():
+        _count_category_stories(connection, category_id, -1)
+    for category_id in history.added or ():
+        _count_category_stories(connection, category_id, 1)
+
+
+@event.listens_for(Story, "after_delete")
+def decrement_category_count(mapper, connection, target):
+    """
+    Removes a deleted story from its category's count, in the same transaction that deletes the story
+    """
+    _count_category_stories(connection, target.category_id, -1)
 
 
 class ExternalServiceAccount(db.Model):
@@ -290,6 +869,39 @@ class GoogleAccount(ExternalServiceAccount):
         self.google_id = google_id
 
 
+class OutboxEmail(Base):
+    """
+    Email waiting to be sent by the outbox worker, see app.utils.outbox
+    :cvar __tablename__: name of the table in the database
+    :cvar recipient: address the email is sent to
+    :cvar subject: subject of the email
+    :cvar html: body of the email
+    :cvar status: pending until the email is sent, then sent, or failed once it has run out of attempts
+    :cvar attempts: number of times sending the email failed
+    :cvar next_attempt_at: when the worker may next try to send the email
+    :cvar last_error: error of the last failed attempt
+    :cvar sent_at: when the email was sent
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # the worker's lookup of the pending emails that are due
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    recipient = Column(String(250), nullable=False)
+    subject = Column(String(250), nullable=False)
+    html = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    last_error = Column(Text)
+    sent_at = Column(DateTime)
+
+    def __repr__(self):
+        return "OutboxEmail: <Recipient: %r, Subject: %r, Status: %r>" % (self.recipient, self.subject,
+                                                                         self.status)
+
+
 class AsyncOperationStatus(Base):
     """
     Dictionary table that stores 3 available statuses, pending, ok, error
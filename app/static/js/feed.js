@@ -0,0 +1,13 @@
+/**
+ * Load more stories. Fetches the next page of grid items as an HTML fragment and puts it in place of
+ * the 'Load more' footer, the fragment comes with its own footer pointing to the page after it.
+ */
+jQuery(document).ready(function($){
+	$(document).on('click', '.page-meta .load-more', function(ev){
+		var footer = $(this).closest('.page-meta');
+		ev.preventDefault();
+		$.get($(this).data('fragment-url'), function(fragment){
+			footer.replaceWith(fragment);
+		});
+	});
+});
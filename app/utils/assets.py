@@ -0,0 +1,218 @@
+"""
+Fingerprinted, precompressed static assets.
+The build_assets manage.py command copies every file of the static folder to the STATIC_BUILD_DIR folder
+inside it, with a hash of its content in the name: css/styles.css becomes build/css/styles.1b2c3d4e5f6a.css.
+Relative url() references in stylesheets are rewritten to the fingerprinted names of the files they point
+to. Text files also get .gz and, when the brotli package is installed, .br siblings compressed ahead of
+time. A manifest maps every original name to its fingerprinted one.
+
+When STATIC_MANIFEST_ENABLED is set and the manifest exists, url_for('static', filename=...) links to the
+fingerprinted file. A fingerprinted file never changes, so it is served with a far future, immutable
+Cache-Control and, if the client accepts it, from its precompressed sibling.
+
+Building is incremental, files whose fingerprinted copy already exists are not written again. Copies left
+from earlier builds that are no longer in the manifest are deleted along with their compressed siblings.
+"""
+from hashlib import sha256
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".svg", ".txt", ".html", ".json", ".xml", ".ttf", ".otf", ".eot")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+FAR_FUTURE = 31536000
+
+
+def fingerprint(name, content):
+    """
+    :param name: path of the file
+    :param content: content of the file
+    :return: the path with a hash of the content before the extension
+    :rtype: str
+    """
+    root, extension = posixpath.splitext(name)
+    return "%s.%s%s" % (root, sha256(content).hexdigest()[:12], extension)
+
+
+def rewrite_css_urls(name, content, manifest, build_dir="build"):
+    """
+    Points the relative url() references of a stylesheet to the fingerprinted files. References to files
+    that are not in the manifest, absolute links and data URIs are left alone
+    :param name: path of the stylesheet in the static folder
+    :param content: content of the stylesheet
+    :param manifest: fingerprinted paths of the files built so far by their original path
+    :param build_dir: folder the fingerprinted stylesheet is written to
+    :return: content of the stylesheet
+    :rtype: bytes
+    """
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return match.group(0)
+        path, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        target = posixpath.normpath(posixpath.join(directory, path))
+        if target not in manifest:
+            return match.group(0)
+        # the fingerprinted stylesheet sits in the same folder under the build folder
+        relative = posixpath.relpath(manifest[target], posixpath.join(build_dir, directory))
+        return "url(%s%s%s%s)" % (quote, relative, suffix, quote)
+
+    return CSS_URL.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+def compress(path, content):
+    """
+    Writes the .gz and .br siblings of a file, only if they are smaller than the file
+    :param path: path of the file on disk
+    :param content: content of the file
+    """
+    siblings = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        siblings.append((".br", brotli.compress(content)))
+    for extension, compressed in siblings:
+        if len(compressed) < len(content) and not os.path.exists(path + extension):
+            with open(path + extension, "wb") as sibling:
+                sibling.write(compressed)
+
+
+def build_assets(static_folder, build_dir="build"):
+    """
+    Writes the fingerprinted and precompressed copies of the static files and their manifest
+    :param static_folder: the static folder of the app
+    :param build_dir: folder inside the static folder to write the copies to
+    :return: the manifest, fingerprinted paths by original path relative to the static folder
+    :rtype: dict
+    """
+    names = []
+    for directory, folders, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder)
+        if relative.split(os.sep)[0] == build_dir:
+            continue
+        for filename in files:
+            if not filename.startswith("."):
+                names.append(posixpath.normpath(posixpath.join(relative.replace(os.sep, "/"), filename)))
+
+    # stylesheets last, so that the files they reference already have their fingerprinted names
+    names.sort(key=lambda name: (name.endswith(".css"), name))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), "rb") as source:
+            content = source.read()
+        if name.endswith(".css"):
+            content = rewrite_css_urls(name, content, manifest, build_dir)
+
+        built = posixpath.join(build_dir, fingerprint(name, content))
+        manifest[name] = built
+
+        path = os.path.join(static_folder, built)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as target:
+                target.write(content)
+        if name.endswith(COMPRESSIBLE):
+            compress(path, content)
+
+    with open(os.path.join(static_folder, build_dir, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    prune(static_folder, manifest, build_dir)
+    return manifest
+
+
+def prune(static_folder, manifest, build_dir="build"):
+    """
+    Deletes the files of the build folder that are not in the manifest, copies of earlier versions of the
+    static files and their compressed siblings, and the folders left empty
+    :param static_folder: the static folder of the app
+    :param manifest: fingerprinted paths by original path
+    :param build_dir: folder inside the static folder the copies are written to
+    :return: number of files deleted
+    :rtype: int
+    """
+    keep = {posixpath.join(build_dir, MANIFEST)}
+    for built in manifest.values():
+        keep.update([built] + [built + extension for encoding, extension in ENCODINGS])
+
+    deleted = 0
+    for directory, folders, files in os.walk(os.path.join(static_folder, build_dir), topdown=False):
+        relative = os.path.relpath(directory, static_folder).replace(os.sep, "/")
+        for filename in files:
+            if posixpath.join(relative, filename) not in keep:
+                os.remove(os.path.join(directory, filename))
+                deleted += 1
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    return deleted
+
+
+def load_manifest(static_folder, build_dir="build"):
+    """
+    :return: the manifest of the built assets, None if they have not been built
+    :rtype: dict
+    """
+    path = os.path.join(static_folder, build_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def init_assets(app):
+    """
+    Links static files to their fingerprinted copies if STATIC_MANIFEST_ENABLED is set and the assets have
+    been built
+    :param app: the current flask application
+    """
+    if not app.config.get("STATIC_MANIFEST_ENABLED"):
+        return
+    manifest = load_manifest(app.static_folder, app.config.get("STATIC_BUILD_DIR", "build"))
+    if manifest is None:
+        return
+    app.extensions["assets"] = manifest
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint == "static" and values.get("filename") in manifest:
+            values["filename"] = manifest[values["filename"]]
+
+
+def send_static_asset(app, filename):
+    """
+    Sends a static file. Fingerprinted files are sent from their precompressed sibling when the client
+    accepts its encoding, with an immutable Cache-Control
+    :param app: the current flask application
+    :param filename: path of the file in the static folder
+    :return: the response
+    """
+    build_dir = app.config.get("STATIC_BUILD_DIR", "build")
+    if not filename.startswith(build_dir + "/") or filename.endswith(MANIFEST):
+        return send_from_directory(app.static_folder, filename,
+                                   max_age=app.get_send_file_max_age(filename))
+
+    accepted = request.accept_encodings
+    for encoding, extension in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + extension)):
+            response = send_from_directory(app.static_folder, filename + extension, max_age=FAR_FUTURE,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=FAR_FUTURE)
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
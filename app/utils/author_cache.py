@@ -0,0 +1,177 @@
+"""
+Per process cache of the authors loaded by the Flask-Login user loader.
+Every request with a session loads the logged in author before any view runs. With the cache, repeat
+requests within AUTHOR_CACHE_TTL seconds get the author without a query: a detached snapshot of the
+author's columns is merged into the request's session without loading it, so views get an ordinary
+attached instance that they can change and commit like one that was queried.
+
+An author is dropped from the cache as soon as a transaction that changed them is committed, which covers
+edits of the profile, email confirmation and password changes as well as follows. Updates of the author
+row that bypass the ORM record the author in session.info["changed_authors"] themselves, as the story
+counters do, or call AuthorCache.forget once written, as the last seen buffer does. Changes committed by
+other worker processes are picked up once the entry expires.
+
+The cache is only used when AUTHOR_CACHE_ENABLED is set.
+"""
+from collections import OrderedDict
+from threading import Lock
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.models import AuthorAccount
+
+
+class AuthorCache(object):
+    """
+    Least recently used cache of author snapshots by author id
+    :cvar ttl: number of seconds a snapshot is used for
+    :cvar max_entries: most authors kept, the least recently used is dropped first
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = Lock()
+
+    @property
+    def version(self):
+        """
+        Changes every time authors are dropped. A snapshot taken from an author loaded before a drop may be
+        out of date and is not stored
+        :rtype: int
+        """
+        return self._version
+
+    def get(self, author_id):
+        """
+        :param author_id: id of the author
+        :return: detached snapshot of the author, None if there is none or it has expired
+        :rtype: AuthorAccount
+        """
+        with self._lock:
+            entry = self._entries.get(author_id)
+            if entry is None:
+                return None
+            snapshot, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[author_id]
+                return None
+            self._entries.move_to_end(author_id)
+            return snapshot
+
+    def put(self, author, version=None):
+        """
+        Stores a snapshot of the columns of a loaded author
+        :param author: author loaded from the database
+        :param version: version of the cache when the author was loaded
+        :return: True if the snapshot was stored
+        :rtype: bool
+        """
+        state = inspect(author)
+        if state.modified or state.expired_attributes:
+            return False
+        values = {attribute.key: state.dict[attribute.key] for attribute in state.mapper.column_attrs
+                  if attribute.key in state.dict}
+        snapshot = AuthorAccount(**values)
+        make_transient_to_detached(snapshot)
+
+        with self._lock:
+            if version is not None and version != self._version:
+                return False
+            self._entries[author.id] = (snapshot, time.monotonic())
+            self._entries.move_to_end(author.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def forget(self, author_ids):
+        """
+        Drops the given authors
+        :param author_ids: ids of the authors
+        """
+        with self._lock:
+            self._version += 1
+            for author_id in author_ids:
+                self._entries.pop(author_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def init_author_cache(app):
+    """
+    Creates the author cache for the app if AUTHOR_CACHE_ENABLED is set
+    :param app: the current flask application
+    """
+    if app.config.get("AUTHOR_CACHE_ENABLED"):
+        app.extensions["author_cache"] = AuthorCache(ttl=app.config.get("AUTHOR_CACHE_TTL", 60),
+                                                     max_entries=app.config.get("AUTHOR_CACHE_MAX_ENTRIES", 10000))
+
+
+def author_cache():
+    """
+    :return: the author cache of the current app, None if it is not enabled
+    :rtype: AuthorCache or None
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("author_cache")
+
+
+def load_cached_author(session, author_id):
+    """
+    Loads an author through the cache
+    :param session: session the author is attached to
+    :param author_id: id of the author
+    :return: the author attached to the session, None if there is no such author
+    :rtype: AuthorAccount
+    """
+    cache = author_cache()
+    if cache is None:
+        return session.query(AuthorAccount).get(author_id)
+
+    snapshot = cache.get(author_id)
+    if snapshot is not None:
+        return session.merge(snapshot, load=False)
+
+    version = cache.version
+    author = session.query(AuthorAccount).get(author_id)
+    if author is not None:
+        cache.put(author, version=version)
+    return author
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed_authors(session, flush_context):
+    """
+    Remembers the authors changed by the transaction
+    """
+    changed = {obj.id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(obj, AuthorAccount) and obj.id is not None}
+    if changed:
+        session.info.setdefault("changed_authors", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_authors(session):
+    """
+    Drops the changed authors from the cache once their changes have been committed
+    """
+    changed = session.info.pop("changed_authors", None)
+    if changed:
+        cache = author_cache()
+        if cache is not None:
+            cache.forget(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_authors(session):
+    session.info.pop("changed_authors", None)
@@ -0,0 +1,93 @@
+"""
+Conditional GET for pages built from rows that carry a date_modified.
+Before the view runs, a validator function reads the date_modified of the rows the page is built from,
+with a query that selects only those columns. The ETag of the page is a hash of them, along with the path
+and query string of the request, the logged in author and RELEASE_VERSION, since templates change with
+releases. A client that sends back a matching If-None-Match, or an If-Modified-Since no older than the
+newest of the rows, gets a 304 Not Modified without the view loading a single row or rendering a
+template.
+
+Pages show who is logged in, so they are private to a logged in author and vary on the session cookie.
+Logging in or out changes no row, so Last-Modified is only sent to anonymous visitors and authors get
+the ETag alone. Pages with flashed messages waiting to be shown are always rendered.
+"""
+from datetime import datetime
+from functools import wraps
+from hashlib import sha1
+from flask import abort, current_app, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+
+def make_etag(parts):
+    """
+    :param parts: values the page is built from
+    :return: ETag of the page for the current request and viewer
+    :rtype: str
+    """
+    viewer = (current_user.get_id(), current_user.date_modified) if current_user.is_authenticated else None
+    key = (current_app.config.get("RELEASE_VERSION"), request.full_path, viewer, tuple(parts))
+    return sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+def last_modified_of(parts):
+    """
+    :param parts: values the page is built from
+    :return: the newest of the dates among them, None if there are none
+    :rtype: datetime
+    """
+    dates = [part for part in parts if isinstance(part, datetime)]
+    return max(dates) if dates else None
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Sets the validators and the caching headers of a response
+    :param response: response to send
+    :param etag: ETag of the page
+    :param last_modified: when the page last changed, None to leave it out
+    :return: the response
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def conditional(validate):
+    """
+    Answers GET requests for the view with a 304 Not Modified when the client has the current page
+    :param validate: function called with the arguments of the view, returns the values the page is built
+    from, typically date_modified columns and counts, or None if the page does not exist
+    :return: decorator of view functions
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return view(*args, **kwargs)
+
+            parts = validate(*args, **kwargs)
+            if parts is None:
+                abort(404)
+            etag = make_etag(parts)
+            last_modified = None if current_user.is_authenticated else last_modified_of(parts)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                return set_validators(current_app.response_class(status=304), etag, last_modified)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,222 @@
+"""
+In-process index of the follower graph.
+Every author's follows are kept as a sorted array of author ids, loaded once from the followers table,
+so that checking whether one author follows another is a binary search in memory instead of a COUNT
+query. Rendering a page of follow buttons then costs no database round trips.
+
+The index is kept up to date by SQLAlchemy session events. Follows and unfollows are picked up from the
+history of the following/followers relationships when the session is flushed, kept in the session until
+its transaction is committed and only then applied to the index, which is shared by every request of the
+process. Until then the session answers for its own follows, see pending_follow, and a rollback simply
+drops them. Follows written by other worker processes are picked up when the index is reloaded after
+FOLLOWER_GRAPH_TTL seconds, by a single thread while the others keep using the loaded index.
+
+The index is optional, it is only used when FOLLOWER_GRAPH_ENABLED is set.
+"""
+from array import array
+from bisect import bisect_left
+from threading import Lock, RLock
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import AuthorAccount, followers
+
+
+class FollowerGraph(object):
+    """
+    Adjacency sets of the follower graph, one sorted array of followed author ids per follower
+    :cvar ttl: number of seconds after which the graph is considered stale and reloaded
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._following = {}
+        self._loaded_at = None
+        self._lock = RLock()
+        self._reload_lock = Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def is_stale(self):
+        """
+        :return: True if the graph has never been loaded, was invalidated or is older than its ttl
+        :rtype: bool
+        """
+        if self._loaded_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+
+    def invalidate(self):
+        """
+        Marks the graph as stale so that it is reloaded on next use
+        """
+        self._loaded_at = None
+
+    def load(self, edges):
+        """
+        Replaces the graph with the given edges
+        :param edges: iterable of (follower_id, followed_id) pairs sorted by follower_id then followed_id
+        """
+        following = {}
+        for follower_id, followed_id in edges:
+            ids = following.get(follower_id)
+            if ids is None:
+                ids = following[follower_id] = array("l")
+            # rows are sorted, so duplicate follower rows are next to each other
+            if not ids or ids[-1] != followed_id:
+                ids.append(followed_id)
+
+        with self._lock:
+            self._following = following
+            self._loaded_at = time.monotonic()
+
+    def load_from_db(self):
+        """
+        Loads the graph from the followers table
+        """
+        rows = db.session.execute(select([followers.c.follower_id, followers.c.followed_id]).where(
+            followers.c.follower_id.isnot(None)).where(followers.c.followed_id.isnot(None)).order_by(
+            followers.c.follower_id, followers.c.followed_id))
+        self.load(rows)
+
+    def refresh(self):
+        """
+        Reloads the graph from the followers table if it is stale. Only one thread reloads it, the others
+        wait for it until the graph is first loaded and keep using the loaded graph after that
+        """
+        if not self._reload_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self.is_stale():
+                self.load_from_db()
+        finally:
+            self._reload_lock.release()
+
+    def is_following(self, follower_id, followed_id):
+        """
+        :return: True if the follower follows the followed author
+        :rtype: bool
+        """
+        ids = self._following.get(follower_id)
+        if not ids:
+            return False
+        position = bisect_left(ids, followed_id)
+        return position < len(ids) and ids[position] == followed_id
+
+    def following_ids(self, follower_id):
+        """
+        :return: sorted ids of the authors the follower follows
+        :rtype: array
+        """
+        return self._following.get(follower_id, array("l"))
+
+    def add(self, follower_id, followed_id):
+        with self._lock:
+            ids = self._following.setdefault(follower_id, array("l"))
+            position = bisect_left(ids, followed_id)
+            if position == len(ids) or ids[position] != followed_id:
+                ids.insert(position, followed_id)
+
+    def remove(self, follower_id, followed_id):
+        with self._lock:
+            ids = self._following.get(follower_id)
+            if not ids:
+                return
+            position = bisect_left(ids, followed_id)
+            if position < len(ids) and ids[position] == followed_id:
+                del ids[position]
+
+
+def init_follower_graph(app):
+    """
+    Creates the follower graph for the app if FOLLOWER_GRAPH_ENABLED is set. The graph is loaded lazily
+    on first use
+    :param app: the current flask application
+    """
+    if app.config.get("FOLLOWER_GRAPH_ENABLED"):
+        app.extensions["follower_graph"] = FollowerGraph(ttl=app.config.get("FOLLOWER_GRAPH_TTL"))
+
+
+def follower_graph():
+    """
+    :return: the loaded follower graph of the current app, None if it is not enabled
+    :rtype: FollowerGraph or None
+    """
+    if not has_app_context():
+        return None
+    graph = current_app.extensions.get("follower_graph")
+    if graph is not None and graph.is_stale():
+        graph.refresh()
+    return graph
+
+
+def pending_follow(session, follower_id, followed_id):
+    """
+    :param session: session that may have flushed follows not committed yet
+    :return: True or False if the session has flushed a follow or an unfollow of the pair that is not
+    committed yet, None if it has not
+    :rtype: bool or None
+    """
+    return session.info.get("follower_edges", {}).get((follower_id, followed_id))
+
+
+def _app_graph():
+    """
+    :return: the follower graph of the current app if it is enabled, None otherwise
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("follower_graph")
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_follower_edges(session, flush_context):
+    """
+    Remembers the follows and unfollows that have just been flushed. The history of the relationships is
+    still available at this point and new authors already have their ids
+    """
+    if _app_graph() is None:
+        return
+
+    added, removed = set(), set()
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, AuthorAccount):
+            continue
+        state = inspect(obj)
+        following = state.attrs.following.history
+        added.update((obj.id, other.id) for other in following.added)
+        removed.update((obj.id, other.id) for other in following.deleted)
+        fans = state.attrs.followers.history
+        added.update((other.id, obj.id) for other in fans.added)
+        removed.update((other.id, obj.id) for other in fans.deleted)
+
+    if added or removed:
+        edges = session.info.setdefault("follower_edges", {})
+        edges.update((edge, False) for edge in removed - added)
+        edges.update((edge, True) for edge in added - removed)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_follower_edges(session):
+    """
+    Applies the committed follows and unfollows to the follower graph, a graph that has not been loaded yet
+    reads them from the followers table when it is
+    """
+    edges = session.info.pop("follower_edges", None)
+    graph = _app_graph()
+    if not edges or graph is None or not graph.loaded:
+        return
+    for (follower_id, followed_id), following in edges.items():
+        if following:
+            graph.add(follower_id, followed_id)
+        else:
+            graph.remove(follower_id, followed_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_follower_edges(session):
+    session.info.pop("follower_edges", None)
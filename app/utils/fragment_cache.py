@@ -0,0 +1,120 @@
+"""
+Fragment caching for templates.
+Adds a cache block to Jinja. The output of the block is kept in a bounded least recently used store and
+reused for as long as its key stays the same, instead of rendering the block again:
+
+    {% cache (card.story_id, card.version) %}
+        ...
+    {% endcache %}
+
+The key is any hashable expression, it should change with everything the fragment shows, such as the id of
+a story and a version made from what its card shows. Modification dates make poor keys, SQLite keeps them
+to the second so that two changes within a second share a key. A versioned key needs no ttl, the old
+version is never asked for again and drops out of the store as it fills. The optional ttl is the number of
+seconds the fragment is kept for, for keys that can not tell every change. Fragments are told apart by their
+template and their place in it, so the same key can be used in different blocks. Hits and misses are
+counted for every block.
+
+The block is rendered every time when FRAGMENT_CACHE_ENABLED is not set.
+"""
+from threading import Lock
+import time
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.utils import LRUCache
+
+
+class FragmentCache(object):
+    """
+    Rendered template fragments
+    :cvar max_entries: most fragments kept, the least recently used is dropped first
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._fragments = LRUCache(max_entries)
+        self._stats = {}
+        self._lock = Lock()
+
+    def render(self, fragment, key, ttl, caller):
+        """
+        Returns the cached output of the fragment for the key, renders and stores it if there is none
+        :param fragment: name of the fragment, its template, line and number in the template
+        :param key: key of the output
+        :param ttl: number of seconds to keep the output for, None to keep it until it is dropped
+        :param caller: renders the fragment
+        :return: output of the fragment
+        """
+        cache_key = (fragment, key)
+        entry = self._fragments.get(cache_key)
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            self._count(fragment, hit=True)
+            return entry[0]
+
+        self._count(fragment, hit=False)
+        output = caller()
+        self._fragments[cache_key] = (output, time.monotonic() + ttl if ttl else None)
+        return output
+
+    def _count(self, fragment, hit):
+        with self._lock:
+            counts = self._stats.setdefault(fragment, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def stats(self):
+        """
+        :return: number of hits and misses of every fragment, by fragment name
+        :rtype: dict
+        """
+        with self._lock:
+            return {fragment: dict(hits=hits, misses=misses) for fragment, (hits, misses) in self._stats.items()}
+
+    def clear(self):
+        self._fragments.clear()
+        with self._lock:
+            self._stats.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension adding the {% cache key, ttl %} ... {% endcache %} block
+    """
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        # numbered as well as placed by line, blocks can share a line
+        index = getattr(parser, "cache_blocks", 0)
+        parser.cache_blocks = index + 1
+        fragment = nodes.Const("%s:%d:%d" % (parser.name, lineno, index))
+        key = parser.parse_expression()
+        ttl = nodes.Const(None)
+        if parser.stream.skip_if("comma"):
+            ttl = parser.parse_expression()
+
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [fragment, key, ttl]), [], [], body).set_lineno(
+            lineno)
+
+    def _render(self, fragment, key, ttl, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.render(fragment, key, ttl, caller)
+
+
+def init_fragment_cache(app):
+    """
+    Gives the app's template environment a fragment cache if FRAGMENT_CACHE_ENABLED is set
+    :param app: the current flask application
+    """
+    if app.config.get("FRAGMENT_CACHE_ENABLED"):
+        app.jinja_env.fragment_cache = FragmentCache(
+            max_entries=app.config.get("FRAGMENT_CACHE_MAX_ENTRIES", 2048))
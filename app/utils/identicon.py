@@ -0,0 +1,33 @@
+"""
+Identicons generated from an email hash.
+An identicon is a 5 by 5 grid of squares, mirrored left to right, coloured and filled in from the bits of
+the hash. The same hash always gives the same image, so it can be cached by browsers forever. Images are
+SVG so that one image serves every size.
+"""
+
+GRID = 5
+
+
+def identicon_svg(email_hash, size=64):
+    """
+    :param email_hash: hex md5 hash of the email of the author
+    :param size: width and height of the image in pixels
+    :return: SVG document of the identicon
+    :rtype: str
+    """
+    digest = bytes.fromhex(email_hash)
+    colour = "#%02x%02x%02x" % (digest[-3], digest[-2], digest[-1])
+    cell = float(size) / GRID
+
+    squares = []
+    columns = (GRID + 1) // 2
+    for index in range(columns * GRID):
+        if digest[index % len(digest)] % 2:
+            continue
+        column, row = divmod(index, GRID)
+        for x in {column, GRID - 1 - column}:
+            squares.append('<rect x="%g" y="%g" width="%g" height="%g"/>' % (x * cell, row * cell, cell, cell))
+
+    return ('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d">'
+            '<rect width="100%%" height="100%%" fill="#f0f0f0"/><g fill="%s">%s</g></svg>' % (
+                size, size, size, size, colour, "".join(squares)))
@@ -0,0 +1,174 @@
+"""
+Responsive image variants.
+The build_images manage.py command writes smaller, re-encoded copies of every JPEG and PNG image of the
+static img folder, one for each of IMAGE_VARIANT_WIDTHS up to the width of the image, to img/variants. A
+manifest records the variants of every image along with a hash of the image, so that building again only
+processes images that were added or changed.
+
+The responsive_image template helper writes an img tag with a srcset of the variants and the sizes the
+image is shown at, so that browsers pick the smallest file that fills the space, a phone downloading the
+320 pixel wide copy rather than the original. Images that have no variants get a plain img tag.
+
+Building needs Pillow, serving the variants does not.
+"""
+from hashlib import sha256
+import json
+import os
+import posixpath
+from flask import url_for
+from markupsafe import Markup, escape
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MANIFEST = "manifest.json"
+
+
+def variant_name(name, width, digest, source_dir="img", variants_dir="img/variants"):
+    """
+    :param name: path of the image in the static folder
+    :param width: width of the variant
+    :param digest: hash of the image
+    :return: path of the variant, in the same folder under the variants folder as the image is under the
+    source folder, named after the image, its width and the hash
+    :rtype: str
+    """
+    root, extension = posixpath.splitext(posixpath.relpath(name, source_dir))
+    return posixpath.join(variants_dir, "%s-%dw.%s%s" % (root, width, digest, extension))
+
+
+def build_image_variants(static_folder, source_dir="img", variants_dir="img/variants",
+                         widths=(320, 640, 960, 1280), quality=80):
+    """
+    Writes the variants of the images that are new or changed since the last build and the manifest of
+    all variants. Variants of images that changed or were removed are deleted
+    :param static_folder: the static folder of the app
+    :param source_dir: folder of the static folder holding the images
+    :param variants_dir: folder of the static folder to write the variants to
+    :param widths: widths of the variants in pixels
+    :param quality: JPEG quality of the variants
+    :return: the manifest and the number of images processed
+    :rtype: tuple
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is needed to build image variants")
+
+    manifest = load_image_manifest(static_folder, variants_dir) or {}
+    names = []
+    for directory, folders, files in os.walk(os.path.join(static_folder, source_dir)):
+        relative = os.path.relpath(directory, static_folder).replace(os.sep, "/")
+        if relative == variants_dir or relative.startswith(variants_dir + "/"):
+            continue
+        names.extend(posixpath.join(relative, filename) for filename in files
+                     if filename.lower().endswith(IMAGE_EXTENSIONS))
+
+    processed = 0
+    for name in sorted(names):
+        with open(os.path.join(static_folder, name), "rb") as source:
+            digest = sha256(source.read()).hexdigest()[:12]
+        entry = manifest.get(name)
+        if entry is not None and entry["hash"] == digest and all(
+                os.path.exists(os.path.join(static_folder, path)) for path in entry["variants"].values()):
+            continue
+
+        _remove_variants(static_folder, entry)
+        manifest[name] = _write_variants(static_folder, name, digest, source_dir, variants_dir, widths, quality)
+        processed += 1
+
+    for name in set(manifest) - set(names):
+        _remove_variants(static_folder, manifest.pop(name))
+
+    path = os.path.join(static_folder, variants_dir, MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest, processed
+
+
+def _write_variants(static_folder, name, digest, source_dir, variants_dir, widths, quality):
+    """
+    :return: manifest entry of the image
+    :rtype: dict
+    """
+    with Image.open(os.path.join(static_folder, name)) as image:
+        width, height = image.size
+        jpeg = name.lower().endswith((".jpg", ".jpeg"))
+        variants = {}
+        for variant_width in sorted(widths):
+            if variant_width > width:
+                break
+            variant_height = int(round(height * variant_width / float(width)))
+            variant = image.resize((variant_width, variant_height), Image.LANCZOS)
+            path = variant_name(name, variant_width, digest, source_dir, variants_dir)
+            os.makedirs(os.path.dirname(os.path.join(static_folder, path)), exist_ok=True)
+            if jpeg:
+                variant.convert("RGB").save(os.path.join(static_folder, path), "JPEG", quality=quality,
+                                            optimize=True, progressive=True)
+            else:
+                variant.save(os.path.join(static_folder, path), "PNG", optimize=True)
+            variants[str(variant_width)] = path
+    return dict(hash=digest, width=width, height=height, variants=variants)
+
+
+def _remove_variants(static_folder, entry):
+    if entry is None:
+        return
+    for path in entry["variants"].values():
+        if os.path.exists(os.path.join(static_folder, path)):
+            os.remove(os.path.join(static_folder, path))
+
+
+def load_image_manifest(static_folder, variants_dir="img/variants"):
+    """
+    :return: the manifest of the image variants, None if they have not been built
+    :rtype: dict
+    """
+    path = os.path.join(static_folder, variants_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def responsive_image(manifest, filename, alt="", sizes="100vw", **attributes):
+    """
+    :param manifest: manifest of the image variants
+    :param filename: path of the image in the static folder
+    :param alt: alternative text of the image
+    :param sizes: sizes attribute, the width the image is shown at for each media condition
+    :param attributes: other attributes of the img tag, class_ for class
+    :return: img tag with a srcset of the variants of the image
+    :rtype: Markup
+    """
+    attributes = {key.rstrip("_"): value for key, value in attributes.items()}
+    attributes["src"] = url_for("static", filename=filename)
+    attributes["alt"] = alt
+
+    entry = (manifest or {}).get(filename)
+    if entry is not None:
+        candidates = ["%s %sw" % (url_for("static", filename=path), width)
+                      for width, path in sorted(entry["variants"].items(), key=lambda item: int(item[0]))]
+        if str(entry["width"]) not in entry["variants"]:
+            candidates.append("%s %dw" % (attributes["src"], entry["width"]))
+        attributes["srcset"] = ", ".join(candidates)
+        attributes["sizes"] = sizes
+        attributes.setdefault("width", entry["width"])
+        attributes.setdefault("height", entry["height"])
+    attributes.setdefault("loading", "lazy")
+
+    return Markup("<img %s/>" % " ".join('%s="%s"' % (key, escape(value)) for key, value in attributes.items()))
+
+
+def init_images(app):
+    """
+    Makes the responsive_image helper available to templates
+    :param app: the current flask application
+    """
+    manifest = load_image_manifest(app.static_folder, app.config.get("IMAGE_VARIANTS_DIR", "img/variants"))
+
+    @app.template_global("responsive_image")
+    def responsive_image_helper(filename, alt="", sizes="100vw", **attributes):
+        return responsive_image(manifest, filename, alt=alt, sizes=sizes, **attributes)
@@ -0,0 +1,113 @@
+"""
+Coalesced writes of AuthorAccount.last_seen.
+Instead of committing the author row on every authenticated request, each worker process keeps the
+latest 'last seen' time of every active author in memory. Times are coarsened to LAST_SEEN_GRANULARITY
+seconds so that an author who is already marked as seen in the current window needs no write at all.
+Pending times are written with one UPDATE for all authors, at request teardown once
+LAST_SEEN_FLUSH_INTERVAL seconds have passed since the previous write.
+"""
+from datetime import datetime, timedelta
+from threading import Lock
+import time
+from sqlalchemy import case
+from app import db
+
+
+class LastSeenBuffer(object):
+    """
+    Per process buffer of pending last seen times
+    :cvar granularity: number of seconds last seen times are rounded down to
+    :cvar flush_interval: minimum number of seconds between two writes
+    """
+
+    def __init__(self, granularity=60, flush_interval=30):
+        self.granularity = granularity
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._lock = Lock()
+
+    def coarsen(self, seen_at):
+        """
+        Rounds the time down to the granularity of the buffer
+        :param seen_at: time the author was seen
+        :rtype: datetime
+        """
+        if not self.granularity:
+            return seen_at
+        elapsed = seen_at - datetime.min
+        seconds = (elapsed.days * 86400 + elapsed.seconds) % self.granularity
+        return seen_at.replace(microsecond=0) - timedelta(seconds=seconds)
+
+    def touch(self, author_id, seen_at, last_seen=None):
+        """
+        Records that an author has been seen. Nothing is recorded if the author's stored last seen time
+        already falls in the same window
+        :param author_id: id of the author
+        :param seen_at: time the author was seen
+        :param last_seen: the last seen time currently stored for the author
+        :return: True if a write is now pending for the author
+        :rtype: bool
+        """
+        seen_at = self.coarsen(seen_at)
+        if last_seen is not None and last_seen >= seen_at:
+            return False
+        with self._lock:
+            if self._pending.get(author_id, datetime.min) < seen_at:
+                self._pending[author_id] = seen_at
+        return True
+
+    def pending(self):
+        """
+        :return: copy of the pending last seen times by author id
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._pending)
+
+    def flush_due(self):
+        """
+        :return: True if there are pending times and the flush interval has passed
+        :rtype: bool
+        """
+        return bool(self._pending) and time.monotonic() - self._flushed_at >= self.flush_interval
+
+    def flush(self):
+        """
+        Writes every pending last seen time with a single UPDATE, in its own transaction so that it does
+        not interfere with the request's session. date_modified is kept as it is, being seen is not a change
+        of the author and must not invalidate the responses validated on it
+        :return: number of authors updated
+        :rtype: int
+        """
+        from app.models import AuthorAccount
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        author = AuthorAccount.__table__
+        with db.engine.begin() as connection:
+            connection.execute(author.update().where(author.c.id.in_(list(pending))).values(
+                last_seen=case(pending, value=author.c.id), date_modified=author.c.date_modified))
+
+        from app.utils.author_cache import author_cache
+        cache = author_cache()
+        if cache is not None:
+            cache.forget(list(pending))
+        return len(pending)
+
+
+def init_last_seen(app):
+    """
+    Creates the last seen buffer for the app
+    :param app: the current flask application
+    :return: the last seen buffer
+    :rtype: LastSeenBuffer
+    """
+    buffer = LastSeenBuffer(granularity=app.config.get("LAST_SEEN_GRANULARITY", 60),
+                            flush_interval=app.config.get("LAST_SEEN_FLUSH_INTERVAL", 30))
+    app.extensions["last_seen"] = buffer
+    return buffer
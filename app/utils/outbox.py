@@ -0,0 +1,155 @@
+"""
+Outbox of the emails sent by the application.
+Requests do not talk to the mail server. send_mail adds the email to the email_outbox table and returns,
+so signing up takes no longer when the mail server is slow and still works when it is down. The email is
+committed by the request along with the rows it is about, an author is never registered without their
+confirmation email, nor is the email sent for a registration that was rolled back. The outbox
+worker, manage.py run_outbox_worker, sends the emails that are due in batches of OUTBOX_BATCH_SIZE over a
+single SMTP connection per batch.
+
+An email that could not be sent is tried again after OUTBOX_RETRY_DELAY seconds, doubled with every
+failed attempt up to OUTBOX_MAX_RETRY_DELAY, and is marked failed after OUTBOX_MAX_ATTEMPTS attempts.
+
+A worker claims the emails of a batch by pushing their next attempt OUTBOX_CLAIM_TIMEOUT seconds ahead
+before it sends them, with the rows locked FOR UPDATE SKIP LOCKED on databases that support it, so that
+several workers never pick the same email. An email claimed by a worker that stops before sending it is
+picked up again once the claim runs out, emails are sent at least once.
+
+Emails are sent right away within the request, as before, when OUTBOX_ENABLED is not set.
+"""
+from datetime import datetime, timedelta
+import time
+from flask import current_app
+from flask_mail import Message
+from app import db, mail
+from app.models import OutboxEmail
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def make_message(recipient, subject, html):
+    """
+    :return: email message from the default sender
+    :rtype: Message
+    """
+    return Message(subject=subject, recipients=[recipient], html=html,
+                   sender=current_app.config.get("MAIL_DEFAULT_SENDER"))
+
+
+def enqueue(recipient, subject, html):
+    """
+    Adds an email to the outbox, it is sent by the outbox worker once the session is committed
+    :param recipient: address the email is sent to
+    :param subject: subject of the email
+    :param html: body of the email
+    :return: the email in the outbox
+    :rtype: OutboxEmail
+    """
+    email = OutboxEmail(recipient=recipient, subject=subject, html=html, status=PENDING, attempts=0,
+                        next_attempt_at=datetime.now())
+    db.session.add(email)
+    return email
+
+
+def retry_delay(attempts):
+    """
+    :param attempts: number of failed attempts so far
+    :return: how long to wait before the next attempt
+    :rtype: timedelta
+    """
+    config = current_app.config
+    delay = config.get("OUTBOX_RETRY_DELAY", 60) * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, config.get("OUTBOX_MAX_RETRY_DELAY", 3600)))
+
+
+def claim_due(limit, now):
+    """
+    Claims the pending emails that are due, oldest first
+    :param limit: most emails to claim
+    :param now: the current time
+    :return: id, recipient, subject, body and attempts of each email claimed
+    :rtype: list
+    """
+    emails = OutboxEmail.query.filter(OutboxEmail.status == PENDING, OutboxEmail.next_attempt_at <= now) \
+        .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id).limit(limit).with_for_update(skip_locked=True).all()
+    claimed_until = now + timedelta(seconds=current_app.config.get("OUTBOX_CLAIM_TIMEOUT", 300))
+    claimed = []
+    for email in emails:
+        email.next_attempt_at = claimed_until
+        claimed.append((email.id, email.recipient, email.subject, email.html, email.attempts))
+    db.session.commit()
+    return claimed
+
+
+def deliver_due(limit=None, now=None):
+    """
+    Sends a batch of the emails that are due over a single connection to the mail server, scheduling another
+    attempt for those that could not be sent
+    :param limit: most emails to send, OUTBOX_BATCH_SIZE by default
+    :param now: the current time
+    :return: number of emails sent and number that could not be sent
+    :rtype: tuple
+    """
+    now = now or datetime.now()
+    claimed = claim_due(limit or current_app.config.get("OUTBOX_BATCH_SIZE", 50), now)
+    if not claimed:
+        return 0, 0
+
+    results = {}
+    try:
+        with mail.connect() as connection:
+            for email_id, recipient, subject, html, attempts in claimed:
+                try:
+                    connection.send(make_message(recipient, subject, html))
+                except Exception as e:
+                    results[email_id] = e
+                else:
+                    results[email_id] = None
+    except Exception as e:
+        # the mail server could not be reached, or the connection dropped
+        current_app.logger.warning("Could not send emails from the outbox: %s" % e)
+        for email_id, recipient, subject, html, attempts in claimed:
+            results.setdefault(email_id, e)
+
+    max_attempts = current_app.config.get("OUTBOX_MAX_ATTEMPTS", 8)
+    for email_id, recipient, subject, html, attempts in claimed:
+        error = results[email_id]
+        if error is None:
+            values = {"status": SENT, "sent_at": now}
+        else:
+            attempts += 1
+            values = {"status": FAILED if attempts >= max_attempts else PENDING, "attempts": attempts,
+                      "next_attempt_at": now + retry_delay(attempts), "last_error": repr(error)[:1000]}
+        OutboxEmail.query.filter(OutboxEmail.id == email_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+    failed = sum(1 for error in results.values() if error is not None)
+    return len(claimed) - failed, failed
+
+
+def run_worker(app, interval=5, stop=None):
+    """
+    Sends the emails in the outbox as they become due, waiting interval seconds whenever none are
+    :param app: the flask application
+    :param interval: seconds to wait before looking at the outbox again once it has nothing due
+    :param stop: threading.Event that stops the worker when set, it runs until interrupted otherwise
+    """
+    while stop is None or not stop.is_set():
+        sent = failed = 0
+        with app.app_context():
+            try:
+                sent, failed = deliver_due()
+            except Exception as e:
+                app.logger.error("Outbox worker failed: %s" % e)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        if sent or failed:
+            app.logger.info("Outbox worker sent %d emails, %d failed" % (sent, failed))
+        if not sent:
+            if stop is None:
+                time.sleep(interval)
+            else:
+                stop.wait(interval)
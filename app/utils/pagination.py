@@ -0,0 +1,104 @@
+"""
+Keyset (cursor) pagination for story listings.
+Instead of OFFSET, which makes the database walk and throw away every row before the requested page,
+each page continues after the last story of the previous page. Stories are ordered by (date_created, id)
+in descending order, so the next page is every story that sorts strictly after the cursor story on that
+pair. The cost of fetching a page stays the same however deep a reader scrolls, and only one page of
+rows is ever loaded.
+
+The cursor handed to the client is the id of the last story on the page, its date_created is looked up
+by primary key in the same query. A cursor story that has been deleted since takes the date_created of the
+story written just before it, the one with the next lower id, so that the next page still continues where
+the previous one ended rather than coming back empty.
+"""
+from flask import current_app
+from sqlalchemy import or_, and_, select
+from app.models import Story
+
+
+class KeysetPage(object):
+    """
+    A single page of stories
+    :cvar items: the stories on this page
+    :cvar next_cursor: cursor to pass to fetch the next page, None if this is the last page
+    """
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_filter(cursor, date_created=Story.date_created, story_id=Story.id):
+    """
+    Criterion for the rows that come after the cursor story in (date_created, id) descending order
+    :param cursor: id of the last story of the previous page
+    :param date_created: column holding the date the story was created, Story.date_created by default
+    :param story_id: column holding the id of the story, Story.id by default
+    :return: the criterion
+    """
+    cursor_story = Story.__table__.alias("cursor_story")
+    # the cursor story itself, or the one written just before it if it has been deleted
+    cursor_created = select([cursor_story.c.date_created]).where(cursor_story.c.id <= cursor).order_by(
+        cursor_story.c.id.desc()).limit(1).as_scalar()
+    return or_(date_created < cursor_created, and_(date_created == cursor_created, story_id < cursor))
+
+
+def after_cursor(query, cursor):
+    """
+    Restricts a story query to the stories that come after the cursor story in (date_created, id)
+    descending order
+    :param query: story query ordered by date_created and id in descending order
+    :param cursor: id of the last story of the previous page
+    :return: the filtered query
+    """
+    return query.filter(keyset_filter(cursor))
+
+
+def page_query(query, cursor=None, per_page=None):
+    """
+    The query run by paginate_stories for a page, it fetches one story more than the page holds to know
+    whether there is a next page
+    :param query: story query ordered by date_created and id in descending order, or a function of the
+    cursor and of the number of stories to fetch returning such a query, for queries that apply the cursor
+    themselves, see AuthorAccount.followed_stories
+    :param cursor: id of the last story of the previous page, None for the first page
+    :param per_page: number of stories per page, defaults to STORIES_PER_PAGE
+    :return: the query of the page
+    """
+    if per_page is None:
+        per_page = current_app.config.get("STORIES_PER_PAGE", 12)
+
+    if callable(query):
+        return query(cursor, per_page + 1).limit(per_page + 1)
+    if cursor is not None:
+        query = after_cursor(query, cursor)
+    return query.limit(per_page + 1)
+
+
+def paginate_stories(query, cursor=None, per_page=None):
+    """
+    Fetches one page of stories from the given query
+    :param query: story query, see page_query
+    :param cursor: id of the last story of the previous page, None for the first page
+    :param per_page: number of stories per page, defaults to STORIES_PER_PAGE
+    :return: the page of stories
+    :rtype: KeysetPage
+    """
+    if per_page is None:
+        per_page = current_app.config.get("STORIES_PER_PAGE", 12)
+
+    stories = page_query(query, cursor, per_page).all()
+    if len(stories) > per_page:
+        stories = stories[:per_page]
+        return KeysetPage(stories, next_cursor=stories[-1].id)
+    return KeysetPage(stories)
@@ -0,0 +1,172 @@
+"""
+Password hashing with configurable cost.
+Hashes are made with werkzeug's generate_password_hash using PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH,
+which are written into every hash. Without PASSWORD_HASH_METHOD, werkzeug's own default is used, scrypt
+for the pinned werkzeug. Raising the cost only applies to new hashes, so a hash made with a weaker method
+is reported as outdated and is replaced with a new one the next time its author logs in, see
+AuthorAccount.verify_password. Hashes are never replaced with weaker ones: scrypt is stronger than pbkdf2,
+which is stronger than a plain digest, and within scrypt or pbkdf2 a hash is only weaker when its cost
+parameters are lower. Hashes made with methods this module does not know are left alone.
+
+Hashing is CPU heavy by design. When PASSWORD_HASH_WORKERS is set, hashes are computed on a pool of that
+many threads, so that no more than that many cores of a worker process are ever busy hashing however
+many logins arrive at once. This only caps concurrent hashing: the request thread still blocks until its
+hash is done, and waits for its turn when the pool is busy, so logins do not get faster and each one still
+holds a request thread for as long as it takes. hashlib releases the GIL while it hashes, so the other
+threads of the process keep serving requests meanwhile.
+
+benchmark reports how many password checks a single core manages per second at a given cost, which is
+the number of logins per second per core that cost allows.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import inspect
+import time
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# werkzeug's default method, pbkdf2 before werkzeug 3 and scrypt since
+DEFAULT_METHOD = inspect.signature(generate_password_hash).parameters["method"].default
+DEFAULT_SALT_LENGTH = 16
+
+# cost parameters werkzeug uses for scrypt when they are left out, n, r and p
+SCRYPT_DEFAULTS = (2 ** 15, 8, 1)
+
+# digests pbkdf2 and plain hashes are made with, weakest first
+DIGESTS = ("md5", "sha1", "sha224", "sha256", "sha384", "sha512")
+
+
+def spell_out(method):
+    """
+    :param method: werkzeug hash method, with or without its cost parameters
+    :return: the method with every cost parameter written out as werkzeug writes it into hashes
+    :rtype: str
+    """
+    parts = method.split(":")
+    if parts[0] == "pbkdf2":
+        digest = parts[1] if len(parts) > 1 else "sha256"
+        iterations = int(parts[2]) if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return "pbkdf2:%s:%d" % (digest, iterations)
+    if parts[0] == "scrypt":
+        n, r, p = [int(part) for part in parts[1:]] + list(SCRYPT_DEFAULTS[len(parts) - 1:])
+        return "scrypt:%d:%d:%d" % (n, r, p)
+    return method
+
+
+def hash_method():
+    """
+    :return: the configured hash method, werkzeug's default if none is configured, with its cost
+    parameters spelled out as they are written into hashes
+    :rtype: str
+    """
+    method = None
+    if has_app_context():
+        method = current_app.config.get("PASSWORD_HASH_METHOD")
+    return spell_out(method or DEFAULT_METHOD)
+
+
+def strength(method):
+    """
+    :param method: spelled out hash method
+    :return: key ordering methods by strength, None for methods whose strength is not known
+    :rtype: tuple
+    """
+    parts = method.split(":")
+    if parts[0] == "scrypt" and len(parts) == 4:
+        n, r, p = (int(part) for part in parts[1:])
+        return 2, n * r, n * r * p
+    if parts[0] == "pbkdf2" and len(parts) == 3 and parts[1] in DIGESTS:
+        return 1, int(parts[2]), DIGESTS.index(parts[1])
+    if parts[0] in DIGESTS or parts[0] == "plain":
+        return (0,)
+    return None
+
+
+def salt_length():
+    """
+    :return: length of the salt of new hashes, PASSWORD_SALT_LENGTH or werkzeug's default
+    :rtype: int
+    """
+    if has_app_context():
+        return current_app.config.get("PASSWORD_SALT_LENGTH", DEFAULT_SALT_LENGTH)
+    return DEFAULT_SALT_LENGTH
+
+
+def hash_password(password):
+    """
+    :param password: the plain password
+    :return: hash of the password with the configured method
+    :rtype: str
+    """
+    return _run(generate_password_hash, password, hash_method(), salt_length())
+
+
+def check_password(password_hash, password):
+    """
+    :param password_hash: stored hash
+    :param password: plain password to check against it
+    :return: True if the password matches the hash
+    :rtype: bool
+    """
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def is_outdated(password_hash):
+    """
+    :param password_hash: stored hash
+    :return: True if the hash was made with a method weaker than the configured one
+    :rtype: bool
+    """
+    if not password_hash or "$" not in password_hash:
+        return False
+    current, wanted = strength(password_hash.split("$", 1)[0]), strength(hash_method())
+    if current is None or wanted is None or current[0] != wanted[0]:
+        # a different kind of hash is only replaced by a stronger kind
+        return current is not None and wanted is not None and current[0] < wanted[0]
+    # within a kind, any lower cost parameter is weaker
+    return any(have < want for have, want in zip(current[1:], wanted[1:]))
+
+
+def init_password_hashing(app):
+    """
+    Creates the password hashing thread pool for the app if PASSWORD_HASH_WORKERS is set
+    :param app: the current flask application
+    """
+    workers = app.config.get("PASSWORD_HASH_WORKERS")
+    if workers:
+        app.extensions["password_hashing"] = ThreadPoolExecutor(max_workers=workers,
+                                                                thread_name_prefix="password-hashing")
+
+
+def _run(function, *args):
+    """
+    Runs a hashing function on the password hashing thread pool of the current app if there is one. The
+    calling thread blocks on the result either way, the pool only bounds how many hashes run at once
+    """
+    pool = current_app.extensions.get("password_hashing") if has_app_context() else None
+    if pool is None:
+        return function(*args)
+    return pool.submit(function, *args).result()
+
+
+def benchmark(methods, seconds=1.0):
+    """
+    Measures how many password checks one core does per second for each method
+    :param methods: hash methods to measure, such as pbkdf2:sha256:260000
+    :param seconds: roughly how long to measure each method for
+    :return: list of (method, checks per second) pairs
+    :rtype: list
+    """
+    results = []
+    for method in methods:
+        password_hash = generate_password_hash("correct horse battery staple", method)
+        checks, started = 0, time.perf_counter()
+        while True:
+            check_password_hash(password_hash, "correct horse battery staple")
+            checks += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                break
+        results.append((method, checks / elapsed))
+    return results
@@ -0,0 +1,54 @@
+"""
+Query plans of the hot query paths.
+Prints what the database intends to do for the feed, dashboard, category and follow lookups so that a missing or
+unused index shows up as a full table scan before it shows up as latency.
+"""
+from sqlalchemy import select
+from app import db
+from app.models import AuthorAccount, Category, Story, followers
+from app.utils.pagination import page_query
+
+
+def hot_queries(author, cursor=None, category_id=None):
+    """
+    The main queries run by the application, as they would be run for the given author. Story listings are
+    the queries paginate_stories runs for their first and next pages
+    :param author: the author to build the queries for
+    :param cursor: story id to use as the keyset pagination cursor
+    :param category_id: id of the category to build the category page query for
+    :return: list of (name, selectable) pairs
+    :rtype: list
+    """
+    if cursor is None:
+        cursor = 0
+    if category_id is None:
+        category_id = 0
+    return [
+        ("home feed", page_query(Story.latest()).statement),
+        ("home feed, next page", page_query(Story.latest(), cursor).statement),
+        ("dashboard", page_query(Story.latest().filter(Story.author_id == author.id)).statement),
+        ("category page", page_query(Story.latest().filter(Story.category_id == category_id)).statement),
+        ("category facets", Category.query.filter(Category.stories_count > 0).order_by(Category.name).statement),
+        ("followed stories", page_query(author.followed_stories).statement),
+        ("followed stories, next page", page_query(author.followed_stories, cursor).statement),
+        ("is following", author.following.filter(followers.c.followed_id == author.id).statement),
+        ("followers of author", select([followers.c.follower_id]).where(followers.c.followed_id == author.id)),
+        ("author by email", AuthorAccount.query.filter_by(email=author.email).statement),
+    ]
+
+
+def explain(statement):
+    """
+    Runs EXPLAIN on the given statement with the current database engine. SQLite uses EXPLAIN QUERY PLAN
+    :param statement: selectable to explain
+    :return: rows of the plan
+    :rtype: list
+    """
+    engine = db.engine
+    compiled = statement.compile(dialect=engine.dialect)
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return engine.execute(prefix + str(compiled), params).fetchall()
@@ -0,0 +1,210 @@
+"""
+Whole-response cache for anonymous visitors.
+Anonymous visitors all see the same home, about and contact pages, so once one of them has been rendered
+the response is kept in memory and sent as is to the next visitor, without running the view or rendering
+a template. Entries are keyed by host, path and query string.
+
+Every cached response carries a strong ETag, the hash of its body. Browsers and proxies that send it back
+in If-None-Match get a 304 Not Modified with no body.
+
+Only responses rendered for a visitor with an empty session are stored, and they are only served to
+visitors with an empty session. A page that put something in the session while rendering, such as a CSRF
+token or a flashed message, belongs to that visitor and is never shared.
+
+The cache is cleared whenever a transaction that changed a story or an author is committed, so the home
+page is never stale in the process that made the change. Other worker processes pick the change up when
+their entries expire after RESPONSE_CACHE_TTL seconds. While an entry is being rendered, concurrent
+requests for the same page wait for it instead of all rendering it at once. The lock of a page is only kept
+while requests hold it or wait for it, so query strings that are never requested again leave nothing behind.
+
+The cache is only used when RESPONSE_CACHE_ENABLED is set.
+"""
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from hashlib import sha1
+from threading import Lock
+import time
+from flask import current_app, has_app_context, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import AuthorAccount, Story, StoryContent
+
+CachedResponse = namedtuple("CachedResponse", ["body", "status", "headers", "etag", "stored_at"])
+
+
+class ResponseCache(object):
+    """
+    Least recently used cache of responses
+    :cvar max_entries: most responses kept, the least recently used is dropped first
+    :cvar ttl: number of seconds a response is kept for
+    """
+
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        :param key: key of the response
+        :return: the cached response, None if there is none or it has expired
+        :rtype: CachedResponse
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, response):
+        """
+        Stores a copy of the response, without its cookies
+        :param key: key of the response
+        :param response: response to store
+        :return: the stored response
+        :rtype: CachedResponse
+        """
+        body = response.get_data()
+        headers = [(name, value) for name, value in response.headers if name.lower() != "set-cookie"]
+        entry = CachedResponse(body, response.status_code, headers, sha1(body).hexdigest(), time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @contextmanager
+    def key_lock(self, key):
+        """
+        Holds the lock of the key while the response for it is rendered. Each lock counts the requests
+        holding or waiting for it and is dropped once the last of them is done
+        :param key: key of the response
+        """
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def init_response_cache(app):
+    """
+    Creates the response cache for the app if RESPONSE_CACHE_ENABLED is set
+    :param app: the current flask application
+    """
+    if app.config.get("RESPONSE_CACHE_ENABLED"):
+        app.extensions["response_cache"] = ResponseCache(
+            max_entries=app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 512),
+            ttl=app.config.get("RESPONSE_CACHE_TTL", 60))
+
+
+def response_cache():
+    """
+    :return: the response cache of the current app, None if it is not enabled
+    :rtype: ResponseCache or None
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("response_cache")
+
+
+def cache_key():
+    """
+    :return: key of the current request, the query arguments are sorted so that their order does not matter
+    :rtype: tuple
+    """
+    return request.host, request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def make_response(entry):
+    """
+    Builds the response to send from a cached response, a 304 Not Modified if the client already has it
+    :param entry: the cached response
+    :return: the response to send
+    """
+    response = current_app.response_class(entry.body, status=entry.status, headers=entry.headers)
+    response.set_etag(entry.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+def cached_response(view):
+    """
+    Serves the view from the response cache for anonymous GET requests
+    :param view: view function to cache
+    :return: decorated view function
+    """
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        cache = response_cache()
+        if cache is None or request.method != "GET" or current_user.is_authenticated or session:
+            return view(*args, **kwargs)
+
+        key = cache_key()
+        entry = cache.get(key)
+        if entry is None:
+            with cache.key_lock(key):
+                # another request may have rendered the page while this one was waiting
+                entry = cache.get(key)
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or session or response.direct_passthrough:
+                        return response
+                    entry = cache.set(key, response)
+        return make_response(entry)
+
+    return decorated_function
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_cache_changes(session, flush_context):
+    """
+    Remembers that the transaction changed a story or an author
+    """
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Story, StoryContent, AuthorAccount)):
+            session.info["response_cache_changed"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_response_cache(session):
+    """
+    Clears the response cache once the changes to stories or authors have been committed
+    """
+    if session.info.pop("response_cache_changed", False):
+        cache = response_cache()
+        if cache is not None:
+            cache.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_cache_changes(session):
+    session.info.pop("response_cache_changed", None)
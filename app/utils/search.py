@@ -0,0 +1,219 @@
+"""
+Full-text search over story titles, taglines and content.
+Stories are searched through the database's own full-text index, never with LIKE scans:
+
+PostgreSQL keeps a weighted tsvector of every story in the story_search table, with a GIN index on it,
+and ranks matches with ts_rank_cd.
+SQLite keeps the text of every story in the story_search FTS5 virtual table, keyed by story id, and
+ranks matches with bm25.
+
+Titles weigh more than taglines, which weigh more than content. The index is created along with the story
+table and is kept in sync by a session event that re-indexes every story whose row or content has just
+been flushed. An existing database is indexed with the rebuild_search_index manage.py command.
+
+Search is only available on PostgreSQL and SQLite, on any other database stories are not indexed.
+"""
+import re
+from flask import current_app, has_app_context
+from sqlalchemy import DDL, event, select, text
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from app.models import Story, StoryContent
+from app.utils.pagination import KeysetPage
+
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+# PostgreSQL, one pre-computed document per story
+event.listen(Story.__table__, "after_create", DDL(
+    "CREATE TABLE story_search ("
+    "story_id INTEGER PRIMARY KEY REFERENCES story (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)").execute_if(dialect="postgresql"))
+event.listen(Story.__table__, "after_create", DDL(
+    "CREATE INDEX ix_story_search_document ON story_search USING GIN (document)").execute_if(
+    dialect="postgresql"))
+
+# SQLite, the rowid of the virtual table is the story id
+event.listen(Story.__table__, "after_create", DDL(
+    "CREATE VIRTUAL TABLE story_search USING fts5(title, tagline, content, "
+    "tokenize = 'porter unicode61')").execute_if(dialect="sqlite"))
+
+for dialect in SUPPORTED_DIALECTS:
+    event.listen(Story.__table__, "before_drop", DDL("DROP TABLE IF EXISTS story_search").execute_if(
+        dialect=dialect))
+
+POSTGRES_INSERT = text(
+    "INSERT INTO story_search (story_id, document) VALUES (:story_id, "
+    "setweight(to_tsvector(CAST(:language AS regconfig), :title), 'A') || "
+    "setweight(to_tsvector(CAST(:language AS regconfig), :tagline), 'B') || "
+    "setweight(to_tsvector(CAST(:language AS regconfig), :content), 'C'))")
+POSTGRES_DELETE = text("DELETE FROM story_search WHERE story_id = :story_id")
+POSTGRES_SEARCH = text(
+    "SELECT story_id FROM story_search, plainto_tsquery(CAST(:language AS regconfig), :terms) AS query "
+    "WHERE document @@ query "
+    "ORDER BY ts_rank_cd(document, query) DESC, story_id DESC LIMIT :limit OFFSET :offset")
+
+SQLITE_INSERT = text(
+    "INSERT INTO story_search (rowid, title, tagline, content) VALUES (:story_id, :title, :tagline, :content)")
+SQLITE_DELETE = text("DELETE FROM story_search WHERE rowid = :story_id")
+SQLITE_SEARCH = text(
+    "SELECT rowid FROM story_search WHERE story_search MATCH :terms "
+    "ORDER BY bm25(story_search, 10.0, 5.0, 1.0), rowid DESC LIMIT :limit OFFSET :offset")
+
+
+def is_supported(connection):
+    """
+    :param connection: connection or engine to the database
+    :return: True if stories can be searched on this database
+    :rtype: bool
+    """
+    return connection.dialect.name in SUPPORTED_DIALECTS
+
+
+def search_language():
+    """
+    :return: PostgreSQL text search configuration used to index and search stories
+    :rtype: str
+    """
+    if has_app_context():
+        return current_app.config.get("SEARCH_LANGUAGE", "english")
+    return "english"
+
+
+def match_query(terms):
+    """
+    Turns what a reader typed into an FTS5 query that matches stories with all the words. Every word is
+    quoted so that FTS5 operators and punctuation in the terms are searched for, not interpreted
+    :param terms: search terms as typed
+    :return: FTS5 query, empty if there are no words in the terms
+    :rtype: str
+    """
+    return " ".join('"%s"' % word for word in re.findall(r"\w+", terms, re.UNICODE))
+
+
+def index_stories(connection, story_ids):
+    """
+    Replaces the index entries of the given stories with their current title, tagline and content
+    :param connection: connection to run the statements on
+    :param story_ids: ids of the stories to index
+    :return: number of stories indexed
+    :rtype: int
+    """
+    story_ids = list(story_ids)
+    if not story_ids or not is_supported(connection):
+        return 0
+
+    story, content = Story.__table__, StoryContent.__table__
+    rows = connection.execute(select([story.c.id, story.c.title, story.c.tagline, content.c.text]).select_from(
+        story.outerjoin(content)).where(story.c.id.in_(story_ids))).fetchall()
+
+    remove_stories(connection, story_ids)
+    if not rows:
+        return 0
+
+    postgres = connection.dialect.name == "postgresql"
+    language = search_language()
+    connection.execute(POSTGRES_INSERT if postgres else SQLITE_INSERT, [
+        dict(story_id=row.id, title=row.title or "", tagline=row.tagline or "", content=row.text or "",
+             language=language) for row in rows])
+    return len(rows)
+
+
+def remove_stories(connection, story_ids):
+    """
+    Removes the index entries of the given stories
+    :param connection: connection to run the statements on
+    :param story_ids: ids of the stories to remove
+    """
+    story_ids = list(story_ids)
+    if not story_ids or not is_supported(connection):
+        return
+    delete = POSTGRES_DELETE if connection.dialect.name == "postgresql" else SQLITE_DELETE
+    connection.execute(delete, [dict(story_id=story_id) for story_id in story_ids])
+
+
+def rebuild_search_index(batch_size=500):
+    """
+    Indexes every story, in batches of story ids so that memory use does not grow with the number of
+    stories
+    :param batch_size: number of stories indexed per batch
+    :return: number of stories indexed
+    :rtype: int
+    """
+    indexed, last_id = 0, 0
+    story = Story.__table__
+    with db.engine.begin() as connection:
+        if not is_supported(connection):
+            return 0
+        while True:
+            story_ids = [row.id for row in connection.execute(select([story.c.id]).where(
+                story.c.id > last_id).order_by(story.c.id).limit(batch_size))]
+            if not story_ids:
+                break
+            indexed += index_stories(connection, story_ids)
+            last_id = story_ids[-1]
+    return indexed
+
+
+def search_stories(terms, page=1, per_page=None):
+    """
+    Fetches one page of the stories matching the search terms, best match first
+    :param terms: search terms as typed by the reader
+    :param page: number of the page to fetch, starting from 1
+    :param per_page: number of stories per page, defaults to STORIES_PER_PAGE
+    :return: the page of stories, loaded with their authors. The cursor of the page is the number of the
+    next page
+    :rtype: KeysetPage
+    """
+    if per_page is None:
+        per_page = current_app.config.get("STORIES_PER_PAGE", 12)
+    page = max(page or 1, 1)
+
+    connection = db.session.connection()
+    if not is_supported(connection):
+        return KeysetPage([])
+
+    if connection.dialect.name == "postgresql":
+        statement, params = POSTGRES_SEARCH, dict(terms=terms, language=search_language())
+    else:
+        statement, params = SQLITE_SEARCH, dict(terms=match_query(terms))
+    if not params["terms"].strip():
+        return KeysetPage([])
+
+    # fetch one extra row to know whether there is a next page
+    story_ids = [row[0] for row in connection.execute(statement, limit=per_page + 1,
+                                                      offset=(page - 1) * per_page, **params)]
+    next_page = page + 1 if len(story_ids) > per_page else None
+    story_ids = story_ids[:per_page]
+    if not story_ids:
+        return KeysetPage([])
+
+    stories = {story.id: story for story in Story.query.options(joinedload(Story.author)).filter(
+        Story.id.in_(story_ids))}
+    return KeysetPage([stories[story_id] for story_id in story_ids if story_id in stories],
+                      next_cursor=next_page)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_search_index(session, flush_context):
+    """
+    Re-indexes the stories whose row or content has just been flushed and removes deleted stories, in the
+    same transaction as the change itself
+    """
+    changed, removed = set(), set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Story) and session.is_modified(obj, include_collections=False):
+            changed.add(obj.id)
+        elif isinstance(obj, StoryContent) and session.is_modified(obj):
+            changed.add(obj.story_id)
+    for obj in session.deleted:
+        if isinstance(obj, Story):
+            removed.add(obj.id)
+
+    changed -= removed
+    changed.discard(None)
+    if not changed and not removed:
+        return
+
+    connection = session.connection()
+    remove_stories(connection, removed)
+    index_stories(connection, changed)
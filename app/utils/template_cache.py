@@ -0,0 +1,49 @@
+"""
+Compiled template caches.
+Compiled templates are kept in a least recently used cache of TEMPLATE_CACHE_SIZE templates, so that
+memory use is bounded however many templates the blueprints bring.
+
+When TEMPLATE_BYTECODE_CACHE_ENABLED is set the bytecode of compiled templates is also written to
+TEMPLATE_BYTECODE_CACHE_DIR, where every worker process can load it instead of compiling the template
+again. Files are written atomically and carry a checksum of their template's source, so a template that
+changed is compiled again on its next load. The bytecode of every template can be written ahead of the
+first request with the precompile_templates manage.py command.
+"""
+import os
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+from jinja2.utils import LRUCache
+
+TEMPLATE_EXTENSIONS = ("html", "txt", "xml")
+
+
+def init_template_cache(app):
+    """
+    Sets up the template and bytecode caches of the app's template environment
+    :param app: the current flask application
+    """
+    app.jinja_env.cache = LRUCache(app.config.get("TEMPLATE_CACHE_SIZE", 400))
+
+    if app.config.get("TEMPLATE_BYTECODE_CACHE_ENABLED"):
+        directory = app.config.get("TEMPLATE_BYTECODE_CACHE_DIR")
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile_templates(app):
+    """
+    Compiles every template of the app and its blueprints, writing their bytecode to the bytecode cache
+    :param app: the current flask application
+    :return: names of the templates compiled and names of the templates that failed to compile with their
+    errors
+    :rtype: tuple
+    """
+    compiled, failed = [], []
+    for name in app.jinja_env.list_templates(extensions=TEMPLATE_EXTENSIONS):
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateSyntaxError as error:
+            failed.append((name, error))
+        else:
+            compiled.append(name)
+    return compiled, failed
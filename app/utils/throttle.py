@@ -0,0 +1,214 @@
+"""
+Token bucket throttling of the login and registration forms.
+Every POST to a throttled view takes a token from the bucket of the client's IP address and one from the
+bucket of the email address it submits. Buckets hold up to as many tokens as the limit allows in its
+period and refill steadily over the period, so a client can make a short burst of attempts and then
+only as many as the refill allows. A request that finds a bucket empty gets a 429 Too Many Requests with
+a Retry-After, before the view looks up an author or hashes a password.
+
+Limits are set per view as "attempts/seconds", THROTTLE_LOGIN_PER_IP = "20/60" allows 20 login attempts
+from an IP address every minute.
+
+Buckets are kept in the memory of each worker process unless THROTTLE_STORAGE_URL points at a Redis
+server, which all worker processes then share. While Redis can not be reached each process falls back to
+buckets in its own memory, so logins keep working with limits that are only enforced per process.
+
+Behind proxies, THROTTLE_PROXY_COUNT is the number of proxies that add the client's address to
+X-Forwarded-For, 1 on Heroku. Counted wrong, every client is throttled as the address of the proxy, so it
+has to be set, 0 when clients connect directly, for the app to start with throttling enabled.
+
+Throttling is only done when THROTTLE_ENABLED is set.
+"""
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import time
+from flask import current_app, has_app_context, request
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryBackend(object):
+    """
+    Token buckets kept in the memory of the process
+    :cvar max_entries: most buckets kept, the least recently used is dropped first. A dropped bucket starts
+    full again
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def take(self, key, capacity, rate, now=None):
+        """
+        Takes a token from a bucket
+        :param key: key of the bucket
+        :param capacity: most tokens the bucket holds
+        :param rate: tokens added to the bucket per second
+        :param now: the current time in seconds
+        :return: 0 if a token was taken, otherwise the number of seconds until one is available
+        :rtype: float
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBackend(object):
+    """
+    Token buckets kept in Redis, shared by every worker process. Each bucket is a hash updated atomically
+    by a script, and expires once it would be full again
+    :cvar fallback: buckets used while Redis can not be reached
+    """
+
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+    local tokens, updated = tonumber(bucket[1]) or capacity, tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call("HMSET", KEYS[1], "tokens", tokens, "updated", now)
+    redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix="throttle:"):
+        if redis is None:
+            raise RuntimeError("The redis package is needed to keep throttling buckets in Redis")
+        self.prefix = prefix
+        self.fallback = MemoryBackend()
+        self._client = redis.StrictRedis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, now=None):
+        """
+        Takes a token from a bucket, see MemoryBackend.take. The bucket is taken from the fallback while
+        Redis can not be reached
+        """
+        try:
+            return float(self._script(keys=[self.prefix + key],
+                                      args=[capacity, rate, time.time() if now is None else now]))
+        except redis.RedisError as e:
+            current_app.logger.warning("Could not reach the throttling buckets in Redis: %s" % e)
+            return self.fallback.take(key, capacity, rate, now)
+
+
+def parse_limit(limit):
+    """
+    :param limit: limit written as "attempts/seconds"
+    :return: capacity of the bucket and tokens added per second
+    :rtype: tuple
+    """
+    attempts, seconds = limit.split("/")
+    return int(attempts), int(attempts) / float(seconds)
+
+
+def init_throttle(app):
+    """
+    Creates the throttling backend for the app if THROTTLE_ENABLED is set
+    :param app: the current flask application
+    """
+    if not app.config.get("THROTTLE_ENABLED"):
+        return
+    if app.config.get("THROTTLE_PROXY_COUNT") is None:
+        raise RuntimeError("THROTTLE_PROXY_COUNT has to be set when THROTTLE_ENABLED is, 0 if clients connect "
+                           "to the app directly")
+    url = app.config.get("THROTTLE_STORAGE_URL")
+    if url:
+        app.extensions["throttle"] = RedisBackend(url)
+    else:
+        app.extensions["throttle"] = MemoryBackend(max_entries=app.config.get("THROTTLE_MAX_ENTRIES", 100000))
+
+
+def throttle_backend():
+    """
+    :return: the throttling backend of the current app, None if throttling is not enabled
+    :rtype: MemoryBackend or RedisBackend or None
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("throttle")
+
+
+def client_address():
+    """
+    :return: IP address of the client, taken from X-Forwarded-For when behind THROTTLE_PROXY_COUNT proxies
+    :rtype: str
+    """
+    proxies = current_app.config.get("THROTTLE_PROXY_COUNT") or 0
+    forwarded = request.access_route
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.remote_addr or ""
+
+
+def too_many_requests(wait):
+    """
+    :param wait: seconds until the client may try again
+    :return: a 429 Too Many Requests response
+    """
+    retry_after = max(1, int(wait + 0.999))
+    response = current_app.response_class("Too many attempts, try again in %d seconds" % retry_after,
+                                          status=429, mimetype="text/plain")
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def throttle(name, email_field=None):
+    """
+    Throttles POST requests to the view by IP address with THROTTLE_<NAME>_PER_IP and by submitted email
+    address with THROTTLE_<NAME>_PER_EMAIL
+    :param name: name of the limits of the view
+    :param email_field: name of the form field holding the email address
+    :return: decorator of view functions
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            backend = throttle_backend()
+            if backend is None or request.method != "POST":
+                return view(*args, **kwargs)
+
+            buckets = [("ip", client_address())]
+            email = request.form.get(email_field, "").strip().lower() if email_field else ""
+            if email:
+                buckets.append(("email", email))
+
+            for kind, value in buckets:
+                limit = current_app.config.get("THROTTLE_%s_PER_%s" % (name.upper(), kind.upper()))
+                if not limit:
+                    continue
+                capacity, rate = parse_limit(limit)
+                wait = backend.take("%s:%s:%s" % (name, kind, value), capacity, rate)
+                if wait:
+                    return too_many_requests(wait)
+            return view(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
@@ -13,8 +13,83 @@ class Config(object):
     operations using the other.
     :cvar CSRF_SESSION_KEY Use a secure, unique and absolutely secret key for signing the data.
     :cvar SQLALCHEMY_DATABASE_URI Define the database - we are working with SQLite for this example
+    :cvar TIMELINE_FANOUT_THRESHOLD Authors with more followers than this are not fanned out on write, their
+    stories are pulled when a follower's feed is read
+    :cvar STORIES_PER_PAGE Number of stories fetched per page of any story listing
+    :cvar FOLLOWER_GRAPH_ENABLED Whether to keep an in-process index of the follower graph for follow checks
+    :cvar FOLLOWER_GRAPH_TTL Seconds after which the follower graph is reloaded to pick up follows made by
+    other worker processes
+    :cvar LAST_SEEN_GRANULARITY Seconds an author's last seen time is rounded down to, requests within the same
+    window do not need a write
+    :cvar LAST_SEEN_FLUSH_INTERVAL Minimum seconds between two batched writes of buffered last seen times
+    :cvar STORY_CONTENT_COMPRESSION Whether story content is zlib compressed when it is saved
+    :cvar STORY_CONTENT_COMPRESSION_MIN_LENGTH Shortest story content, in characters, that is compressed
+    :cvar READING_WORDS_PER_MINUTE Reading speed used to work out how long a story takes to read
+    :cvar STORY_EXCERPT_LENGTH Longest excerpt of a story's content shown in listings, in characters, at most 297
+    so that the excerpt and its ellipsis fit in the story table
+    :cvar SEARCH_LANGUAGE PostgreSQL text search configuration used to stem and index stories
+    :cvar RESPONSE_CACHE_ENABLED Whether pages rendered for anonymous visitors are cached whole and shared
+    :cvar RESPONSE_CACHE_TTL Seconds a cached page is kept for, bounds how long other worker processes can
+    serve a page from before a story or author changed
+    :cvar RESPONSE_CACHE_MAX_ENTRIES Most pages kept in the response cache of each worker process
+    :cvar FRAGMENT_CACHE_ENABLED Whether template fragments in {% cache %} blocks, such as story cards, are cached
+    :cvar FRAGMENT_CACHE_MAX_ENTRIES Most template fragments kept in the fragment cache of each worker process
+    :cvar AUTHOR_CACHE_ENABLED Whether logged in authors are kept in memory between requests instead of being
+    queried on every request
+    :cvar AUTHOR_CACHE_TTL Seconds a logged in author is kept in memory for, bounds how long changes made by
+    other worker processes take to show
+    :cvar AUTHOR_CACHE_MAX_ENTRIES Most authors kept in memory by each worker process
+    :cvar AVATAR_SOURCE Where author avatars come from, gravatar or identicon for identicons generated by the
+    application
+    :cvar STATIC_MANIFEST_ENABLED Whether static files are linked to the fingerprinted copies written by
+    manage.py build_assets, when they have been built
+    :cvar STATIC_BUILD_DIR Folder of the static folder the fingerprinted copies are written to
+    :cvar IMAGE_VARIANT_WIDTHS Widths in pixels of the smaller copies of images written by manage.py build_images
+    :cvar IMAGE_VARIANT_QUALITY JPEG quality of the smaller copies of images
+    :cvar IMAGE_VARIANTS_DIR Folder of the static folder the smaller copies of images are written to
+    :cvar THROTTLE_ENABLED Whether login and registration attempts are throttled by IP and email address
+    :cvar THROTTLE_STORAGE_URL Redis URL of the throttling buckets shared by all worker processes, each process
+    keeps its own buckets in memory if it is not set
+    :cvar THROTTLE_PROXY_COUNT Number of proxies in front of the app that add the client address to
+    X-Forwarded-For, 1 on Heroku and 0 when clients connect to the app directly. It has to be set when
+    throttling is enabled, with a wrong count every client shares the bucket of the proxy's address
+    :cvar THROTTLE_LOGIN_PER_IP Login attempts allowed from an IP address, as attempts/seconds
+    :cvar THROTTLE_LOGIN_PER_EMAIL Login attempts allowed for an email address, as attempts/seconds
+    :cvar THROTTLE_REGISTER_PER_IP Registration attempts allowed from an IP address, as attempts/seconds
+    :cvar THROTTLE_REGISTER_PER_EMAIL Registration attempts allowed for an email address, as attempts/seconds
+    :cvar THROTTLE_FORGOT_PASSWORD_PER_IP Password reset emails requested from an IP address, as attempts/seconds
+    :cvar THROTTLE_FORGOT_PASSWORD_PER_EMAIL Password reset emails requested for an email address, as
+    attempts/seconds
+    :cvar SECRET_KEY_FALLBACKS Older secret keys, comma separated, that links signed before the secret key was
+    rotated are still accepted from
+    :cvar TOKEN_CONFIRM_MAX_AGE Seconds an email confirmation link is valid for
+    :cvar TOKEN_RESET_PASSWORD_MAX_AGE Seconds a password reset link is valid for
+    :cvar OUTBOX_ENABLED Whether emails are added to the outbox and sent by manage.py run_outbox_worker instead of
+    being sent within the request
+    :cvar OUTBOX_BATCH_SIZE Most emails the outbox worker sends over one connection to the mail server
+    :cvar OUTBOX_RETRY_DELAY Seconds before an email that could not be sent is tried again, doubled with every
+    failed attempt
+    :cvar OUTBOX_MAX_RETRY_DELAY Longest wait in seconds between two attempts to send an email
+    :cvar OUTBOX_MAX_ATTEMPTS Attempts after which an email that could not be sent is marked failed
+    :cvar OUTBOX_CLAIM_TIMEOUT Seconds after which an email claimed by a worker that stopped before sending it
+    is tried again
+    :cvar RELEASE_VERSION Version of the deployed code, part of the ETag of conditional pages so that a release
+    with new templates invalidates them. Heroku sets HEROKU_RELEASE_VERSION when dyno metadata is enabled
+    :cvar PASSWORD_HASH_METHOD werkzeug method new password hashes are made with, werkzeug's default, scrypt, when
+    it is not set. Weaker hashes are replaced when their author logs in, stronger ones are kept. The parameters
+    of scrypt and the iterations of pbkdf2 set their cost, see manage.py benchmark_password_hashing
+    :cvar PASSWORD_SALT_LENGTH Length of the salt of new password hashes
+    :cvar PASSWORD_HASH_WORKERS Size of the thread pool passwords are hashed on, bounds how many cores each worker
+    process spends hashing. The request thread still waits for its hash, 0 hashes on the request thread itself
+    :cvar TEMPLATE_CACHE_SIZE Most compiled templates kept in memory by each worker process
+    :cvar TEMPLATE_BYTECODE_CACHE_ENABLED Whether compiled templates are written to disk for all worker processes
+    :cvar TEMPLATE_BYTECODE_CACHE_DIR Directory the template bytecode is written to, the system temporary
+    directory if it is not set
     """
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hadithi'
+    SECRET_KEY_FALLBACKS = [key for key in os.environ.get("SECRET_KEY_FALLBACKS", "").split(",") if key]
+    TOKEN_CONFIRM_MAX_AGE = 172800
+    TOKEN_RESET_PASSWORD_MAX_AGE = 3600
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
     SQLALCHEMY_MIGRATE_REPO = os.path.join(basedir, 'db_repository')
     SQLALCHEMY_TRACK_MODIFICATIONS = True
@@ -26,6 +101,53 @@ class Config(object):
     CSRF_SESSION_KEY = os.environ.get("CSRF_SESSION_KEY")
     THREADS_PER_PAGE = 2
     DATABASE_CONNECT_OPTIONS = {}
+    TIMELINE_FANOUT_THRESHOLD = int(os.environ.get("TIMELINE_FANOUT_THRESHOLD", 10000))
+    STORIES_PER_PAGE = 12
+    FOLLOWER_GRAPH_ENABLED = os.environ.get("FOLLOWER_GRAPH_ENABLED", "false").lower() == "true"
+    FOLLOWER_GRAPH_TTL = 300
+    LAST_SEEN_GRANULARITY = 60
+    LAST_SEEN_FLUSH_INTERVAL = 30
+    STORY_CONTENT_COMPRESSION = True
+    STORY_CONTENT_COMPRESSION_MIN_LENGTH = 256
+    READING_WORDS_PER_MINUTE = 200
+    STORY_EXCERPT_LENGTH = 200
+    SEARCH_LANGUAGE = os.environ.get("SEARCH_LANGUAGE", "english")
+    RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL = 60
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+    FRAGMENT_CACHE_ENABLED = os.environ.get("FRAGMENT_CACHE_ENABLED", "true").lower() == "true"
+    FRAGMENT_CACHE_MAX_ENTRIES = 2048
+    AUTHOR_CACHE_ENABLED = os.environ.get("AUTHOR_CACHE_ENABLED", "true").lower() == "true"
+    AUTHOR_CACHE_TTL = 60
+    AUTHOR_CACHE_MAX_ENTRIES = 10000
+    AVATAR_SOURCE = os.environ.get("AVATAR_SOURCE", "gravatar")
+    STATIC_MANIFEST_ENABLED = os.environ.get("STATIC_MANIFEST_ENABLED", "true").lower() == "true"
+    STATIC_BUILD_DIR = "build"
+    IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1280)
+    IMAGE_VARIANT_QUALITY = 80
+    IMAGE_VARIANTS_DIR = "img/variants"
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD")
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "0"))
+    THROTTLE_ENABLED = os.environ.get("THROTTLE_ENABLED", "true").lower() == "true"
+    THROTTLE_STORAGE_URL = os.environ.get("THROTTLE_STORAGE_URL")
+    THROTTLE_PROXY_COUNT = int(os.environ["THROTTLE_PROXY_COUNT"]) if os.environ.get("THROTTLE_PROXY_COUNT") else None
+    THROTTLE_LOGIN_PER_IP = "20/60"
+    THROTTLE_LOGIN_PER_EMAIL = "10/300"
+    THROTTLE_REGISTER_PER_IP = "10/3600"
+    THROTTLE_REGISTER_PER_EMAIL = "3/3600"
+    THROTTLE_FORGOT_PASSWORD_PER_IP = "10/3600"
+    THROTTLE_FORGOT_PASSWORD_PER_EMAIL = "3/3600"
+    OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "true").lower() == "true"
+    OUTBOX_BATCH_SIZE = 50
+    OUTBOX_RETRY_DELAY = 60
+    OUTBOX_MAX_RETRY_DELAY = 3600
+    OUTBOX_MAX_ATTEMPTS = 8
+    OUTBOX_CLAIM_TIMEOUT = 300
+    RELEASE_VERSION = os.environ.get("RELEASE_VERSION", os.environ.get("HEROKU_RELEASE_VERSION", ""))
+    TEMPLATE_CACHE_SIZE = 400
+    TEMPLATE_BYTECODE_CACHE_ENABLED = os.environ.get("TEMPLATE_BYTECODE_CACHE_ENABLED", "true").lower() == "true"
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get("TEMPLATE_BYTECODE_CACHE_DIR")
 
     # mail settings
     MAIL_SERVER = 'smtp.googlemail.com'
@@ -62,6 +184,8 @@ class DevelopmentConfig(Config):
     """
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    STATIC_MANIFEST_ENABLED = False
+    THROTTLE_PROXY_COUNT = int(os.environ.get("THROTTLE_PROXY_COUNT", "0"))
     # SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
 
 
@@ -75,6 +199,9 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     CSRF_ENABLED = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    TEMPLATE_BYTECODE_CACHE_ENABLED = False
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    THROTTLE_PROXY_COUNT = 0
 
 
 class ProductionConfig(Config):
@@ -81,6 +81,129 @@ def create_admin():
     db.session.commit()
 
 
+@manager.command
+def rebuild_timelines():
+    """
+    Rebuilds every author's materialized timeline from the followers table
+    """
+    from app.models import rebuild_timelines as rebuild
+    rows = rebuild()
+    print("Timelines rebuilt with %d entries" % rows + "." * 10)
+
+
+@manager.command
+def repair_counters():
+    """
+    Recomputes every author's followers, following and stories counters and every category's stories
+    counter from scratch
+    """
+    from app.models import recount_author_counters, recount_category_counters
+    authors = recount_author_counters()
+    categories = recount_category_counters()
+    print("Counters repaired for %d authors and %d categories" % (authors, categories) + "." * 10)
+
+
+@manager.option("-b", "--batch-size", dest="batch_size", default=500, type=int, help="stories per batch")
+def backfill_reading_stats(batch_size=500):
+    """
+    Fills in the word count, reading time and excerpt of stories saved before they were computed
+    """
+    from app.models import backfill_reading_stats as backfill
+    stories = backfill(batch_size=batch_size)
+    print("Reading stats filled in for %d stories" % stories + "." * 10)
+
+
+@manager.command
+def rebuild_search_index():
+    """
+    Indexes every story for full-text search, stories saved afterwards are indexed as they are saved
+    """
+    from app.utils.search import rebuild_search_index as rebuild
+    stories = rebuild()
+    print("Search index rebuilt with %d stories" % stories + "." * 10)
+
+
+@manager.option("-m", "--methods", dest="methods", help="comma separated hash methods to measure",
+                default="scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2:sha256:600000")
+def benchmark_password_hashing(methods=None):
+    """
+    Reports how many logins per second one core can verify with each password hash method
+    """
+    from app.utils.passwords import benchmark
+    cores = os.cpu_count() or 1
+    for method, rate in benchmark(methods.split(",")):
+        print("%s: %.1f logins per second per core, %.1f on %d cores" % (method, rate, rate * cores, cores))
+
+
+@manager.command
+def build_images():
+    """
+    Writes smaller, re-encoded copies of the images of the static folder for responsive_image srcsets.
+    Only images added or changed since the last build are processed
+    """
+    from app.utils.images import build_image_variants
+    manifest, processed = build_image_variants(app.static_folder,
+                                               variants_dir=app.config.get("IMAGE_VARIANTS_DIR", "img/variants"),
+                                               widths=app.config.get("IMAGE_VARIANT_WIDTHS", (320, 640, 960, 1280)),
+                                               quality=app.config.get("IMAGE_VARIANT_QUALITY", 80))
+    print("Processed %d of %d images" % (processed, len(manifest)) + "." * 10)
+
+
+@manager.command
+def build_assets():
+    """
+    Writes fingerprinted, precompressed copies of the static files and their manifest, the app links to
+    them the next time it starts
+    """
+    from app.utils.assets import build_assets as build
+    manifest = build(app.static_folder, app.config.get("STATIC_BUILD_DIR", "build"))
+    print("Built %d static files" % len(manifest) + "." * 10)
+
+
+@manager.command
+def precompile_templates():
+    """
+    Compiles every template of the app and its blueprints ahead of the first request, writing their
+    bytecode to the template bytecode cache shared by the worker processes
+    """
+    from app.utils.template_cache import precompile_templates as precompile
+    compiled, failed = precompile(app)
+    for name, error in failed:
+        print("Could not compile %s: %s" % (name, error))
+    print("Precompiled %d templates" % len(compiled) + "." * 10)
+
+
+@manager.option("-i", "--interval", dest="interval", default=5, type=float,
+                help="seconds to wait before looking at the outbox again when it has nothing due")
+def run_outbox_worker(interval=5):
+    """
+    Sends the emails waiting in the outbox, retrying those that could not be sent, until interrupted
+    """
+    from app.utils.outbox import run_worker
+    print("Sending emails from the outbox" + "." * 10)
+    run_worker(app, interval)
+
+
+@manager.option("-u", "--username", dest="username", default=None, help="author to build the queries for")
+def explain_queries(username=None):
+    """
+    Prints the query plans of the feed, dashboard, category and follow lookups
+    """
+    from app.utils.query_plans import hot_queries, explain
+    if username is None:
+        author = AuthorAccount.query.first()
+    else:
+        author = AuthorAccount.query.filter_by(username=username).first()
+    if author is None:
+        print("No author found to build the queries for")
+        return
+
+    for name, statement in hot_queries(author):
+        print(name + "." * 10)
+        for row in explain(statement):
+            print("    " + " ".join(str(column) for column in row))
+
+
 @manager.command
 def create_db():
     """
@@ -94,7 +217,11 @@ def create_db():
     if not os.path.exists(migrations_dir):
         init()
 
-    # perform database migrations
+    # bring the database up to the committed migrations, autogenerate can only run against an
+    # up to date database
+    upgrade()
+
+    # perform database migrations, no revision is written if the models have not changed
     migrate()
 
     # migrate database to latest revision
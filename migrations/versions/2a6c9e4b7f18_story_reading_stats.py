@@ -0,0 +1,32 @@
+"""story reading stats
+
+Word count, reading time and excerpt of every story, computed when the content is set. Existing stories
+are filled in afterwards with python manage.py backfill_reading_stats
+
+Revision ID: 2a6c9e4b7f18
+Revises: e81b5f3a92c6
+Create Date: 2026-10-18 13:05:37.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a6c9e4b7f18'
+down_revision = 'e81b5f3a92c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('story', sa.Column('word_count', sa.Integer(), nullable=True))
+    op.add_column('story', sa.Column('reading_minutes', sa.Integer(), nullable=True))
+    op.add_column('story', sa.Column('excerpt', sa.String(length=300), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.drop_column('excerpt')
+        batch_op.drop_column('reading_minutes')
+        batch_op.drop_column('word_count')
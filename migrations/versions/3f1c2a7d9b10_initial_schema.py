@@ -0,0 +1,121 @@
+"""initial schema
+
+Revision ID: 3f1c2a7d9b10
+Revises: 
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('author',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_modified', sa.DateTime(), nullable=True),
+    sa.Column('uuid', sa.String(length=250), nullable=False),
+    sa.Column('first_name', sa.String(length=100), nullable=False),
+    sa.Column('last_name', sa.String(length=100), nullable=False),
+    sa.Column('email', sa.String(length=250), nullable=False),
+    sa.Column('username', sa.String(length=250), nullable=False),
+    sa.Column('about_me', sa.String(length=250), nullable=True),
+    sa.Column('last_seen', sa.DateTime(), nullable=True),
+    sa.Column('password_hash', sa.String(length=250), nullable=False),
+    sa.Column('admin', sa.Boolean(), nullable=True),
+    sa.Column('registered_on', sa.DateTime(), nullable=False),
+    sa.Column('confirmed', sa.Boolean(), nullable=False),
+    sa.Column('confirmed_on', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_author_email'), 'author', ['email'], unique=True)
+    op.create_index(op.f('ix_author_first_name'), 'author', ['first_name'], unique=False)
+    op.create_index(op.f('ix_author_last_name'), 'author', ['last_name'], unique=False)
+    op.create_index(op.f('ix_author_username'), 'author', ['username'], unique=True)
+    op.create_table('async_operation_status',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_modified', sa.DateTime(), nullable=True),
+    sa.Column('code', sa.String(length=20), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('async_operation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_modified', sa.DateTime(), nullable=True),
+    sa.Column('async_operation_status_id', sa.Integer(), nullable=True),
+    sa.Column('author_profile_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['async_operation_status_id'], ['async_operation_status.id'], ),
+    sa.ForeignKeyConstraint(['author_profile_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('facebook_account',
+    sa.Column('first_name', sa.String(length=250), nullable=False),
+    sa.Column('last_name', sa.String(length=250), nullable=False),
+    sa.Column('email', sa.String(length=250), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('facebook_id', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('author_id'),
+    sa.UniqueConstraint('facebook_id')
+    )
+    op.create_table('followers',
+    sa.Column('follower_id', sa.Integer(), nullable=True),
+    sa.Column('followed_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['followed_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['author.id'], )
+    )
+    op.create_table('google_account',
+    sa.Column('first_name', sa.String(length=250), nullable=False),
+    sa.Column('last_name', sa.String(length=250), nullable=False),
+    sa.Column('email', sa.String(length=250), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('google_id', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('author_id'),
+    sa.UniqueConstraint('google_id')
+    )
+    op.create_table('story',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_modified', sa.DateTime(), nullable=True),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('tagline', sa.String(length=50), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('content', sa.String(length=10000), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('twitter_account',
+    sa.Column('first_name', sa.String(length=250), nullable=False),
+    sa.Column('last_name', sa.String(length=250), nullable=False),
+    sa.Column('email', sa.String(length=250), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('twitter_id', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('author_id'),
+    sa.UniqueConstraint('twitter_id')
+    )
+
+
+def downgrade():
+    op.drop_table('twitter_account')
+    op.drop_table('story')
+    op.drop_table('google_account')
+    op.drop_table('followers')
+    op.drop_table('facebook_account')
+    op.drop_table('async_operation')
+    op.drop_table('async_operation_status')
+    op.drop_index(op.f('ix_author_username'), table_name='author')
+    op.drop_index(op.f('ix_author_last_name'), table_name='author')
+    op.drop_index(op.f('ix_author_first_name'), table_name='author')
+    op.drop_index(op.f('ix_author_email'), table_name='author')
+    op.drop_table('author')
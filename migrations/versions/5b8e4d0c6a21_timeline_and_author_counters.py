@@ -0,0 +1,57 @@
+"""timeline and author counters
+
+Revision ID: 5b8e4d0c6a21
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 09:20:03.561472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e4d0c6a21'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('story_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('story_created', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['story_id'], ['story.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'story_id')
+    )
+    op.create_index('ix_timeline_owner_story_created', 'timeline', ['owner_id', 'story_created', 'story_id'],
+                    unique=False)
+    op.add_column('author', sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('author', sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('author', sa.Column('stories_count', sa.Integer(), server_default='0', nullable=False))
+
+    # fill the counters and timelines of existing authors, manage.py repair_counters and
+    # manage.py rebuild_timelines do the same thing on a live database
+    op.execute("""
+        UPDATE author SET
+            followers_count = (SELECT COUNT(DISTINCT follower_id) FROM followers WHERE followed_id = author.id),
+            following_count = (SELECT COUNT(DISTINCT followed_id) FROM followers WHERE follower_id = author.id),
+            stories_count = (SELECT COUNT(id) FROM story WHERE author_id = author.id)
+    """)
+    op.execute("""
+        INSERT INTO timeline (owner_id, story_id, author_id, story_created)
+        SELECT DISTINCT followers.follower_id, story.id, story.author_id, story.date_created
+        FROM followers JOIN story ON followers.followed_id = story.author_id
+        WHERE followers.follower_id IS NOT NULL AND story.date_created IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.drop_column('author', 'stories_count')
+    op.drop_column('author', 'following_count')
+    op.drop_column('author', 'followers_count')
+    op.drop_index('ix_timeline_owner_story_created', table_name='timeline')
+    op.drop_table('timeline')
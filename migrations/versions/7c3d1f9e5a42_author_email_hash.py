@@ -0,0 +1,39 @@
+"""author email hash
+
+Stores the md5 of every author's trimmed, lower cased email, used to link to their avatar
+
+Revision ID: 7c3d1f9e5a42
+Revises: 2a6c9e4b7f18
+Create Date: 2026-10-18 14:21:09.530716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from hashlib import md5
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3d1f9e5a42'
+down_revision = '2a6c9e4b7f18'
+branch_labels = None
+depends_on = None
+
+author = sa.table('author', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                  sa.column('email_hash', sa.String))
+
+
+def upgrade():
+    op.add_column('author', sa.Column('email_hash', sa.String(length=32), nullable=True))
+
+    connection = op.get_bind()
+    hashes = [dict(author_id=row.id,
+                   email_hash=md5((row.email or "").strip().lower().encode("utf-8")).hexdigest())
+              for row in connection.execute(sa.select([author.c.id, author.c.email]))]
+    if hashes:
+        connection.execute(author.update().where(author.c.id == sa.bindparam('author_id')).values(
+            email_hash=sa.bindparam('email_hash')), hashes)
+
+
+def downgrade():
+    with op.batch_alter_table('author') as batch_op:
+        batch_op.drop_column('email_hash')
@@ -0,0 +1,63 @@
+"""hot path indexes
+
+Adds a primary key to the followers table, which makes (follower_id, followed_id) unique and covers
+follow checks and "who does this author follow" lookups, plus an index on (followed_id, follower_id) for
+fan-out and follower lists. Duplicate and incomplete follower rows are dropped on the way.
+
+Stories get (author_id, date_created, id) for the dashboard and the followed stories pull path, and
+(date_created, id) for the home feed, both matching the keyset pagination order.
+
+Revision ID: 9d2f6e1a4c37
+Revises: 5b8e4d0c6a21
+Create Date: 2026-10-18 09:41:57.902615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6e1a4c37'
+down_revision = '5b8e4d0c6a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the followers table is rebuilt rather than altered, SQLite can not add a primary key in place
+    op.create_table('followers_dedup',
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('followed_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['followed_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['author.id'], ),
+    sa.PrimaryKeyConstraint('follower_id', 'followed_id', name='pk_followers')
+    )
+    op.execute("""
+        INSERT INTO followers_dedup (follower_id, followed_id)
+        SELECT DISTINCT follower_id, followed_id FROM followers
+        WHERE follower_id IS NOT NULL AND followed_id IS NOT NULL
+    """)
+    op.drop_table('followers')
+    op.rename_table('followers_dedup', 'followers')
+    op.create_index('ix_followers_followed_id_follower_id', 'followers', ['followed_id', 'follower_id'],
+                    unique=False)
+
+    op.create_index('ix_story_author_id_date_created', 'story', ['author_id', 'date_created', 'id'],
+                    unique=False)
+    op.create_index('ix_story_date_created_id', 'story', ['date_created', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_story_date_created_id', table_name='story')
+    op.drop_index('ix_story_author_id_date_created', table_name='story')
+
+    op.drop_index('ix_followers_followed_id_follower_id', table_name='followers')
+    op.create_table('followers_old',
+    sa.Column('follower_id', sa.Integer(), nullable=True),
+    sa.Column('followed_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['followed_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['author.id'], )
+    )
+    op.execute("INSERT INTO followers_old (follower_id, followed_id) SELECT follower_id, followed_id FROM followers")
+    op.drop_table('followers')
+    op.rename_table('followers_old', 'followers')
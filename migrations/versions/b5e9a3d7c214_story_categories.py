@@ -0,0 +1,97 @@
+"""story categories
+
+Moves the free text Story.category into a category table that stories reference by id, with the number
+of stories of every category kept on the category. Category names that only differ in case, spacing or
+punctuation are merged into one category, named as they were first written.
+
+Revision ID: b5e9a3d7c214
+Revises: 7c3d1f9e5a42
+Create Date: 2026-10-18 17:02:41.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e9a3d7c214'
+down_revision = '7c3d1f9e5a42'
+branch_labels = None
+depends_on = None
+
+story = sa.table('story', sa.column('id', sa.Integer), sa.column('category', sa.String),
+                 sa.column('category_id', sa.Integer))
+category = sa.table('category', sa.column('id', sa.Integer), sa.column('date_created', sa.DateTime),
+                    sa.column('date_modified', sa.DateTime), sa.column('name', sa.String),
+                    sa.column('slug', sa.String), sa.column('stories_count', sa.Integer))
+
+
+def normalize(name):
+    """
+    Same name and slug as app.models.Category.named
+    :return: name and slug of the category
+    """
+    name = " ".join((name or "").split())[:100]
+    slug = re.sub(r"[\W_]+", "-", name.lower()).strip("-")[:100]
+    if not slug:
+        return "Other", "other"
+    return name, slug
+
+
+def upgrade():
+    op.create_table('category',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_modified', sa.DateTime(), nullable=True),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('slug', sa.String(length=100), nullable=False),
+    sa.Column('stories_count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('slug')
+    )
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_story_category_id_category', 'category', ['category_id'], ['id'])
+        batch_op.create_index('ix_story_category_id_date_created', ['category_id', 'date_created', 'id'],
+                              unique=False)
+
+    connection = op.get_bind()
+    # every distinct category, in the order they were first used
+    names = [row.category for row in connection.execute(
+        sa.select([story.c.category]).group_by(story.c.category).order_by(sa.func.min(story.c.id)))]
+    categories = {}
+    for original in names:
+        name, slug = normalize(original)
+        categories.setdefault(slug, name)
+    if categories:
+        connection.execute(category.insert().values(date_created=sa.func.current_timestamp(),
+                                                    date_modified=sa.func.current_timestamp()),
+                           [dict(name=name, slug=slug) for slug, name in categories.items()])
+    category_ids = dict((row.slug, row.id) for row in connection.execute(sa.select([category.c.id, category.c.slug])))
+
+    for original in names:
+        condition = story.c.category.is_(None) if original is None else story.c.category == original
+        connection.execute(story.update().where(condition).values(category_id=category_ids[normalize(original)[1]]))
+
+    connection.execute(category.update().values(stories_count=sa.select([sa.func.count(story.c.id)]).where(
+        story.c.category_id == category.c.id).as_scalar()))
+
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.drop_column('category')
+
+
+def downgrade():
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=100), nullable=True))
+
+    connection = op.get_bind()
+    connection.execute(story.update().values(category=sa.select([category.c.name]).where(
+        category.c.id == story.c.category_id).as_scalar()))
+
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.drop_index('ix_story_category_id_date_created')
+        batch_op.drop_constraint('fk_story_category_id_category', type_='foreignkey')
+        batch_op.drop_column('category_id')
+
+    op.drop_table('category')
@@ -0,0 +1,77 @@
+"""story content table
+
+Moves Story.content into its own story_content table so that story listings do not read it, compressing
+long content with zlib on the way. Rows are copied in batches.
+
+Revision ID: c4a7e2f81d05
+Revises: 9d2f6e1a4c37
+Create Date: 2026-10-18 10:27:14.307419
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import zlib
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2f81d05'
+down_revision = '9d2f6e1a4c37'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+MIN_LENGTH = 256
+
+story = sa.table('story', sa.column('id', sa.Integer), sa.column('content', sa.String))
+story_content = sa.table('story_content', sa.column('story_id', sa.Integer), sa.column('text', sa.LargeBinary))
+
+
+def compress(text):
+    """
+    Same storage format as app.models.CompressedText
+    """
+    data = (text or "").encode("utf-8")
+    if len(text or "") >= MIN_LENGTH:
+        return b"z" + zlib.compress(data)
+    return b"t" + data
+
+
+def decompress(value):
+    value = bytes(value)
+    if value[:1] == b"z":
+        return zlib.decompress(value[1:]).decode("utf-8")
+    return value[1:].decode("utf-8")
+
+
+def upgrade():
+    op.create_table('story_content',
+    sa.Column('story_id', sa.Integer(), nullable=False),
+    sa.Column('text', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['story_id'], ['story.id'], ),
+    sa.PrimaryKeyConstraint('story_id')
+    )
+
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select([story.c.id, story.c.content]).where(story.c.id > last_id).order_by(
+            story.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        connection.execute(story_content.insert(), [dict(story_id=row.id, text=compress(row.content))
+                                                    for row in rows])
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.drop_column('content')
+
+
+def downgrade():
+    with op.batch_alter_table('story') as batch_op:
+        batch_op.add_column(sa.Column('content', sa.String(length=10000), nullable=False, server_default=''))
+
+    connection = op.get_bind()
+    for row in connection.execute(sa.select([story_content.c.story_id, story_content.c.text])).fetchall():
+        connection.execute(story.update().where(story.c.id == row.story_id).values(content=decompress(row.text)))
+
+    op.drop_table('story_content')
@@ -0,0 +1,36 @@
+"""story search index
+
+Full-text index of story titles, taglines and content, see app.utils.search. PostgreSQL gets a tsvector
+table with a GIN index, SQLite an FTS5 virtual table. Existing stories are indexed afterwards with
+python manage.py rebuild_search_index
+
+Revision ID: e81b5f3a92c6
+Revises: c4a7e2f81d05
+Create Date: 2026-10-18 11:42:51.118630
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b5f3a92c6'
+down_revision = 'c4a7e2f81d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE TABLE story_search ("
+                   "story_id INTEGER PRIMARY KEY REFERENCES story (id) ON DELETE CASCADE, "
+                   "document TSVECTOR NOT NULL)")
+        op.execute("CREATE INDEX ix_story_search_document ON story_search USING GIN (document)")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE story_search USING fts5(title, tagline, content, "
+                   "tokenize = 'porter unicode61')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('postgresql', 'sqlite'):
+        op.execute("DROP TABLE IF EXISTS story_search")
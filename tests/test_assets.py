@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from flask import url_for
+from tests import BaseTestCase
+from app.utils.assets import build_assets, init_assets
+
+
+class StaticAssetsTestCases(BaseTestCase):
+    """
+    Tests for fingerprinted, precompressed static files
+    """
+
+    def setUp(self):
+        super(StaticAssetsTestCases, self).setUp()
+        self.static_folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.static_folder, "css"))
+        os.makedirs(os.path.join(self.static_folder, "img"))
+        with open(os.path.join(self.static_folder, "css", "styles.css"), "w") as css:
+            css.write('.icon { background: url("../img/icon.svg?v=1") no-repeat; }\n' * 20)
+        with open(os.path.join(self.static_folder, "img", "icon.svg"), "w") as svg:
+            svg.write('<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+
+    def tearDown(self):
+        shutil.rmtree(self.static_folder, ignore_errors=True)
+        super(StaticAssetsTestCases, self).tearDown()
+
+    def test_build_writes_fingerprinted_copies_and_manifest(self):
+        """>>>> Test that every static file gets a fingerprinted copy, listed in the manifest"""
+        manifest = build_assets(self.static_folder)
+
+        self.assertRegex(manifest["css/styles.css"], r"^build/css/styles\.[0-9a-f]{12}\.css$")
+        self.assertRegex(manifest["img/icon.svg"], r"^build/img/icon\.[0-9a-f]{12}\.svg$")
+        with open(os.path.join(self.static_folder, "build", "manifest.json")) as manifest_file:
+            self.assertEqual(json.load(manifest_file), manifest)
+
+        css_path = os.path.join(self.static_folder, manifest["css/styles.css"])
+        with open(css_path) as css:
+            self.assertIn('url("../img/%s?v=1")' % os.path.basename(manifest["img/icon.svg"]), css.read())
+        with gzip.open(css_path + ".gz") as compressed, open(css_path, "rb") as css:
+            self.assertEqual(compressed.read(), css.read())
+
+    def test_build_is_incremental(self):
+        """>>>> Test that building again leaves unchanged files alone and only adds changed ones"""
+        first = build_assets(self.static_folder)
+        built = os.path.join(self.static_folder, first["img/icon.svg"])
+        modified = os.path.getmtime(built) - 100
+        os.utime(built, (modified, modified))
+
+        with open(os.path.join(self.static_folder, "css", "styles.css"), "a") as css:
+            css.write("body { margin: 0; }\n")
+        second = build_assets(self.static_folder)
+
+        self.assertEqual(os.path.getmtime(built), modified)
+        self.assertEqual(first["img/icon.svg"], second["img/icon.svg"])
+        self.assertNotEqual(first["css/styles.css"], second["css/styles.css"])
+
+    def test_build_deletes_copies_of_earlier_versions(self):
+        """>>>> Test that fingerprinted copies no longer in the manifest are deleted with their siblings"""
+        first = build_assets(self.static_folder)
+        with open(os.path.join(self.static_folder, "css", "styles.css"), "a") as css:
+            css.write("body { margin: 0; }\n")
+        os.remove(os.path.join(self.static_folder, "img", "icon.svg"))
+        second = build_assets(self.static_folder)
+
+        old_css = os.path.join(self.static_folder, first["css/styles.css"])
+        self.assertFalse(os.path.exists(old_css))
+        self.assertFalse(os.path.exists(old_css + ".gz"))
+        self.assertFalse(os.path.exists(os.path.join(self.static_folder, "build", "img")))
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, second["css/styles.css"])))
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, "build", "manifest.json")))
+
+    def test_static_urls_resolve_through_the_manifest(self):
+        """>>>> Test that url_for('static') links to the fingerprinted file, served precompressed and immutable"""
+        manifest = build_assets(self.static_folder)
+        self.app.static_folder = self.static_folder
+        self.app.config["STATIC_MANIFEST_ENABLED"] = True
+        init_assets(self.app)
+
+        with self.app.test_request_context():
+            url = url_for("static", filename="css/styles.css")
+            self.assertEqual(url, "/static/" + manifest["css/styles.css"])
+            self.assertEqual(url_for("static", filename="js/unknown.js"), "/static/js/unknown.js")
+
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_encoding, "gzip")
+        self.assertEqual(response.mimetype, "text/css")
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        response.close()
+
+        response = self.client.get(url)
+        self.assertIsNone(response.content_encoding)
+        self.assertIn(b"background", response.data)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
+from unittest import mock
+from flask import get_flashed_messages
 from flask_login import current_user
+from sqlalchemy import event
 from tests import BaseTestCase
 from app.mod_auth.token import generate_confirmation_token, confirm_token
 from app.models import AuthorAccount
@@ -116,5 +119,70 @@ class TestAuthentication(BaseTestCase):
         token = generate_confirmation_token('test@hadithi.com')
         self.assertFalse(confirm_token(token))
 
+
+class TestRegistration(BaseTestCase):
+    """
+    Tests for checking registered emails and usernames with a single query and the unique constraints
+    """
+
+    def register(self, email="newauthor@hadithi.com", username="newauthor"):
+        """
+        Submits the prefixed registration form as a fresh request, collecting the statements it runs
+        :return: the response and the statements
+        """
+        data = {"first_name": "New", "last_name": "Author", "username": username, "email": email,
+                "password": "password", "verify_password": "password"}
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.remove()
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.post("auth/register",
+                                        data={"register-form-%s" % k: v for k, v in data.items()})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return response, statements
+
+    def lookups(self, statements):
+        """
+        :return: the statements run before the author is inserted
+        """
+        inserts = [n for n, s in enumerate(statements) if s.lstrip().startswith("INSERT")]
+        return statements[:inserts[0] if inserts else len(statements)]
+
+    def test_registering_checks_email_and_username_at_once(self):
+        """>>>> Test that registering an author looks up the email and the username in one query"""
+        with self.client:
+            response, statements = self.register()
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(current_user.is_authenticated)
+        self.assertEqual(len(self.lookups(statements)), 1)
+        self.assertIsNotNone(AuthorAccount.query.filter_by(email="newauthor@hadithi.com").first())
+
+    def test_taken_email_and_username_are_reported(self):
+        """>>>> Test that a taken email and username are both reported from a single query"""
+        with self.client:
+            response, statements = self.register(email="guydemaupassant@hadithi.com", username="guydemaupassant")
+            self.assertEqual(get_flashed_messages(), ["Email already registered", "Username already registered"])
+        self.assertEqual(len(self.lookups(statements)), 1)
+        self.assertFalse(any(s.lstrip().startswith("INSERT") for s in statements))
+
+    def test_concurrent_registration_is_caught_by_constraints(self):
+        """>>>> Test that an email registered after the check is refused by the unique constraint"""
+        taken = AuthorAccount.taken
+        # the first check misses the author, as if they registered right after it
+        checks = [lambda **kwargs: set(), taken]
+        with mock.patch.object(AuthorAccount, "taken", side_effect=lambda **kwargs: checks.pop(0)(**kwargs)):
+            with self.client:
+                response, _ = self.register(email="guydemaupassant@hadithi.com")
+                self.assertEqual(response.status_code, 302)
+                self.assertFalse(current_user.is_authenticated)
+                self.assertEqual(get_flashed_messages(), ["Email already registered"])
+        self.assertEqual(AuthorAccount.query.filter_by(username="newauthor").count(), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
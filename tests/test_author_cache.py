@@ -0,0 +1,119 @@
+import unittest
+from flask import g
+from sqlalchemy import event, inspect
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount
+from app.utils.author_cache import AuthorCache, author_cache, load_cached_author
+
+
+class AuthorCacheTestCases(BaseTestCase):
+    """
+    Tests for the cache in front of the Flask-Login user loader
+    """
+
+    def login_author(self):
+        """
+        Logs in through the prefixed login form
+        """
+        return self.client.post(
+            "auth/login",
+            data={"login-form-email": "guydemaupassant@hadithi.com", "login-form-password": "password"},
+            follow_redirects=True
+        )
+
+    def count_author_queries(self, url):
+        """
+        Fetches the url with an empty session and counts the statements that select from the author table.
+        The requests of the tests share one app context, forget the author Flask-Login kept in it
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT") and "FROM author" in statement:
+                statements.append(statement)
+
+        db.session.remove()
+        g.pop("_login_user", None)
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.client.get(url)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return len(statements)
+
+    def author_id(self):
+        return AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first().id
+
+    def test_repeat_requests_do_not_query_the_author(self):
+        """>>>> Test that the logged in author is only queried on the first request"""
+        self.login_author()
+        self.assertEqual(self.count_author_queries("/about"), 1)
+        self.assertEqual(self.count_author_queries("/about"), 0)
+
+    def test_cached_author_is_attached_and_writable(self):
+        """>>>> Test that an author served from the cache can be changed and committed by a view"""
+        author_id = self.author_id()
+        db.session.remove()
+        load_cached_author(db.session, author_id)
+        db.session.remove()
+
+        author = load_cached_author(db.session, author_id)
+        self.assertTrue(inspect(author).persistent)
+        author.about_me = "Master of the short story"
+        db.session.commit()
+
+        db.session.remove()
+        about_me = db.session.execute("SELECT about_me FROM author WHERE id = :id", dict(id=author_id)).scalar()
+        self.assertEqual(about_me, "Master of the short story")
+
+    def test_committed_changes_drop_the_author(self):
+        """>>>> Test that an author is dropped from the cache when a change to them is committed"""
+        author_id = self.author_id()
+        db.session.remove()
+        load_cached_author(db.session, author_id)
+        self.assertIsNotNone(author_cache().get(author_id))
+
+        author = AuthorAccount.query.get(author_id)
+        author.confirmed = True
+        db.session.commit()
+
+        self.assertIsNone(author_cache().get(author_id))
+        db.session.remove()
+        self.assertTrue(load_cached_author(db.session, author_id).confirmed)
+
+    def test_new_stories_are_counted_on_the_dashboard(self):
+        """>>>> Test that the dashboard of a cached author shows the story they just wrote"""
+        author = AuthorAccount.query.get(self.author_id())
+        author.confirmed = True
+        db.session.commit()
+        stories_count, username = author.stories_count, author.username
+        self.login_author()
+        self.assertEqual(self.count_author_queries("/dashboard/%s" % username), 1)
+
+        data = {"story_title": "The Necklace", "tagline": "A borrowed necklace", "category": "Fiction",
+                "content": "She was one of those pretty and charming girls", "publish": "PUBLISH"}
+        db.session.remove()
+        g.pop("_login_user", None)
+        response = self.client.post("/dashboard/%s/new-story" % username, data=data)
+        self.assertEqual(response.status_code, 302)
+
+        db.session.remove()
+        g.pop("_login_user", None)
+        response = self.client.get("/dashboard/%s" % username)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("%d stories" % (stories_count + 1), response.data.decode("utf-8"))
+
+    def test_authors_loaded_before_a_change_are_not_stored(self):
+        """>>>> Test that a snapshot taken before authors were dropped is not stored"""
+        author = AuthorAccount.query.get(self.author_id())
+        cache = AuthorCache(ttl=60)
+        version = cache.version
+        cache.forget([author.id])
+
+        self.assertFalse(cache.put(author, version=version))
+        self.assertTrue(cache.put(author, version=cache.version))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Category, Story
+
+
+class CategoryTestCases(BaseTestCase):
+    """
+    Tests for category pages and the category facets
+    """
+
+    def save_stories(self, category, count):
+        """
+        Saves stories in the given category
+        :param category: name of the category
+        :param count: number of stories to save
+        """
+        author = AuthorAccount.query.first()
+        for n in range(count):
+            db.session.add(Story(title="%s story %d" % (category, n), tagline="Tagline %d" % n, category=category,
+                                 content="", author_id=author.id))
+        db.session.commit()
+
+    def test_category_page_lists_stories_of_the_category(self):
+        """>>>> Test that a category page only shows the stories filed under it"""
+        self.save_stories("Poetry", 2)
+        self.save_stories("Drama", 1)
+
+        response = self.client.get("/story/category/poetry")
+        self.assertIn(b"Poetry story 0", response.data)
+        self.assertIn(b"Poetry story 1", response.data)
+        self.assertNotIn(b"Drama story 0", response.data)
+        self.assertNotIn(b"Gotham in flames", response.data)
+
+    def test_unknown_category_is_not_found(self):
+        """>>>> Test that a category page for a category that does not exist is not found"""
+        response = self.client.get("/story/category/no-such-category")
+        self.assertNotIn(b"top-bar__headline", response.data)
+
+    def test_category_feed_pages_through_the_category(self):
+        """>>>> Test that the next page of a category only continues with stories of the category"""
+        self.save_stories("Poetry", 14)
+        self.save_stories("Drama", 3)
+        first = Story.latest().filter(Story.category_id == Category.named("Poetry").id).all()
+
+        response = self.client.get("/story/feed?source=category&category=poetry&cursor=%d" % first[11].id)
+        self.assertEqual(response.data.count(b"grid__item"), 2)
+        self.assertNotIn(b"Drama", response.data)
+
+    def test_facets_show_counts_without_reading_stories(self):
+        """>>>> Test that the facet sidebar lists every category with stories and its count from the category table"""
+        self.save_stories("Poetry", 3)
+        db.session.add(Category.named("Empty"))
+        db.session.commit()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            facets = Category.facets()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual([(facet.name, facet.stories_count) for facet in facets], [("Fiction", 1), ("Poetry", 3)])
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn("story", statements[0])
+
+        response = self.client.get("/story/category/poetry")
+        self.assertIn(b'href="/story/category/fiction"', response.data)
+        self.assertIn(b'class="facet--active"', response.data)
+        self.assertNotIn(b"Empty", response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
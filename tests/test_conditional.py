@@ -0,0 +1,128 @@
+import unittest
+from datetime import datetime
+from flask import g
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Story
+
+
+class ConditionalGetTestCases(BaseTestCase):
+    """
+    Tests for answering conditional requests for story and dashboard pages from date_modified
+    """
+
+    def login_author(self):
+        """
+        Confirms and logs in an author through the prefixed login form
+        :return: the author
+        """
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        author.confirmed = True
+        db.session.commit()
+        self.client.post(
+            "auth/login",
+            data={"login-form-email": "guydemaupassant@hadithi.com", "login-form-password": "password"},
+            follow_redirects=True
+        )
+        return author
+
+    def get(self, url, **headers):
+        """
+        Fetches the url as a fresh request, collecting the statements it runs
+        :return: the response and the statements
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.remove()
+        g.pop("_login_user", None)
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(url, headers=headers)
+            response.get_data()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return response, statements
+
+    def touch_story(self, story_id, when):
+        db.session.execute(Story.__table__.update().where(Story.id == story_id).values(date_modified=when))
+        db.session.commit()
+
+    def test_story_page_is_not_sent_again(self):
+        """>>>> Test that a story page the client already has gets a 304 without loading the story"""
+        story_id = Story.query.first().id
+        url = "/story/%d" % story_id
+        first, _ = self.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.headers["ETag"])
+        self.assertTrue(first.headers["Last-Modified"])
+
+        second, statements = self.get(url, **{"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b"")
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn("story.title", statements[0])
+
+        third, _ = self.get(url, **{"If-Modified-Since": first.headers["Last-Modified"]})
+        self.assertEqual(third.status_code, 304)
+
+    def test_changed_story_is_sent_again(self):
+        """>>>> Test that changing the story or its content gives the page a new validator"""
+        story = Story.query.first()
+        story_id, url = story.id, "/story/%d" % story.id
+        self.touch_story(story_id, datetime(2020, 1, 1))
+        first, _ = self.get(url)
+
+        self.touch_story(story_id, datetime(2020, 1, 2))
+        second, _ = self.get(url, **{"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first.headers["ETag"], second.headers["ETag"])
+
+        story = Story.query.get(story_id)
+        story.content = "A different ending"
+        db.session.commit()
+        third, _ = self.get(url, **{"If-None-Match": second.headers["ETag"]})
+        self.assertEqual(third.status_code, 200)
+        self.assertIn(b"A different ending", third.data)
+
+    def test_missing_story_is_not_found(self):
+        """>>>> Test that validating a story that does not exist does not render it"""
+        response, _ = self.get("/story/424242")
+        self.assertNotIn("ETag", response.headers)
+        self.assertNotIn(b"top-bar", response.data)
+
+    def test_logged_in_pages_are_private(self):
+        """>>>> Test that authors get a private page validated by their ETag alone"""
+        url = "/story/%d" % Story.query.first().id
+        anonymous, _ = self.get(url)
+        self.login_author()
+
+        response, _ = self.get(url, **{"If-Modified-Since": anonymous.headers["Last-Modified"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(anonymous.headers["ETag"], response.headers["ETag"])
+        self.assertNotIn("Last-Modified", response.headers)
+        self.assertIn("private", response.headers["Cache-Control"])
+        self.assertIn("Cookie", response.headers["Vary"])
+
+    def test_dashboard_follows_the_stories_of_the_author(self):
+        """>>>> Test that the dashboard is only sent again once the author's stories change"""
+        author = self.login_author()
+        author_id, url = author.id, "/dashboard/%s" % author.username
+        first, _ = self.get(url)
+        self.assertEqual(first.status_code, 200)
+
+        second, _ = self.get(url, **{"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(second.status_code, 304)
+
+        db.session.add(Story(title="One more", tagline="New", category="Fiction", content="", author_id=author_id))
+        db.session.commit()
+        third, _ = self.get(url, **{"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(third.status_code, 200)
+        self.assertIn(b"One more", third.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount
+from app.utils.follower_graph import FollowerGraph, init_follower_graph, follower_graph
+
+
+class FollowerGraphTestCases(unittest.TestCase):
+    """
+    Tests for the follower graph adjacency sets
+    """
+
+    def test_load_and_membership(self):
+        """>>>> Test that loaded edges can be looked up, duplicates are collapsed"""
+        graph = FollowerGraph()
+        graph.load([(1, 2), (1, 3), (1, 3), (2, 1)])
+        self.assertTrue(graph.is_following(1, 3))
+        self.assertTrue(graph.is_following(2, 1))
+        self.assertFalse(graph.is_following(2, 3))
+        self.assertFalse(graph.is_following(4, 1))
+        self.assertEqual(list(graph.following_ids(1)), [2, 3])
+
+    def test_add_and_remove_keep_ids_sorted(self):
+        """>>>> Test that adding and removing edges keeps the adjacency arrays sorted"""
+        graph = FollowerGraph()
+        graph.load([])
+        for followed_id in (5, 1, 3, 3):
+            graph.add(7, followed_id)
+        self.assertEqual(list(graph.following_ids(7)), [1, 3, 5])
+        graph.remove(7, 3)
+        graph.remove(7, 9)
+        self.assertEqual(list(graph.following_ids(7)), [1, 5])
+
+    def test_graph_is_stale_until_loaded(self):
+        """>>>> Test that a graph is stale until loaded and after invalidation"""
+        graph = FollowerGraph(ttl=60)
+        self.assertTrue(graph.is_stale())
+        graph.load([])
+        self.assertFalse(graph.is_stale())
+        graph.invalidate()
+        self.assertTrue(graph.is_stale())
+
+
+class FollowerGraphEventsTestCases(BaseTestCase):
+    """
+    Tests that the follower graph follows the followers table
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.app.config["FOLLOWER_GRAPH_ENABLED"] = True
+        init_follower_graph(self.app)
+        self.author1 = AuthorAccount.query.filter_by(username="test1hadithi").first()
+        self.author2 = AuthorAccount.query.filter_by(username="test2hadithi").first()
+
+    def test_follow_and_unfollow_update_the_graph(self):
+        """>>>> Test that follows and unfollows are reflected in the graph"""
+        graph = follower_graph()
+        db.session.add(self.author1.follow(self.author2))
+        db.session.commit()
+        self.assertTrue(graph.is_following(self.author1.id, self.author2.id))
+
+        # a second follow is refused
+        self.assertIsNone(self.author1.follow(self.author2))
+
+        db.session.add(self.author1.unfollow(self.author2))
+        db.session.commit()
+        self.assertFalse(graph.is_following(self.author1.id, self.author2.id))
+
+    def test_is_following_runs_no_queries(self):
+        """>>>> Test that follow checks are answered without touching the database"""
+        db.session.add(self.author1.follow(self.author2))
+        db.session.commit()
+        ids = (self.author1.id, self.author2.id)
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.assertTrue(self.author1.is_following(self.author2))
+            self.assertFalse(self.author2.is_following(self.author1))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+        self.assertEqual(ids, (self.author1.id, self.author2.id))
+        self.assertEqual(statements, [])
+
+    def test_follows_reach_the_graph_once_committed(self):
+        """>>>> Test that flushed follows are only shared with other requests once they are committed"""
+        graph = follower_graph()
+        self.author1.follow(self.author2)
+        db.session.flush()
+        self.assertFalse(graph.is_following(self.author1.id, self.author2.id))
+        self.assertTrue(self.author1.is_following(self.author2))
+
+        db.session.commit()
+        self.assertTrue(graph.is_following(self.author1.id, self.author2.id))
+
+    def test_rolled_back_follows_never_reach_the_graph(self):
+        """>>>> Test that flushed follows that are rolled back do not get into the graph"""
+        graph = follower_graph()
+        self.author1.follow(self.author2)
+        db.session.flush()
+
+        db.session.rollback()
+        self.assertFalse(graph.is_following(self.author1.id, self.author2.id))
+        self.assertFalse(self.author1.is_following(self.author2))
+
+    def test_stale_graph_is_reloaded_by_one_thread(self):
+        """>>>> Test that concurrent readers of a stale graph reload it only once"""
+        graph = follower_graph()
+        graph.invalidate()
+        loads = []
+        load_from_db = graph.load_from_db
+
+        def slow_load():
+            loads.append(1)
+            time.sleep(0.05)
+            load_from_db()
+
+        graph.load_from_db = slow_load
+        app = self.app
+
+        def read():
+            with app.app_context():
+                follower_graph()
+
+        threads = [threading.Thread(target=read) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(loads), 1)
+        self.assertFalse(graph.is_stale())
+
+if __name__ == '__main__':
+    unittest.main()
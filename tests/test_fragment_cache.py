@@ -0,0 +1,69 @@
+import unittest
+from tests import BaseTestCase
+from app import db
+from app.models import Story
+from app.utils.fragment_cache import FragmentCache
+
+
+class FragmentCacheTestCases(BaseTestCase):
+    """
+    Tests for the {% cache %} template block
+    """
+
+    def render(self, source, **context):
+        return self.app.jinja_env.from_string(source).render(**context)
+
+    def test_unchanged_fragments_are_not_rendered_again(self):
+        """>>>> Test that a fragment is rendered once per key and then served from the cache"""
+        calls = []
+
+        def expensive():
+            calls.append(1)
+            return "rendered"
+
+        source = "{% cache (story_id, modified) %}{{ expensive() }}{% endcache %}"
+        self.assertEqual(self.render(source, story_id=1, modified=1, expensive=expensive), "rendered")
+        self.assertEqual(self.render(source, story_id=1, modified=1, expensive=expensive), "rendered")
+        self.assertEqual(len(calls), 1)
+
+        self.render(source, story_id=1, modified=2, expensive=expensive)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(list(self.app.jinja_env.fragment_cache.stats().values()), [dict(hits=1, misses=2)])
+
+    def test_blocks_with_the_same_key_are_kept_apart(self):
+        """>>>> Test that two blocks using the same key each keep their own output"""
+        source = "{% cache key, 60 %}a{% endcache %}{% cache key, 60 %}b{% endcache %}"
+        self.assertEqual(self.render(source, key=1), "ab")
+        self.assertEqual(self.render(source, key=1), "ab")
+        self.assertEqual(len(self.app.jinja_env.fragment_cache.stats()), 2)
+
+    def test_story_cards_are_cached(self):
+        """>>>> Test that the story cards of the home page are reused between renders"""
+        self.app.extensions.pop("response_cache", None)
+        self.client.get("/")
+        self.client.get("/")
+        stats = self.app.jinja_env.fragment_cache.stats()
+        self.assertTrue(stats)
+        for fragment, counts in stats.items():
+            self.assertEqual(counts["hits"], counts["misses"])
+
+    def test_edited_story_cards_are_rendered_again(self):
+        """>>>> Test that a story edited within the second it was written gets a fresh card"""
+        self.app.extensions.pop("response_cache", None)
+        story = Story.query.first()
+        self.client.get("/")
+        story.tagline = "Edited within the same second"
+        db.session.commit()
+        self.assertIn(b"Edited within the same second", self.client.get("/").data)
+
+    def test_fragment_cache_is_bounded(self):
+        """>>>> Test that the least recently used fragments are dropped"""
+        cache = FragmentCache(max_entries=2)
+        for key in range(3):
+            cache.render("fragment", key, None, lambda: "output")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats(), dict(fragment=dict(hits=0, misses=3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Story
+
+
+class HomePageTestCases(BaseTestCase):
+    """
+    Tests for the home page story grid
+    """
+
+    def add_stories(self, count):
+        """
+        Adds stories written by different authors
+        :param count: number of stories to add
+        """
+        authors = AuthorAccount.query.all()
+        for n in range(count):
+            author = authors[n % len(authors)]
+            db.session.add(Story(title="Story %d" % n, tagline="Tagline %d" % n, category="Fiction",
+                                 content="", author_id=author.id))
+        db.session.commit()
+
+    def count_queries(self, url):
+        """
+        Counts the number of SQL statements executed while fetching the given url
+        :param url: url to fetch
+        :return: response and the number of statements executed
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return response, len(statements)
+
+    def test_home_page_shows_story_authors(self):
+        """>>>> Test that the home page shows the author of every story card"""
+        self.add_stories(4)
+        response = self.client.get("/")
+        for author in AuthorAccount.query.all():
+            self.assertIn(author.username.encode(), response.data)
+
+    def test_home_page_query_count_does_not_grow_with_stories(self):
+        """>>>> Test that the home page runs a fixed number of queries however many stories it shows"""
+        self.add_stories(2)
+        _, few = self.count_queries("/")
+
+        self.add_stories(10)
+        response, many = self.count_queries("/")
+
+        self.assertEqual(response.data.count(b"grid__item"), 12)
+        self.assertEqual(few, many)
+        # the stories with their authors and categories, and the category facets
+        self.assertEqual(many, 2)
+
+    def test_story_page_shows_content(self):
+        """>>>> Test that the story page loads the content that the home page leaves out"""
+        author = AuthorAccount.query.first()
+        story = Story(title="Read me", tagline="Whole story", category="Fiction",
+                      content="Once upon a time " * 100 + "from start to finish", author_id=author.id)
+        db.session.add(story)
+        db.session.commit()
+
+        home = self.client.get("/")
+        self.assertNotIn(b"from start to finish", home.data)
+        response = self.client.get("/story/%d" % story.id)
+        self.assertIn(b"from start to finish", response.data)
+
+    def test_story_page_streams_head_before_loading_content(self):
+        """>>>> Test that the head of the story page is sent before the content of the story is queried"""
+        author = AuthorAccount.query.first()
+        story = Story(title="Read me", tagline="Whole story", category="Fiction",
+                      content="Once upon a time", author_id=author.id)
+        db.session.add(story)
+        db.session.commit()
+        url = "/story/%d" % story.id
+        db.session.remove()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        response = self.client.get(url)
+        try:
+            self.assertTrue(response.is_streamed)
+            chunks = iter(response.response)
+            self.assertIn(b"<!DOCTYPE html>", next(chunks))
+            self.assertFalse([statement for statement in statements if "story_content" in statement])
+            self.assertIn(b"Once upon a time", b"".join(chunks))
+            self.assertTrue([statement for statement in statements if "story_content" in statement])
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+            response.close()
+
+    def test_story_page_takes_flashed_messages_out_of_the_session(self):
+        """>>>> Test that a message flashed before a streamed story page is only shown once"""
+        story = Story.query.first()
+        with self.client.session_transaction() as session:
+            session["_flashes"] = [("message", "Welcome back")]
+
+        self.assertIn(b"Welcome back", self.client.get("/story/%d" % story.id).data)
+        self.assertNotIn(b"Welcome back", self.client.get("/story/%d" % story.id).data)
+
+
+if __name__ == '__main__':
+    unittest.main()
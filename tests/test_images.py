@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests import BaseTestCase
+from app.utils.images import Image, build_image_variants, responsive_image
+
+
+class ResponsiveImagesTestCases(BaseTestCase):
+    """
+    Tests for the smaller copies of images and the responsive_image helper
+    """
+
+    def setUp(self):
+        super(ResponsiveImagesTestCases, self).setUp()
+        self.static_folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.static_folder, "img", "dashboard"))
+
+    def tearDown(self):
+        shutil.rmtree(self.static_folder, ignore_errors=True)
+        super(ResponsiveImagesTestCases, self).tearDown()
+
+    def save_image(self, name, width, height, color="red"):
+        Image.new("RGB", (width, height), color).save(os.path.join(self.static_folder, name), "JPEG", quality=95)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_build_writes_narrower_variants(self):
+        """>>>> Test that an image gets a copy for every width up to its own"""
+        self.save_image("img/dashboard/1.jpg", 1000, 500)
+        manifest, processed = build_image_variants(self.static_folder)
+
+        entry = manifest["img/dashboard/1.jpg"]
+        self.assertEqual(processed, 1)
+        self.assertEqual(sorted(entry["variants"]), ["320", "640", "960"])
+        self.assertRegex(entry["variants"]["320"], r"^img/variants/dashboard/1-320w\.[0-9a-f]{12}\.jpg$")
+        with Image.open(os.path.join(self.static_folder, entry["variants"]["640"])) as variant:
+            self.assertEqual(variant.size, (640, 320))
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_build_is_incremental(self):
+        """>>>> Test that building again only processes changed images and removes their old copies"""
+        self.save_image("img/dashboard/1.jpg", 700, 700)
+        self.save_image("img/dashboard/2.jpg", 700, 700)
+        first, processed = build_image_variants(self.static_folder)
+        self.assertEqual(processed, 2)
+
+        self.save_image("img/dashboard/2.jpg", 700, 700, color="blue")
+        second, processed = build_image_variants(self.static_folder)
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(first["img/dashboard/1.jpg"], second["img/dashboard/1.jpg"])
+        self.assertNotEqual(first["img/dashboard/2.jpg"]["hash"], second["img/dashboard/2.jpg"]["hash"])
+        self.assertFalse(os.path.exists(os.path.join(self.static_folder,
+                                                     first["img/dashboard/2.jpg"]["variants"]["320"])))
+
+    def test_helper_writes_srcset_of_variants(self):
+        """>>>> Test that responsive_image lists the variants and the original by width"""
+        manifest = {"img/bear.jpg": dict(hash="0123456789ab", width=1000, height=500, variants={
+            "640": "img/variants/bear-640w.0123456789ab.jpg", "320": "img/variants/bear-320w.0123456789ab.jpg"
+        })}
+        with self.app.test_request_context():
+            tag = responsive_image(manifest, "img/bear.jpg", alt="A bear", sizes="50vw", class_="artwork")
+
+        self.assertIn('srcset="/static/img/variants/bear-320w.0123456789ab.jpg 320w, '
+                      '/static/img/variants/bear-640w.0123456789ab.jpg 640w, /static/img/bear.jpg 1000w"', tag)
+        self.assertIn('sizes="50vw"', tag)
+        self.assertIn('width="1000" height="500"', tag)
+        self.assertIn('class="artwork"', tag)
+
+    def test_helper_falls_back_to_plain_image(self):
+        """>>>> Test that an image without variants gets a plain img tag"""
+        with self.app.test_request_context():
+            tag = responsive_image(None, "img/bear.jpg", alt='"Bear"')
+
+        self.assertIn('src="/static/img/bear.jpg"', tag)
+        self.assertIn('alt="&#34;Bear&#34;"', tag)
+        self.assertNotIn("srcset", tag)
+
+
+if __name__ == '__main__':
+    unittest.main()
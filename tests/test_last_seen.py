@@ -0,0 +1,104 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount
+from app.utils.last_seen import LastSeenBuffer
+
+
+class LastSeenBufferTestCases(unittest.TestCase):
+    """
+    Tests for coarsening of last seen times
+    """
+
+    def test_times_are_rounded_down_to_granularity(self):
+        """>>>> Test that last seen times are rounded down to the buffer granularity"""
+        buffer = LastSeenBuffer(granularity=60)
+        self.assertEqual(buffer.coarsen(datetime(2017, 5, 1, 10, 15, 42, 500)), datetime(2017, 5, 1, 10, 15))
+
+    def test_times_in_the_stored_window_are_not_buffered(self):
+        """>>>> Test that an author already seen in the current window needs no write"""
+        buffer = LastSeenBuffer(granularity=60)
+        self.assertFalse(buffer.touch(1, datetime(2017, 5, 1, 10, 15, 42), datetime(2017, 5, 1, 10, 15)))
+        self.assertTrue(buffer.touch(1, datetime(2017, 5, 1, 10, 16, 2), datetime(2017, 5, 1, 10, 15)))
+        self.assertEqual(buffer.pending(), {1: datetime(2017, 5, 1, 10, 16)})
+
+
+class LastSeenRequestTestCases(BaseTestCase):
+    """
+    Tests that authenticated requests do not write last seen times on their own
+    """
+
+    def login_author(self):
+        """
+        Logs in through the prefixed login form
+        """
+        return self.client.post(
+            "auth/login",
+            data={"login-form-email": "guydemaupassant@hadithi.com", "login-form-password": "password"},
+            follow_redirects=True
+        )
+
+    def count_updates(self, url):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE"):
+                statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.client.get(url)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return len(statements)
+
+    def test_requests_buffer_last_seen(self):
+        """>>>> Test that authenticated page views issue no writes and are flushed in one batch"""
+        buffer = self.app.extensions["last_seen"]
+        buffer.flush_interval = 3600
+        self.login_author()
+
+        self.assertEqual(self.count_updates("/"), 0)
+        self.assertEqual(self.count_updates("/about"), 0)
+
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        self.assertIn(author.id, buffer.pending())
+
+        self.assertEqual(buffer.flush(), 1)
+        db.session.expire_all()
+        self.assertEqual(author.last_seen, buffer.coarsen(author.last_seen))
+        self.assertIsNotNone(author.last_seen)
+        self.assertEqual(buffer.pending(), {})
+
+    def test_flush_leaves_date_modified_alone(self):
+        """>>>> Test that writing last seen times does not count as a change of the author"""
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        modified = datetime(2017, 5, 1, 10, 15)
+        db.session.execute(AuthorAccount.__table__.update().where(AuthorAccount.id == author.id).values(
+            date_modified=modified))
+        db.session.commit()
+
+        buffer = self.app.extensions["last_seen"]
+        buffer.touch(author.id, datetime.now())
+        self.assertEqual(buffer.flush(), 1)
+        db.session.expire_all()
+        self.assertIsNotNone(author.last_seen)
+        self.assertEqual(author.date_modified, modified)
+
+    def test_flush_is_done_at_teardown_when_due(self):
+        """>>>> Test that buffered times are written at request teardown once the interval has passed"""
+        buffer = self.app.extensions["last_seen"]
+        buffer.flush_interval = 0
+        self.login_author()
+        self.client.get("/")
+
+        db.session.expire_all()
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        self.assertIsNotNone(author.last_seen)
+        self.assertEqual(buffer.pending(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
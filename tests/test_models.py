@@ -1,9 +1,11 @@
 import unittest
 from tests import BaseTestCase
 from app import db
-from app.models import AuthorAccount, Story
+from app.models import AuthorAccount, Story, Category, timeline, rebuild_timelines, recount_author_counters, \
+    recount_category_counters, reading_stats, backfill_reading_stats
 from datetime import datetime
 from werkzeug.security import check_password_hash
+from app.utils.pagination import paginate_stories
 
 
 class ModelsTestCases(BaseTestCase):
@@ -90,6 +92,46 @@ class ModelsTestCases(BaseTestCase):
         expected = "http://www.gravatar.com/avatar/fed209f2d62f792377bbdf5ee864ee9b"
         self.assertEqual(avatar[0: len(expected)], expected)
 
+    def test_email_hash_follows_the_email(self):
+        """>>>> Test that the stored email hash is normalized and updated with the email, avatars along with it"""
+        author = AuthorAccount.query.filter_by(email='guydemaupassant@hadithi.com').first()
+        self.assertEqual(author.email_hash, "fed209f2d62f792377bbdf5ee864ee9b")
+        self.assertEqual(AuthorAccount.hash_email(" GuyDeMaupassant@hadithi.com "), author.email_hash)
+
+        before = author.avatar(64)
+        self.assertIs(author.avatar(64), before)
+        author.email = "guy@hadithi.com"
+        db.session.commit()
+        self.assertNotEqual(author.avatar(64), before)
+        self.assertIn(author.email_hash, author.avatar(64))
+
+    def test_identicon_avatars(self):
+        """>>>> Test that avatars can be identicons generated by the application"""
+        self.app.config["AVATAR_SOURCE"] = "identicon"
+        author = AuthorAccount.query.filter_by(email='guydemaupassant@hadithi.com').first()
+        with self.app.test_request_context():
+            avatar = author.avatar(32)
+        self.assertEqual(avatar, "/avatar/%s.svg?s=32" % author.email_hash)
+
+        response = self.client.get(avatar)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "image/svg+xml")
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertEqual(response.data, self.client.get(avatar).data)
+        self.assertNotEqual(self.client.get("/avatar/not-a-hash.svg").mimetype, "image/svg+xml")
+
+    def test_identicon_avatars_outside_requests(self):
+        """>>>> Test that avatars can be linked to outside of a request, as in emails sent by the outbox"""
+        self.app.config["AVATAR_SOURCE"] = "identicon"
+        author = AuthorAccount.query.filter_by(email='guydemaupassant@hadithi.com').first()
+        self.assertIn("gravatar.com/avatar/%s" % author.email_hash, author.avatar(32))
+
+        self.app.config["SERVER_NAME"] = "hadithi.example.com"
+        email_hash = author.email_hash
+        with self.app.app_context():
+            avatar = AuthorAccount(email='guydemaupassant@hadithi.com').avatar(64)
+        self.assertEqual(avatar, "http://hadithi.example.com/avatar/%s.svg?s=64" % email_hash)
+
     @staticmethod
     def create_authors():
         """
@@ -189,16 +231,260 @@ class ModelsTestCases(BaseTestCase):
         s11 = a1.followed_stories().all()
         s22 = a2.followed_stories().all()
 
-        # check that all posts followed by a1 and a2 are 1
-        self.assertEqual(len(s11), 1)
+        # a1 and a2 follow each other and themselves, so both see both stories
+        self.assertEqual(len(s11), 2)
+
+        self.assertEqual(len(s22), 2)
+
+        s1 = Story.query.filter_by(author_id=a1.id).first()
+        s2 = Story.query.filter_by(author_id=a2.id).first()
+        self.assertEqual(s11, [s2, s1])
+        self.assertEqual(s22, [s2, s1])
+
+    def test_new_stories_are_fanned_out_to_followers(self):
+        """>>>> Test that a new story is pushed to the timeline of the author's followers"""
+        a1, a2 = self.create_authors()
+        db.session.add(a2.follow(a1))
+        db.session.commit()
+
+        story = Story(title="Fresh story", tagline="Hot off the press", category="Fiction", content="",
+                      author_id=a1.id)
+        db.session.add(story)
+        db.session.flush()
+        story.fan_out()
+        db.session.commit()
+
+        rows = db.session.execute(timeline.select().where(timeline.c.owner_id == a2.id)).fetchall()
+        self.assertEqual(len(rows), 2)
+        self.assertIn(story, a2.followed_stories().all())
+
+        # unfollowing removes the author's stories from the timeline
+        db.session.add(a2.unfollow(a1))
+        db.session.commit()
+        self.assertEqual(a2.followed_stories().all(), [])
+
+    def test_stories_of_authors_with_large_following_are_pulled(self):
+        """>>>> Test that authors above the fan-out threshold are read from the story table"""
+        self.app.config["TIMELINE_FANOUT_THRESHOLD"] = 0
+        a1, a2 = self.create_authors()
+        db.session.add(a1.follow(a1))
+        db.session.commit()
+
+        # a1 now has a follower, which is above the threshold
+        db.session.add(a2.follow(a1))
+        db.session.commit()
 
-        self.assertEqual(len(s22), 1)
+        rows = db.session.execute(timeline.select().where(timeline.c.owner_id == a2.id)).fetchall()
+        self.assertEqual(rows, [])
 
         s1 = Story.query.filter_by(author_id=a1.id).first()
-        self.assertEqual(s11, [s1])
+        self.assertEqual(a2.followed_stories().all(), [s1])
+
+    def write_stories(self, author, count):
+        for n in range(count):
+            story = Story(title="Story %d" % n, tagline="Tagline %d" % n, category="Fiction", content="",
+                          author_id=author.id)
+            db.session.add(story)
+            db.session.flush()
+            story.fan_out()
+        db.session.commit()
+
+    def test_followed_stories_are_paged_from_timeline_and_pulled_stories(self):
+        """>>>> Test that paging through followed stories merges pushed and pulled stories in order"""
+        self.app.config["TIMELINE_FANOUT_THRESHOLD"] = 1
+        a1, a2 = self.create_authors()
+        for follower, followed in ((a1, a1), (a2, a1), (a2, a2)):
+            db.session.add(follower.follow(followed))
+            db.session.commit()
+
+        # a1 now has a large following, their new stories are pulled while a2's are pushed
+        self.assertTrue(a1.has_large_following())
+        self.write_stories(a1, 3)
+        self.write_stories(a2, 3)
+        expected = a2.followed_stories().all()
+        self.assertEqual(len(expected), 8)
+
+        seen, cursor = [], None
+        while True:
+            page = paginate_stories(a2.followed_stories, cursor=cursor, per_page=3)
+            seen.extend(page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_authors_back_within_the_threshold_are_pushed(self):
+        """>>>> Test that the stories of an author who drops to the fan-out threshold are pushed again"""
+        self.app.config["TIMELINE_FANOUT_THRESHOLD"] = 1
+        a1, a2 = self.create_authors()
+        for follower, followed in ((a1, a1), (a2, a1)):
+            db.session.add(follower.follow(followed))
+            db.session.commit()
+        self.write_stories(a1, 2)
+
+        db.session.add(a1.unfollow(a1))
+        db.session.commit()
+
+        self.assertFalse(a1.has_large_following())
+        rows = db.session.execute(timeline.select().where(timeline.c.owner_id == a2.id)).fetchall()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(a2.followed_stories().all()), 3)
 
+    def test_rebuild_timelines_from_followers(self):
+        """>>>> Test that timelines can be rebuilt from the followers table"""
+        a1, a2 = self.create_authors()
+        db.session.add(a1.follow(a2))
+        db.session.add(a2.follow(a1))
+        db.session.commit()
+
+        db.session.execute(timeline.delete())
+        db.session.commit()
+        self.assertEqual(a1.followed_stories().all(), [])
+
+        self.assertEqual(rebuild_timelines(), 2)
         s2 = Story.query.filter_by(author_id=a2.id).first()
-        self.assertEqual(s22, [s2])
+        self.assertEqual(a1.followed_stories().all(), [s2])
+
+    def test_follow_and_unfollow_keep_counters(self):
+        """>>>> Test that follow and unfollow keep the followers and following counters up to date"""
+        a1, a2 = self.create_authors()
+        db.session.add(a1.follow(a2))
+        db.session.commit()
+
+        self.assertEqual((a1.following_count, a1.followers_count), (1, 0))
+        self.assertEqual((a2.following_count, a2.followers_count), (0, 1))
+
+        db.session.add(a1.unfollow(a2))
+        db.session.commit()
+
+        self.assertEqual((a1.following_count, a2.followers_count), (0, 0))
+
+    def test_new_stories_are_counted(self):
+        """>>>> Test that saving a story increments the author's stories counter"""
+        a1, a2 = self.create_authors()
+        self.assertEqual(a1.stories_count, 1)
+
+        db.session.add(Story(title="Another one", tagline="Counting", category="Fiction", content="",
+                             author_id=a1.id))
+        db.session.commit()
+        self.assertEqual(a1.stories_count, 2)
+
+    def test_recount_author_counters(self):
+        """>>>> Test that counters can be repaired from the followers and story tables"""
+        a1, a2 = self.create_authors()
+        db.session.add(a1.follow(a2))
+        db.session.commit()
+
+        a1.following_count, a2.followers_count, a2.stories_count = 10, 10, 10
+        db.session.commit()
+
+        recount_author_counters()
+        self.assertEqual((a1.following_count, a2.followers_count, a2.stories_count), (1, 1, 1))
+
+    def test_category_names_are_normalized(self):
+        """>>>> Test that category names differing in case, spacing or punctuation are one category"""
+        a1, a2 = self.create_authors()
+        for name in ("Science Fiction", " science  fiction", "Science-Fiction!"):
+            db.session.add(Story(title=name, tagline="Same", category=name, content="", author_id=a1.id))
+        db.session.commit()
+
+        category = Category.query.filter_by(slug="science-fiction").one()
+        self.assertEqual(category.name, "Science Fiction")
+        self.assertEqual(category.stories_count, 3)
+        self.assertEqual(Story(title="None", tagline="", category="", content="", author_id=a1.id).category.slug,
+                         "other")
+
+    def test_category_counters_follow_stories(self):
+        """>>>> Test that category counters are kept up to date when stories are saved, moved and deleted"""
+        a1, a2 = self.create_authors()
+        story = Story(title="Moving", tagline="Around", category="Poetry", content="", author_id=a1.id)
+        db.session.add(story)
+        db.session.commit()
+        poetry = Category.query.filter_by(slug="poetry").one()
+        self.assertEqual(poetry.stories_count, 1)
+
+        story.category = Category.named("Drama")
+        db.session.commit()
+        drama = Category.query.filter_by(slug="drama").one()
+        self.assertEqual((poetry.stories_count, drama.stories_count), (0, 1))
+
+        db.session.delete(story)
+        db.session.commit()
+        self.assertEqual(drama.stories_count, 0)
+
+    def test_recount_category_counters(self):
+        """>>>> Test that category counters can be repaired from the story table"""
+        a1, a2 = self.create_authors()
+        category = Category.query.first()
+        category.stories_count = 10
+        db.session.commit()
+
+        recount_category_counters()
+        self.assertEqual(category.stories_count, Story.query.filter_by(category_id=category.id).count())
+
+    def test_story_content_is_stored_separately(self):
+        """>>>> Test that story content is kept in the story_content table and read back unchanged"""
+        a1, a2 = self.create_authors()
+        content = "Once upon a time " * 100
+        story = Story(title="Long one", tagline="Compressed", category="Fiction", content=content,
+                      author_id=a1.id)
+        db.session.add(story)
+        db.session.commit()
+        story_id = story.id
+        db.session.expire_all()
+
+        stored = db.session.execute("SELECT text FROM story_content WHERE story_id = :id",
+                                    dict(id=story_id)).scalar()
+        self.assertTrue(stored.startswith(b"z"))
+        self.assertLess(len(stored), len(content))
+        self.assertEqual(Story.query.get(story_id).content, content)
+
+    def test_short_story_content_is_not_compressed(self):
+        """>>>> Test that short story content is stored as plain text"""
+        a1, a2 = self.create_authors()
+        story = Story(title="Short one", tagline="Plain", category="Fiction", content="The end.",
+                      author_id=a1.id)
+        db.session.add(story)
+        db.session.commit()
+
+        stored = db.session.execute("SELECT text FROM story_content WHERE story_id = :id",
+                                    dict(id=story.id)).scalar()
+        self.assertEqual(stored, b"tThe end.")
+
+    def test_reading_stats_are_computed_when_content_is_set(self):
+        """>>>> Test that word count, reading time and excerpt are worked out from the content"""
+        a1, a2 = self.create_authors()
+        story = Story(title="Stats", tagline="Counted", category="Fiction", content="word " * 450,
+                      author_id=a1.id)
+        self.assertEqual((story.word_count, story.reading_minutes), (450, 3))
+        self.assertTrue(story.excerpt.endswith("word..."))
+        self.assertLessEqual(len(story.excerpt), 203)
+
+        story.content = "Short and sweet."
+        self.assertEqual((story.word_count, story.reading_minutes, story.excerpt), (3, 1, "Short and sweet."))
+
+    def test_reading_stats_of_empty_content(self):
+        """>>>> Test that empty content still takes a minute to read"""
+        self.assertEqual(reading_stats(""), (0, 1, ""))
+        self.assertEqual(reading_stats("one two three", words_per_minute=2, excerpt_length=7), (3, 2, "one..."))
+
+    def test_excerpts_fit_in_the_story_table(self):
+        """>>>> Test that a configured excerpt length longer than the excerpt column is clamped to it"""
+        self.app.config["STORY_EXCERPT_LENGTH"] = 1000
+        words, minutes, excerpt = reading_stats("word " * 500)
+        self.assertLessEqual(len(excerpt), Story.excerpt.type.length)
+        self.assertTrue(excerpt.endswith("..."))
+
+    def test_backfill_reading_stats(self):
+        """>>>> Test that stories without reading stats are filled in from their content"""
+        a1, a2 = self.create_authors()
+        db.session.execute(Story.__table__.update().values(word_count=None, reading_minutes=None, excerpt=None))
+        db.session.commit()
+
+        self.assertEqual(backfill_reading_stats(batch_size=1), Story.query.count())
+        self.assertEqual(backfill_reading_stats(), 0)
+        self.assertFalse(Story.query.filter(Story.excerpt.is_(None)).count())
+
 
 if __name__ == '__main__':
     unittest.main()
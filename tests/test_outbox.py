@@ -0,0 +1,183 @@
+import socketserver
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from tests import BaseTestCase
+from app import db, mail
+from app.models import OutboxEmail
+from app.utils.outbox import enqueue, deliver_due, retry_delay, run_worker
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP for smtplib to send messages
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        self.reply("220 localhost")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("MAIL"):
+                self.reply("451 Try again later" if self.server.refuse else "250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line)
+                self.server.messages.append(b"".join(data).decode("utf-8"))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server that keeps the messages it receives, and refuses them while refuse is set
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.messages = []
+        self.refuse = False
+
+
+class OutboxTestCases(BaseTestCase):
+    """
+    Tests for sending emails from the outbox instead of within requests
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = SMTPStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.use_mail_server(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def use_mail_server(self, port):
+        self.app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                               MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+
+    def test_registration_queues_the_confirmation_email(self):
+        """>>>> Test that registering adds the confirmation email to the outbox without sending it"""
+        data = {"first_name": "New", "last_name": "Author", "username": "newauthor", "email": "new@hadithi.com",
+                "password": "password", "verify_password": "password"}
+        response = self.client.post("auth/register", data={"register-form-%s" % k: v for k, v in data.items()})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.server.messages, [])
+
+        email = OutboxEmail.query.one()
+        self.assertEqual((email.recipient, email.subject, email.status), ("new@hadithi.com",
+                                                                          "Please confirm your email", "pending"))
+        self.assertIn("auth/confirm/", email.html)
+
+    def test_emails_are_committed_with_the_request(self):
+        """>>>> Test that an email is only in the outbox once the caller commits, and not after a rollback"""
+        enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.rollback()
+        self.assertEqual(OutboxEmail.query.count(), 0)
+
+        enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.commit()
+        self.assertEqual(OutboxEmail.query.count(), 1)
+
+    def test_worker_sends_due_emails(self):
+        """>>>> Test that due emails are sent over SMTP and marked sent"""
+        enqueue("a@hadithi.com", "First", "<p>one</p>")
+        enqueue("b@hadithi.com", "Second", "<p>two</p>")
+        db.session.commit()
+        self.assertEqual(deliver_due(), (2, 0))
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertIn("Subject: First", self.server.messages[0])
+        self.assertEqual([e.status for e in OutboxEmail.query.all()], ["sent", "sent"])
+        self.assertEqual(deliver_due(), (0, 0))
+
+    def test_refused_emails_are_retried_with_backoff(self):
+        """>>>> Test that an email the server refuses is tried again once its delay has passed"""
+        self.assertEqual([retry_delay(n).total_seconds() for n in (1, 2, 3, 20)], [60, 120, 240, 3600])
+        enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.commit()
+        now = datetime.now()
+
+        self.server.refuse = True
+        self.assertEqual(deliver_due(now=now), (0, 1))
+        email = OutboxEmail.query.one()
+        self.assertEqual((email.status, email.attempts), ("pending", 1))
+        self.assertEqual(email.next_attempt_at, now + timedelta(seconds=60))
+        self.assertIn("Try again later", email.last_error)
+
+        self.server.refuse = False
+        self.assertEqual(deliver_due(now=now + timedelta(seconds=30)), (0, 0))
+        self.assertEqual(deliver_due(now=now + timedelta(seconds=61)), (1, 0))
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_emails_are_given_up_on_when_the_server_is_down(self):
+        """>>>> Test that emails are marked failed after their last attempt when the server can not be reached"""
+        self.app.config["OUTBOX_MAX_ATTEMPTS"] = 2
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        self.use_mail_server(port)
+        enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.commit()
+        now = datetime.now()
+
+        self.assertEqual(deliver_due(now=now), (0, 1))
+        self.assertEqual(deliver_due(now=now + timedelta(hours=1)), (0, 1))
+        email = OutboxEmail.query.one()
+        self.assertEqual((email.status, email.attempts), ("failed", 2))
+        self.assertEqual(deliver_due(now=now + timedelta(days=1)), (0, 0))
+
+    def test_claimed_emails_are_not_picked_twice(self):
+        """>>>> Test that an email claimed by a worker is left alone until its claim runs out"""
+        email = enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.commit()
+        email_id = email.id
+        now = datetime.now()
+        claimed_until = now + timedelta(seconds=self.app.config["OUTBOX_CLAIM_TIMEOUT"])
+        db.session.execute(OutboxEmail.__table__.update().where(OutboxEmail.id == email_id).values(
+            next_attempt_at=claimed_until))
+        db.session.commit()
+        self.assertEqual(deliver_due(now=now), (0, 0))
+        self.assertEqual(deliver_due(now=claimed_until), (1, 0))
+
+    def test_worker_drains_the_outbox(self):
+        """>>>> Test that the worker sends emails until it is stopped"""
+        enqueue("a@hadithi.com", "Hello", "<p>hello</p>")
+        db.session.commit()
+        stop = threading.Event()
+        worker = threading.Thread(target=run_worker, args=(self.app, 0.05, stop), daemon=True)
+        worker.start()
+        try:
+            deadline = time.time() + 5
+            while not self.server.messages and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            worker.join(5)
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertFalse(worker.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Story
+from app.utils.pagination import paginate_stories
+
+
+class KeysetPaginationTestCases(BaseTestCase):
+    """
+    Tests for cursor pagination of story listings
+    """
+
+    def add_stories(self, count):
+        """
+        Adds stories to the database, they all share the same date_created so that the pages can only
+        be told apart by id
+        :param count: number of stories to add
+        :return: the author of the stories
+        """
+        author = AuthorAccount.query.filter_by(username="lusinabrian").first()
+        for n in range(count):
+            db.session.add(Story(title="Story %d" % n, tagline="Tagline %d" % n, category="Fiction",
+                                 content="", author_id=author.id))
+        db.session.commit()
+        return author
+
+    def test_pages_cover_every_story_once(self):
+        """>>>> Test that walking all the pages returns every story exactly once in order"""
+        self.add_stories(7)
+        expected = Story.latest().all()
+
+        seen, cursor = [], None
+        while True:
+            page = paginate_stories(Story.latest(), cursor=cursor, per_page=3)
+            self.assertLessEqual(len(page), 3)
+            seen.extend(page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, expected)
+
+    def test_next_page_survives_deletion_of_the_cursor_story(self):
+        """>>>> Test that the next page continues after a cursor story that has been deleted"""
+        self.add_stories(5)
+        expected = Story.latest().all()
+
+        page = paginate_stories(Story.latest(), per_page=2)
+        db.session.delete(page.items[-1])
+        db.session.commit()
+
+        next_page = paginate_stories(Story.latest(), cursor=page.next_cursor, per_page=2)
+        self.assertEqual(next_page.items, expected[2:4])
+
+    def test_last_page_has_no_cursor(self):
+        """>>>> Test that a page holding the last story has no next cursor"""
+        self.add_stories(2)
+        page = paginate_stories(Story.latest(), per_page=10)
+        self.assertFalse(page.has_next)
+        self.assertIsNone(page.next_cursor)
+
+    def test_feed_returns_next_fragment(self):
+        """>>>> Test that the feed endpoint returns only the next page of grid items"""
+        self.app.config["STORIES_PER_PAGE"] = 2
+        self.add_stories(3)
+        first = Story.latest().limit(2).all()
+
+        response = self.client.get("/story/feed?cursor=%d" % first[-1].id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"<html", response.data)
+        self.assertIn(b"grid__item", response.data)
+        self.assertNotIn(first[0].title.encode(), response.data)
+
+    def test_feed_for_author_stories(self):
+        """>>>> Test that the feed endpoint can page through a single author's stories"""
+        author = self.add_stories(2)
+        response = self.client.get("/story/feed?source=author&username=%s" % author.username)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b"grid__item"), 2)
+
+    def test_following_feed_requires_login(self):
+        """>>>> Test that the followed stories feed is not available to anonymous readers"""
+        self.add_stories(2)
+        response = self.client.get("/story/feed?source=following")
+        self.assertNotIn(b"grid__item", response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
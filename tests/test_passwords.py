@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import unittest
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount
+from app.utils.passwords import benchmark, hash_method, init_password_hashing, is_outdated, spell_out, \
+    DEFAULT_METHOD, _run
+
+
+def scrypt_hash(password, salt="hadithisaltsalty", n=2 ** 15, r=8, p=1):
+    """
+    :return: hash of the password as werkzeug 3 writes it with its default method, scrypt
+    """
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt.encode("utf-8"), n=n, r=r, p=p,
+                            maxmem=132 * n * r * p).hex()
+    return "scrypt:%d:%d:%d$%s$%s" % (n, r, p, salt, digest)
+
+
+def checks_scrypt():
+    """
+    :return: True if the installed werkzeug can check scrypt hashes, as the pinned werkzeug 3 does
+    """
+    try:
+        return check_password_hash(scrypt_hash("password"), "password")
+    except ValueError:
+        return False
+
+
+class PasswordHashingTestCases(BaseTestCase):
+    """
+    Tests for configurable password hashing
+    """
+
+    def author(self):
+        return AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+
+    def login_author(self, password="password"):
+        return self.client.post(
+            "auth/login",
+            data={"login-form-email": "guydemaupassant@hadithi.com", "login-form-password": password},
+            follow_redirects=True
+        )
+
+    def test_passwords_are_hashed_with_the_configured_method(self):
+        """>>>> Test that new hashes are made with PASSWORD_HASH_METHOD"""
+        self.assertTrue(self.author().password_hash.startswith(self.app.config["PASSWORD_HASH_METHOD"] + "$"))
+        self.assertFalse(is_outdated(self.author().password_hash))
+
+        method, self.app.config["PASSWORD_HASH_METHOD"] = self.app.config["PASSWORD_HASH_METHOD"], "pbkdf2:sha512"
+        try:
+            self.assertEqual(hash_method(), "pbkdf2:sha512:%d" % DEFAULT_PBKDF2_ITERATIONS)
+            self.assertTrue(is_outdated(self.author().password_hash))
+        finally:
+            self.app.config["PASSWORD_HASH_METHOD"] = method
+
+    def test_outdated_hash_is_replaced_on_login(self):
+        """>>>> Test that logging in replaces a hash made with outdated parameters"""
+        author = self.author()
+        author.password_hash = generate_password_hash("password", "pbkdf2:sha256:500")
+        db.session.commit()
+
+        self.login_author(password="wrong")
+        self.assertTrue(self.author().password_hash.startswith("pbkdf2:sha256:500$"))
+
+        self.login_author()
+        db.session.remove()
+        author = self.author()
+        self.assertTrue(author.password_hash.startswith("pbkdf2:sha256:1000$"))
+        self.assertTrue(author.verify_password("password"))
+
+    def test_werkzeug_default_is_used_when_no_method_is_set(self):
+        """>>>> Test that without PASSWORD_HASH_METHOD hashes are made with werkzeug's default method"""
+        method, self.app.config["PASSWORD_HASH_METHOD"] = self.app.config["PASSWORD_HASH_METHOD"], None
+        try:
+            self.assertEqual(hash_method(), spell_out(DEFAULT_METHOD))
+            self.assertEqual(spell_out("scrypt"), "scrypt:32768:8:1")
+        finally:
+            self.app.config["PASSWORD_HASH_METHOD"] = method
+
+    def test_hashes_are_only_replaced_by_stronger_ones(self):
+        """>>>> Test that hashes are outdated by stronger methods only, never by weaker ones"""
+        self.assertEqual(self.app.config["PASSWORD_HASH_METHOD"], "pbkdf2:sha256:1000")
+        self.assertFalse(is_outdated(scrypt_hash("password")))
+        self.assertFalse(is_outdated("pbkdf2:sha256:600000$salt$hash"))
+        self.assertFalse(is_outdated("argon2$salt$hash"))
+        self.assertTrue(is_outdated("sha256$salt$hash"))
+        self.assertTrue(is_outdated("pbkdf2:sha1:1000$salt$hash"))
+
+        method, self.app.config["PASSWORD_HASH_METHOD"] = self.app.config["PASSWORD_HASH_METHOD"], "scrypt"
+        try:
+            self.assertTrue(is_outdated("pbkdf2:sha256:600000$salt$hash"))
+            self.assertTrue(is_outdated(scrypt_hash("password", n=2 ** 14)))
+            self.assertFalse(is_outdated(scrypt_hash("password")))
+            self.assertFalse(is_outdated(scrypt_hash("password", n=2 ** 16)))
+        finally:
+            self.app.config["PASSWORD_HASH_METHOD"] = method
+
+    def test_stronger_hash_is_kept_on_login(self):
+        """>>>> Test that logging in keeps a hash made with a stronger method than the configured one"""
+        author = self.author()
+        password_hash = author.password_hash = generate_password_hash("password", "pbkdf2:sha256:20000")
+        db.session.commit()
+
+        self.assertIn(b"Welcome back", self.login_author().data)
+        db.session.remove()
+        self.assertEqual(self.author().password_hash, password_hash)
+
+    @unittest.skipUnless(checks_scrypt(), "the installed werkzeug can not check scrypt hashes")
+    def test_werkzeug_default_hash_is_kept_on_login(self):
+        """>>>> Test that logging in keeps a hash made with the pinned werkzeug's default, scrypt"""
+        author = self.author()
+        password_hash = author.password_hash = scrypt_hash("password")
+        db.session.commit()
+
+        self.assertIn(b"Welcome back", self.login_author().data)
+        db.session.remove()
+        self.assertEqual(self.author().password_hash, password_hash)
+
+    def test_hashing_runs_on_the_thread_pool(self):
+        """>>>> Test that hashes are computed on the password hashing threads when PASSWORD_HASH_WORKERS is set"""
+        self.app.config["PASSWORD_HASH_WORKERS"] = 2
+        init_password_hashing(self.app)
+        try:
+            self.assertTrue(_run(lambda: threading.current_thread().name).startswith("password-hashing"))
+            self.assertTrue(self.author().verify_password("password"))
+        finally:
+            self.app.extensions.pop("password_hashing").shutdown()
+            self.app.config["PASSWORD_HASH_WORKERS"] = 0
+
+    def test_benchmark_reports_checks_per_second(self):
+        """>>>> Test that the benchmark measures every method"""
+        results = benchmark(["pbkdf2:sha256:1000", "pbkdf2:sha256:2000"], seconds=0.05)
+        self.assertEqual([method for method, rate in results], ["pbkdf2:sha256:1000", "pbkdf2:sha256:2000"])
+        self.assertTrue(all(rate > 0 for method, rate in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from tests import BaseTestCase
+from app.models import AuthorAccount
+from app.utils.query_plans import hot_queries, explain
+
+
+class QueryPlansTestCases(BaseTestCase):
+    """
+    Tests that the hot query paths use indexes
+    """
+
+    def plans(self):
+        author = AuthorAccount.query.filter_by(username="test1hadithi").first()
+        return dict((name, " ".join(str(row) for row in explain(statement)))
+                    for name, statement in hot_queries(author, cursor=1))
+
+    def test_every_hot_query_can_be_explained(self):
+        """>>>> Test that a plan is returned for each of the hot queries"""
+        for name, plan in self.plans().items():
+            self.assertTrue(plan, name)
+
+    def test_hot_queries_use_indexes(self):
+        """>>>> Test that the feed, dashboard, category and follow lookups do not scan whole tables"""
+        plans = self.plans()
+        self.assertIn("ix_story_author_id_date_created", plans["dashboard"])
+        self.assertIn("ix_followers_followed_id_follower_id", plans["followers of author"])
+        for name in ("followed stories", "followed stories, next page"):
+            self.assertIn("ix_timeline_owner_story_created", plans[name])
+            self.assertNotIn("SCAN timeline", plans[name])
+        self.assertIn("ix_story_date_created_id", plans["home feed"])
+        self.assertIn("ix_story_category_id_date_created", plans["category page"])
+
+
+if __name__ == '__main__':
+    unittest.main()
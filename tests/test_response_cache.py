@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Story
+from app.utils.response_cache import ResponseCache, response_cache
+
+
+class ResponseCacheTestCases(BaseTestCase):
+    """
+    Tests for the whole-response cache of anonymous pages
+    """
+
+    def count_queries(self, url, **kwargs):
+        """
+        Counts the number of SQL statements executed while fetching the given url
+        :return: response and the number of statements executed
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(url, **kwargs)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return response, len(statements)
+
+    def test_anonymous_pages_are_served_from_the_cache(self):
+        """>>>> Test that the home page is rendered once and then served without running any query"""
+        first, _ = self.count_queries("/")
+        second, queries = self.count_queries("/")
+
+        self.assertEqual(queries, 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+
+    def test_matching_etag_gets_not_modified(self):
+        """>>>> Test that a client sending back the ETag of the page gets a 304 with no body"""
+        etag = self.client.get("/about").headers["ETag"]
+        response = self.client.get("/about", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_query_string_is_part_of_the_key(self):
+        """>>>> Test that pages with different query strings are cached apart, whatever the argument order"""
+        self.client.get("/?cursor=1&a=2")
+        self.client.get("/?a=2&cursor=1")
+        self.client.get("/")
+        self.assertEqual(len(response_cache()), 2)
+
+    def test_story_writes_clear_the_cache(self):
+        """>>>> Test that a new story shows up on the cached home page as soon as it is committed"""
+        self.client.get("/")
+        author = AuthorAccount.query.first()
+        db.session.add(Story(title="Fresh off the press", tagline="New", category="Fiction", content="",
+                             author_id=author.id))
+        db.session.commit()
+
+        self.assertEqual(len(response_cache()), 0)
+        self.assertIn(b"Fresh off the press", self.client.get("/").data)
+
+    def test_visitors_with_a_session_are_not_served_from_the_cache(self):
+        """>>>> Test that pages are neither shared with nor stored from visitors with session state"""
+        self.client.get("/about")
+        with self.client.session_transaction() as visitor_session:
+            visitor_session["_flashes"] = [("info", "Just for you")]
+
+        response = self.client.get("/")
+        self.assertIn(b"Just for you", response.data)
+        self.assertEqual(len(response_cache()), 1)
+
+    def test_least_recently_used_entries_are_dropped(self):
+        """>>>> Test that the cache holds at most max_entries responses"""
+        cache = ResponseCache(max_entries=2, ttl=None)
+        response = self.app.response_class(b"page")
+        for key in ("a", "b"):
+            cache.set(key, response)
+        cache.get("a")
+        cache.set("c", response)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_render_locks_do_not_pile_up(self):
+        """>>>> Test that pages with distinct query strings leave no render lock behind"""
+        cache = response_cache()
+        cache.max_entries = 10
+        for n in range(50):
+            self.client.get("/?x=%d" % n)
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache._key_locks, {})
+
+    def test_render_lock_is_shared_while_held(self):
+        """>>>> Test that a request waiting on a page being rendered shares its lock until both are done"""
+        cache = ResponseCache()
+
+        def wait_for_render():
+            with cache.key_lock("page"):
+                pass
+
+        with cache.key_lock("page"):
+            other = threading.Thread(target=wait_for_render)
+            other.start()
+            while cache._key_locks["page"][1] < 2:
+                time.sleep(0.01)
+            self.assertEqual(len(cache._key_locks), 1)
+        other.join(5)
+        self.assertEqual(cache._key_locks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
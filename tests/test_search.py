@@ -0,0 +1,90 @@
+import unittest
+from tests import BaseTestCase
+from app import db
+from app.models import AuthorAccount, Story
+from app.utils.search import search_stories, rebuild_search_index, match_query
+
+
+class StorySearchTestCases(BaseTestCase):
+    """
+    Tests for full-text search of stories
+    """
+
+    def save_story(self, title="A story", tagline="Tagline", content=""):
+        """
+        Adds a story written by the first author
+        :return: the new story
+        """
+        author = AuthorAccount.query.first()
+        story = Story(title=title, tagline=tagline, category="Fiction", content=content, author_id=author.id)
+        db.session.add(story)
+        db.session.commit()
+        return story
+
+    def test_saved_stories_are_searchable(self):
+        """>>>> Test that a story can be found by words in its title, tagline or content as soon as it is saved"""
+        story = self.save_story(title="The lion king", tagline="Pride rock", content="Hyenas laughing at night")
+
+        self.assertEqual(search_stories("lion").items, [story])
+        self.assertEqual(search_stories("pride").items, [story])
+        self.assertEqual(search_stories("laughing hyenas").items, [story])
+        self.assertEqual(search_stories("zebra").items, [])
+
+    def test_title_matches_rank_first(self):
+        """>>>> Test that stories matching on title rank above stories only mentioning the word"""
+        mention = self.save_story(title="Dry season", content="A drum was heard far away")
+        titled = self.save_story(title="The drum", content="Nothing much")
+
+        self.assertEqual(search_stories("drum").items, [titled, mention])
+
+    def test_edited_and_deleted_stories_are_reindexed(self):
+        """>>>> Test that the index follows edits to the content and deletes of stories"""
+        story = self.save_story(title="Changing", content="before the rains")
+        story.content = "after the harvest"
+        db.session.commit()
+
+        self.assertEqual(search_stories("rains").items, [])
+        self.assertEqual(search_stories("harvest").items, [story])
+
+        db.session.delete(story)
+        db.session.commit()
+        self.assertEqual(search_stories("harvest").items, [])
+
+    def test_results_are_paginated(self):
+        """>>>> Test that results come one page at a time and the cursor is the next page number"""
+        for n in range(5):
+            self.save_story(title="Baobab %d" % n)
+
+        first = search_stories("baobab", per_page=3)
+        second = search_stories("baobab", page=first.next_cursor, per_page=3)
+
+        self.assertEqual((len(first), first.next_cursor), (3, 2))
+        self.assertEqual((len(second), second.next_cursor), (2, None))
+        self.assertFalse(set(first.items) & set(second.items))
+
+    def test_search_terms_are_not_interpreted(self):
+        """>>>> Test that query syntax typed by a reader is searched for as words"""
+        self.assertEqual(match_query('lion AND "king'), '"lion" "AND" "king"')
+        self.assertEqual(match_query('("*'), "")
+        self.assertEqual(search_stories('("*').items, [])
+
+    def test_rebuild_search_index(self):
+        """>>>> Test that every story can be indexed from scratch"""
+        self.save_story(title="Rebuilt")
+        db.session.execute("DELETE FROM story_search")
+        db.session.commit()
+
+        self.assertEqual(rebuild_search_index(batch_size=1), Story.query.count())
+        self.assertEqual(len(search_stories("rebuilt")), 1)
+
+    def test_search_page(self):
+        """>>>> Test that the search page shows the matching stories"""
+        self.save_story(title="Anansi the spider")
+        response = self.client.get("/story/search?q=spider")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Anansi the spider", response.data)
+        self.assertEqual(response.data.count(b"grid__item"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+from jinja2.utils import LRUCache
+from tests import BaseTestCase
+from app.utils.template_cache import init_template_cache, precompile_templates
+
+
+class TemplateCacheTestCases(BaseTestCase):
+    """
+    Tests for the compiled template caches
+    """
+
+    def setUp(self):
+        super(TemplateCacheTestCases, self).setUp()
+        self.bytecode_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.bytecode_dir, ignore_errors=True)
+        super(TemplateCacheTestCases, self).tearDown()
+
+    def test_template_cache_is_bounded(self):
+        """>>>> Test that compiled templates are kept in a bounded cache"""
+        self.assertIsInstance(self.app.jinja_env.cache, LRUCache)
+        self.assertEqual(self.app.jinja_env.cache.capacity, self.app.config["TEMPLATE_CACHE_SIZE"])
+
+    def test_precompile_writes_bytecode_of_blueprint_templates(self):
+        """>>>> Test that every template, blueprint ones included, is compiled to the bytecode cache"""
+        self.app.config["TEMPLATE_BYTECODE_CACHE_ENABLED"] = True
+        self.app.config["TEMPLATE_BYTECODE_CACHE_DIR"] = self.bytecode_dir
+        init_template_cache(self.app)
+
+        compiled, failed = precompile_templates(self.app)
+
+        self.assertEqual(failed, [])
+        self.assertIn("base.html", compiled)
+        self.assertIn("story.story_grid.html", compiled)
+        self.assertEqual(len(os.listdir(self.bytecode_dir)), len(compiled))
+
+
+if __name__ == '__main__':
+    unittest.main()
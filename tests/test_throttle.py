@@ -0,0 +1,99 @@
+import unittest
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db
+from app.utils.throttle import MemoryBackend, RedisBackend, init_throttle, parse_limit, redis
+
+
+class ThrottleTestCases(BaseTestCase):
+    """
+    Tests for token bucket throttling of the login and registration forms
+    """
+
+    def login(self, email="guydemaupassant@hadithi.com", password="wrong", **headers):
+        return self.client.post("auth/login", data={"login-form-email": email, "login-form-password": password},
+                                headers=headers)
+
+    def test_bucket_refills_over_time(self):
+        """>>>> Test that a bucket allows a burst of its capacity and then its refill rate"""
+        backend = MemoryBackend()
+        capacity, rate = parse_limit("2/10")
+        self.assertEqual((capacity, rate), (2, 0.2))
+
+        self.assertEqual(backend.take("key", capacity, rate, now=0), 0)
+        self.assertEqual(backend.take("key", capacity, rate, now=0), 0)
+        self.assertAlmostEqual(backend.take("key", capacity, rate, now=1), 4)
+        self.assertEqual(backend.take("key", capacity, rate, now=6), 0)
+        self.assertEqual(backend.take("other", capacity, rate, now=6), 0)
+
+    def test_login_attempts_for_an_email_are_limited_before_any_query(self):
+        """>>>> Test that login attempts beyond the limit of an email address are rejected without a query"""
+        self.app.config["THROTTLE_LOGIN_PER_EMAIL"] = "2/60"
+        self.login()
+        self.login(email=" GuyDeMaupassant@hadithi.com")
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.remove()
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.login(password="password")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        self.assertEqual(statements, [])
+
+        self.assertNotEqual(self.login(email="test1hadithi@hadithi.com").status_code, 429)
+
+    def test_attempts_are_limited_by_client_address(self):
+        """>>>> Test that clients behind a proxy are limited by the address it forwards"""
+        self.app.config["THROTTLE_REGISTER_PER_IP"] = "1/60"
+        self.app.config["THROTTLE_PROXY_COUNT"] = 1
+        data = {"register-form-email": "new@hadithi.com"}
+
+        self.client.post("auth/register", data=data, headers={"X-Forwarded-For": "203.0.113.1"})
+        response = self.client.post("auth/register", data=data, headers={"X-Forwarded-For": "203.0.113.1"})
+        self.assertEqual(response.status_code, 429)
+
+        response = self.client.post("auth/register", data=data, headers={"X-Forwarded-For": "203.0.113.2"})
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_clients_behind_one_proxy_have_their_own_buckets(self):
+        """>>>> Test that two clients forwarded by the same proxy are not throttled as one"""
+        self.app.config["THROTTLE_LOGIN_PER_IP"] = "2/60"
+        self.app.config["THROTTLE_PROXY_COUNT"] = 1
+        # both requests come from the address of the test client, as they would from the proxy
+        first, second = {"X-Forwarded-For": "203.0.113.1"}, {"X-Forwarded-For": "203.0.113.2"}
+
+        for n in range(2):
+            self.assertNotEqual(self.login(email="reader%d@hadithi.com" % n, **first).status_code, 429)
+        self.assertEqual(self.login(email="reader2@hadithi.com", **first).status_code, 429)
+        self.assertNotEqual(self.login(email="reader3@hadithi.com", **second).status_code, 429)
+
+    def test_proxy_count_is_required_with_throttling(self):
+        """>>>> Test that throttling is not enabled without being told how many proxies forward requests"""
+        self.app.config["THROTTLE_PROXY_COUNT"] = None
+        with self.assertRaises(RuntimeError):
+            init_throttle(self.app)
+
+    @unittest.skipIf(redis is None, "redis is not installed")
+    def test_buckets_fall_back_to_memory_without_redis(self):
+        """>>>> Test that attempts are still throttled per process while Redis can not be reached"""
+        backend = RedisBackend("redis://127.0.0.1:1/0")
+        capacity, rate = parse_limit("1/60")
+        self.assertEqual(backend.take("key", capacity, rate), 0)
+        self.assertGreater(backend.take("key", capacity, rate), 0)
+
+    def test_pages_are_not_throttled(self):
+        """>>>> Test that only form submissions take tokens"""
+        self.app.config["THROTTLE_LOGIN_PER_IP"] = "1/60"
+        for n in range(3):
+            self.assertEqual(self.client.get("auth/login").status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import re
+import time
+import unittest
+from unittest import mock
+from flask import g, get_flashed_messages
+from sqlalchemy import event
+from tests import BaseTestCase
+from app import db, mail
+from app.models import AuthorAccount
+from app.utils.outbox import deliver_due
+from app.mod_auth.token import TokenService, CONFIRM, RESET_PASSWORD, generate_confirmation_token, \
+    confirm_token, load_reset_token
+
+
+class TokenTestCases(BaseTestCase):
+    """
+    Tests for timed, purpose scoped tokens of the confirmation and password reset links
+    """
+
+    def test_tokens_are_scoped_to_their_purpose(self):
+        """>>>> Test that a token is only accepted for the purpose it was made for and when untouched"""
+        token = generate_confirmation_token("guydemaupassant@hadithi.com")
+        self.assertEqual(confirm_token(token), "guydemaupassant@hadithi.com")
+        self.assertIsNone(load_reset_token(token))
+        self.assertIsNone(confirm_token(token[:-2] + "xx"))
+
+    def test_tokens_expire(self):
+        """>>>> Test that a token is turned away once its max age has passed"""
+        token = generate_confirmation_token("guydemaupassant@hadithi.com")
+        later = time.time() + self.app.config["TOKEN_CONFIRM_MAX_AGE"] + 60
+        with mock.patch("time.time", return_value=later):
+            self.assertIsNone(confirm_token(token))
+
+    def test_tokens_survive_key_rotation(self):
+        """>>>> Test that tokens signed with a previous key are still accepted from the fallbacks"""
+        max_ages = {CONFIRM: 60, RESET_PASSWORD: 60}
+        token = TokenService("old", salt="salt", max_ages=max_ages).dumps(CONFIRM, "a@hadithi.com")
+
+        rotated = TokenService("new", fallbacks=["old"], salt="salt", max_ages=max_ages)
+        self.assertEqual(rotated.loads(CONFIRM, token), "a@hadithi.com")
+        self.assertNotEqual(rotated.dumps(CONFIRM, "a@hadithi.com"), token)
+        self.assertIsNone(TokenService("new", salt="salt", max_ages=max_ages).loads(CONFIRM, token))
+
+    def test_expired_confirmation_link_does_not_reach_the_database(self):
+        """>>>> Test that an expired confirmation link is turned away without a query"""
+        token = generate_confirmation_token("guydemaupassant@hadithi.com")
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.remove()
+        g.pop("_login_user", None)
+        later = time.time() + self.app.config["TOKEN_CONFIRM_MAX_AGE"] + 60
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            with self.client, mock.patch("time.time", return_value=later):
+                response = self.client.get("auth/confirm/" + token)
+                self.assertEqual(get_flashed_messages(), ["The confirmation link is invalid or has expired."])
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(statements, [])
+
+    def test_confirmation_link_confirms_the_logged_in_author(self):
+        """>>>> Test that a valid confirmation link confirms the author it was sent to"""
+        self.client.post("auth/login", data={"login-form-email": "guydemaupassant@hadithi.com",
+                                             "login-form-password": "password"})
+        token = generate_confirmation_token("guydemaupassant@hadithi.com")
+        self.client.get("auth/confirm/" + token)
+
+        db.session.remove()
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        self.assertTrue(author.confirmed)
+        self.assertIsNotNone(author.confirmed_on)
+
+    def test_password_is_reset_once_from_the_emailed_link(self):
+        """>>>> Test that the emailed reset link changes the password and stops working afterwards"""
+        self.client.post("auth/forgot-password", data={"email": "guydemaupassant@hadithi.com"})
+        self.client.post("auth/forgot-password", data={"email": "nobody@hadithi.com"})
+        with mail.record_messages() as outbox:
+            deliver_due()
+        self.assertEqual([message.recipients for message in outbox], [["guydemaupassant@hadithi.com"]])
+
+        url = re.search(r'href="http://localhost/(auth/reset-password/[^"]+)"', outbox[0].html).group(1)
+        data = {"password": "new password", "verify_password": "new password"}
+
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("auth/login", response.headers["Location"])
+        db.session.remove()
+        author = AuthorAccount.query.filter_by(email="guydemaupassant@hadithi.com").first()
+        self.assertTrue(author.verify_password("new password"))
+
+        with self.client:
+            response = self.client.post(url, data={"password": "again", "verify_password": "again"})
+            self.assertIn("auth/forgot-password", response.headers["Location"])
+            self.assertEqual(get_flashed_messages()[-1], "The password reset link is invalid or has expired.")
+
+
+if __name__ == '__main__':
+    unittest.main()